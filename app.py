@@ -1,23 +1,36 @@
 import streamlit as st
 import requests
-from datetime import datetime
+from datetime import datetime, timezone
 import socket
 import ssl
 import re
 import random
 import time
-from PIL import Image
+from PIL import Image, ImageChops, ImageOps, features
 import io
 import base64
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import pandas as pd
+import numpy as np
 from io import StringIO
 from bs4 import BeautifulSoup
 import hashlib
+import difflib
 import subprocess
 import platform
 import json
+import os
+import ipaddress
+import gzip
+import zlib
+import zipfile
+import xml.etree.ElementTree as ET
+import threading
+import sqlite3
+from contextlib import closing
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 # ============================================================================
 # PART 1: IMPORT GUARDS AND CONFIGURATION
@@ -25,27 +38,29 @@ import json
 
 # Optional imports with availability flags
 DNS_AVAILABLE = False
-WHOIS_AVAILABLE = False
 MYSQL_AVAILABLE = False
 IMAPLIB_AVAILABLE = False
 SMTPLIB_AVAILABLE = False
 FTPLIB_AVAILABLE = False
 PYTZ_AVAILABLE = False
+ED25519_AVAILABLE = False
+X509_AVAILABLE = False
 
 try:
     import dns.resolver
     import dns.query
     import dns.zone
+    import dns.message
+    import dns.flags
+    import dns.rcode
+    import dns.rdatatype
+    import dns.name
+    import dns.reversename
+    import dns.exception
     DNS_AVAILABLE = True
 except ImportError:
     pass
 
-try:
-    import whois
-    WHOIS_AVAILABLE = True
-except ImportError:
-    pass
-
 try:
     import pymysql
     MYSQL_AVAILABLE = True
@@ -75,14 +90,27 @@ try:
 except ImportError:
     pass
 
+try:
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+    ED25519_AVAILABLE = True
+except ImportError:
+    pass
+
+try:
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    X509_AVAILABLE = True
+except ImportError:
+    pass
+
 # Feature availability dictionary
 FEATURES = {
     'dns': DNS_AVAILABLE,
-    'whois': WHOIS_AVAILABLE,
     'mysql': MYSQL_AVAILABLE,
     'email': IMAPLIB_AVAILABLE and SMTPLIB_AVAILABLE,
     'ftp': FTPLIB_AVAILABLE,
-    'timezone': PYTZ_AVAILABLE
+    'timezone': PYTZ_AVAILABLE,
+    'ed25519': ED25519_AVAILABLE
 }
 
 # Configuration
@@ -91,7 +119,72 @@ CONFIG = {
     'dns_timeout': 5,
     'max_redirects': 10,
     'user_agent': 'SupportBuddy/1.0',
-    'cache_ttl': 300  # 5 minutes
+    'cache_ttl': 300,  # 5 minutes
+    'trace_max_hops': 30,
+    'trace_max_cname_chain': 8,
+    'delegation_cache_max_ttl': 3600,
+    'benchmark_max_queries': 500,
+    'discovery_workers': 50,
+    'discovery_rate_limit': 200,  # queries per second
+    'zone_diff_workers': 32,
+    'negative_cache_ttl': 300,
+    'spf_lookup_limit': 10,
+    'spf_void_lookup_limit': 2,
+    'ptr_workers': 256,  # a /24 resolves in about one DNS timeout
+    'ptr_max_addresses': 4096,
+    'email_auth_deadline': 10,  # seconds for the whole SPF/DKIM/DMARC/MTA-STS run
+    'dnsbl_timeout': 3,  # per-zone query timeout
+    'dnsbl_workers': 64,
+    'whois_port': 43,
+    'whois_timeout': 10,
+    'whois_max_referrals': 3,
+    'whois_server_concurrency': 2,  # simultaneous connections per WHOIS server
+    'whois_server_rate': 2,  # new queries per second per WHOIS server
+    'data_dir': os.path.join(os.path.dirname(os.path.abspath(__file__)), '.supportbuddy'),
+    'rdap_bootstrap_url': 'https://data.iana.org/rdap/dns.json',
+    'rdap_bootstrap_max_age': 86400,  # refresh the IANA bootstrap file daily
+    'http_pool_size': 32,
+    'psl_path': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'public_suffix_list.dat'),
+    'error_codes_path': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'error_codes.json'),
+    'whois_bulk_workers': 16,
+    'watchlist_poll_interval': 60,  # how often the scheduler looks for due entries
+    'watchlist_retry_interval': 3600,  # re-check an entry whose checks all failed after an hour
+    'watchlist_max_interval': 7 * 86400,  # far-off expiries are still checked weekly
+    'watchlist_workers': 4,
+    'gemini_model': 'gemini-2.5-flash-lite',
+    'gemini_requests_per_minute': 60,  # keep below the API key's quota - shared by every session
+    'gemini_tokens_per_minute': 250000,
+    'gemini_max_concurrent': 8,
+    'gemini_output_tokens_estimate': 800,  # budgeted per call before the answer length is known
+    'gemini_image_tokens': 258,  # Gemini bills a small image as a flat 258 tokens
+    'gemini_max_retries': 4,
+    'gemini_backoff_base': 1,
+    'gemini_backoff_cap': 30,
+    'ai_cache_ttl': 7 * 86400,  # keep answers for a week
+    'ai_cache_memory_entries': 256,
+    'chat_context_tokens': 6000,  # budget for recent turns in each chat prompt
+    'chat_turn_max_tokens': 2000,  # longer messages (pasted logs) are clipped to head and tail
+    'chat_summary_words': 250,
+    'chat_max_session_turns': 40,  # older, already-summarized turns spill to disk
+    'chat_archive_ttl': 7 * 86400,
+    'screenshot_max_side': 1536,  # Gemini tiles images at 768px - larger only costs bytes
+    'screenshot_quality': 80,
+    'screenshot_border_threshold': 12,
+    'screenshot_signature_width': 256,  # cells across - fine enough that a changed error line shows up
+    'screenshot_match_tolerance': 48,  # grey levels a cell may drift (re-encoding, rescaling) and still count as equal
+    'screenshot_match_cells': 2,  # max differing cells for a past screenshot to be offered as near-identical
+    'screenshot_thumbnail_side': 480,
+    'ticket_batch_workers': 4,  # Gemini admission control still applies on top of this
+    'ticket_batch_retries': 2,
+    'ticket_batch_max_tokens': 4000,  # longer tickets are clipped to head and tail
+    'ticket_batch_max_rows': 2000,
+    'ticket_minhash_perms': 128,
+    'ticket_lsh_bands': 64,  # 64 bands x 2 rows: pairs above ~0.3 Jaccard almost always share a bucket
+    'ticket_similarity_threshold': 0.4,  # reworded copies of the same ticket land around 0.5
+    'bounce_log_max_lines': 200000,
+    'bounce_ai_samples': 20,  # distinct unclassified log lines sent to AI in one request
+    'error_code_match_threshold': 0.6,  # share of a message's (IDF-weighted) words a text-only match must explain
+    'symptom_check_deadline': 8  # seconds for the Symptom Checker's whole live-diagnostics run
 }
 
 # Configure Gemini API
@@ -327,8 +420,6 @@ st.markdown("""
     """, unsafe_allow_html=True)
 
 # Session state initialization
-if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
 if 'session_notes' not in st.session_state:
     st.session_state.session_notes = ""
 # Simplified navigation: only selected_tool is required
@@ -392,7 +483,10 @@ TOOL_CATEGORIES = {
             "🔍 Domain Status Check",
             "🔎 DNS Analyzer",
             "📋 NS Authority Checker",
-            "🌍 WHOIS Lookup"
+            "🌍 WHOIS Lookup",
+            "🧭 DNS Trace",
+            "📑 Zone File Diff",
+            "👁️ Watchlist Monitor"
         ],
         "description": "Domain Tools",
         "color": CATEGORY_COLORS.get("Domain & DNS")
@@ -416,7 +510,9 @@ TOOL_CATEGORIES = {
             "📮 MX Record Checker",
             "✉️ Email Account Tester",
             "🔒 SPF/DKIM Check",
-            "📄 Email Header Analyzer"
+            "📄 Email Header Analyzer",
+            "📊 DMARC Report Analyzer",
+            "🚫 DNSBL Blacklist Check"
         ],
         "description": "Essential Email Tools",
         "color": CATEGORY_COLORS.get("Email")
@@ -435,6 +531,8 @@ TOOL_CATEGORIES = {
         "tools": [
             "🔍 IP Address Lookup",
             "🗂️ DNS Analyzer",
+            "⏱️ DNS Latency Benchmark",
+            "🔁 Bulk Reverse DNS (PTR)",
             "🧹 Flush DNS Cache"
         ],
         "description": "Your Essential Network Tools",
@@ -446,6 +544,7 @@ TOOL_CATEGORIES = {
             "📚 Help Center",
             "🔑 Password Strength Meter",
             "📋 Copy-Paste Utilities",
+            "🧾 Bulk Input Normalizer",
             "📸 Screenshot Annotator",
             "📝 Session Notes",
             "🗑️ Clear Cache Instructions",
@@ -491,40 +590,168 @@ def show_missing_dependency(feature_name, package_name):
     st.code(f"pip install {package_name}", language="bash")
     st.info("💡 Contact your administrator to enable this feature")
 
+DOMAIN_PATTERN = re.compile(r'^(?:[a-zA-Z0-9](?:[a-zA-Z0-9\-]{0,61}[a-zA-Z0-9])?\.)+(?:[a-zA-Z]{2,63}|xn--[a-zA-Z0-9\-]{1,59})$')
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+URL_PATTERN = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.\-]*://(?:[^@/?#]*@)?(\[[^\]]*\]|[^:/?#]*)(?::(\d*))?([/?#].*)?$')
+SCHEME_PATTERN = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.\-]*://')
+HOST_PORT_PATTERN = re.compile(r'^(\[[^\]]*\]|[^:/\[\]]+):(\d{1,5})(/.*)?$')  # host:port or [v6]:port, optional path
+IPV4_PATTERN = re.compile(r'(?:(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\.){3}(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)')
+
+def to_ascii_hostname(name):
+    """Lower-case a hostname and IDNA-encode it if it has non-ASCII labels"""
+    name = name.strip().rstrip('.').lower()
+    return name if name.isascii() else name.encode('idna').decode('ascii')
+
 def validate_domain(domain):
     """Validate domain name format"""
     if not domain:
         return False, "Domain name is required"
     
-    domain = domain.replace('http://', '').replace('https://', '').split('/')[0]
-    pattern = r'^(?:[a-zA-Z0-9](?:[a-zA-Z0-9\-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}$'
-    if not re.match(pattern, domain):
+    match = URL_PATTERN.match(domain.strip())
+    domain = match.group(1) if match else domain.strip().split('/')[0]
+    try:
+        domain = to_ascii_hostname(domain) if not domain.isascii() else domain.rstrip('.')
+    except UnicodeError:
+        return False, "Invalid internationalized domain name"
+    if len(domain) > 253 or not DOMAIN_PATTERN.match(domain):
         return False, "Invalid domain format"
     
     return True, domain
 
 def validate_ip(ip):
-    """Validate IP address format"""
+    """Validate IPv4 or IPv6 address format"""
     if not ip:
         return False, "IP address is required"
     
-    pattern = r'^(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$'
-    if not re.match(pattern, ip):
+    try:
+        return True, str(ipaddress.ip_address(ip.strip().strip('[]')))
+    except ValueError:
         return False, "Invalid IP address format"
-    
-    return True, ip
 
 def validate_email(email_addr):
     """Validate email address format"""
     if not email_addr:
         return False, "Email address is required"
     
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    if not re.match(pattern, email_addr):
+    if not EMAIL_PATTERN.match(email_addr):
         return False, "Invalid email format"
     
     return True, email_addr
 
+def _classify_ip_like(value):
+    """Return (type, normalized, note) for an IP or CIDR candidate; type 'invalid' puts the reason in note"""
+    try:
+        if '/' in value:
+            network = ipaddress.ip_network(value, strict=False)
+            note = '' if str(network) == value.lower() else 'Host bits set - normalized to the network address'
+            return 'cidr', str(network), note
+        return 'ip', str(ipaddress.ip_address(value)), ''
+    except ValueError:
+        return 'invalid', None, 'Invalid CIDR range' if '/' in value else 'Invalid IP address'
+
+def _map_unique(series, func):
+    """Apply func once per distinct value - bulk pastes are full of repeats"""
+    lookup = {value: func(value) for value in pd.unique(series)}
+    return series.map(lookup)
+
+def _hostname_or_reason(name):
+    """IDNA-normalize and validate one hostname; returns (hostname, reason)"""
+    if name and (':' in name or name[0].isdigit()):
+        valid, address = validate_ip(name)
+        if valid:
+            return address, ''
+    try:
+        name = to_ascii_hostname(name or '')
+    except UnicodeError:
+        return None, 'Invalid internationalized name'
+    if not name:
+        return None, 'Missing hostname'
+    if len(name) > 253 or not DOMAIN_PATTERN.match(name):
+        return None, 'Invalid hostname'
+    return name, ''
+
+def normalize_entries(values):
+    """Classify and normalize a bulk list of domains, IPs, CIDRs, emails and URLs.
+
+    Works column-wise with pandas string ops and precompiled patterns; only
+    IP/CIDR candidates and hostnames that miss the ASCII fast path fall back
+    to per-item calls. Returns (valid_df, invalid_df, duplicates_removed).
+    """
+    raw = pd.Series(list(values), dtype='string').str.strip()
+    raw = raw[raw.notna() & (raw != '') & ~raw.str.startswith('#')].reset_index(drop=True)
+    df = pd.DataFrame({'input': raw, 'type': 'domain', 'normalized': None, 'host': None, 'note': '', 'reason': ''}, dtype='object')
+    if df.empty:
+        return df[['input', 'type', 'normalized', 'host', 'note']], df[['input', 'reason']], 0
+
+    is_url = raw.str.match(SCHEME_PATTERN)
+    is_email = ~is_url & raw.str.contains('@', regex=False)
+
+    # A bare host:port (or [v6]:port) loses its port the way URLs lose their scheme
+    entry = raw.copy()
+    port_parts = raw[~is_url & ~is_email & raw.str.contains(':', regex=False)].str.extract(HOST_PORT_PATTERN).reindex(raw.index)
+    has_port = port_parts[0].notna()
+    if has_port.any():
+        entry[has_port] = port_parts.loc[has_port, 0] + port_parts.loc[has_port, 2].fillna('')
+        bad_port = has_port & (port_parts[1].astype('float') > 65535)
+        df.loc[bad_port, 'reason'] = 'Invalid port'
+
+    is_ip_like = ~is_url & ~is_email & (entry.str.fullmatch(r'[0-9./]+') | entry.str.contains(r'^\[|:', regex=True))
+    is_domain = ~is_url & ~is_email & ~is_ip_like
+    df.loc[is_url, 'type'] = 'url'
+    df.loc[is_email, 'type'] = 'email'
+
+    # Hostnames come from the URL authority, the email domain, or the bare entry
+    url_parts = raw[is_url].str.extract(URL_PATTERN)
+    email_parts = raw[is_email].str.rsplit('@', n=1, expand=True)
+    df.loc[is_url, 'host'] = url_parts[0].str.strip('[]')
+    if is_email.any():
+        df.loc[is_email, 'host'] = email_parts[1]
+        bad_local = ~email_parts[0].str.fullmatch(r"[a-zA-Z0-9._%+'\-]+").fillna(False)
+        df.loc[bad_local[bad_local].index, 'reason'] = 'Invalid mailbox name'
+    df.loc[is_domain, 'host'] = entry[is_domain].str.split('/', n=1).str[0]
+    df.loc[is_domain & entry.str.contains('/', regex=False), 'note'] = 'Path dropped'
+
+    # Fast path: ASCII hostnames that match the precompiled pattern
+    has_host = (is_url | is_email | is_domain) & (df['reason'] == '')
+    hosts = df.loc[has_host, 'host'].astype('string').str.rstrip('.').str.lower()
+    fast = hosts.str.fullmatch(DOMAIN_PATTERN).fillna(False) & (hosts.str.len() <= 253)
+    df.loc[fast[fast].index, 'host'] = hosts[fast]
+    slow = _map_unique(df.loc[fast[~fast].index, 'host'], _hostname_or_reason)
+    if not slow.empty:
+        df.loc[slow.index, 'host'] = slow.str[0]
+        df.loc[slow.index, 'reason'] = slow.str[1]
+
+    # IPs and CIDRs: canonical dotted quads pass on a regex, the rest go through ipaddress
+    is_v4 = is_ip_like & entry.str.fullmatch(IPV4_PATTERN)
+    df.loc[is_v4, 'type'] = 'ip'
+    df.loc[is_v4, 'normalized'] = entry[is_v4]
+    is_ip_like &= ~is_v4
+    if is_ip_like.any():
+        classified = _map_unique(entry[is_ip_like].str.strip('[]'), _classify_ip_like)
+        df.loc[is_ip_like, 'type'] = classified.str[0]
+        df.loc[is_ip_like, 'normalized'] = classified.str[1]
+        invalid_ip = classified.str[0] == 'invalid'
+        df.loc[invalid_ip[invalid_ip].index, 'reason'] = classified[invalid_ip].str[2]
+        df.loc[invalid_ip[~invalid_ip].index, 'note'] = classified[~invalid_ip].str[2]
+
+    df.loc[is_domain, 'normalized'] = df.loc[is_domain, 'host']
+    if is_email.any():
+        df.loc[is_email, 'normalized'] = email_parts[0] + '@' + df.loc[is_email, 'host'].fillna('')
+    if is_url.any():
+        host = df.loc[is_url, 'host'].fillna('')
+        host = host.where(~host.str.contains(':', regex=False), '[' + host + ']')
+        scheme = raw[is_url].str.extract(r'^([^:]+)://', expand=False).str.lower()
+        port = (':' + url_parts[1]).where(url_parts[1].fillna('') != '', '')
+        df.loc[is_url, 'normalized'] = scheme + '://' + host + port + url_parts[2].fillna('/')
+
+    if has_port.any():
+        df.loc[has_port, 'note'] = df.loc[has_port, 'note'].map(lambda note: 'Port and path dropped' if note == 'Path dropped' else 'Port dropped')
+
+    invalid = df['reason'] != ''
+    valid_df = df.loc[~invalid, ['input', 'type', 'normalized', 'host', 'note']]
+    deduped = valid_df.drop_duplicates(subset=['type', 'normalized']).reset_index(drop=True)
+    return deduped, df.loc[invalid, ['input', 'reason']].reset_index(drop=True), len(valid_df) - len(deduped)
+
 def create_session():
     """Create a requests session with retry logic"""
     session = requests.Session()
@@ -567,6 +794,18 @@ def safe_request(url, method='get', **kwargs):
     except Exception as e:
         return False, f"Unexpected error: {str(e)}"
 
+def get_resolver(nameservers=None, port=53):
+    """Create a stub resolver using the configured DNS timeout"""
+    if nameservers:
+        resolver = dns.resolver.Resolver(configure=False)
+        resolver.nameservers = list(nameservers)
+        resolver.port = port
+    else:
+        resolver = dns.resolver.Resolver()
+    resolver.timeout = CONFIG['dns_timeout']
+    resolver.lifetime = CONFIG['dns_timeout']
+    return resolver
+
 @st.cache_data(ttl=CONFIG['cache_ttl'])
 def lookup_dns_record(domain, record_type='A'):
     """Lookup DNS records with caching"""
@@ -574,9 +813,7 @@ def lookup_dns_record(domain, record_type='A'):
         return False, "DNS library not available"
     
     try:
-        resolver = dns.resolver.Resolver()
-        resolver.timeout = CONFIG['dns_timeout']
-        resolver.lifetime = CONFIG['dns_timeout']
+        resolver = get_resolver()
         
         answers = resolver.resolve(domain, record_type)
         results = [str(rdata) for rdata in answers]
@@ -590,18 +827,6 @@ def lookup_dns_record(domain, record_type='A'):
     except Exception as e:
         return False, f"DNS error: {str(e)}"
 
-@st.cache_data(ttl=CONFIG['cache_ttl'])
-def lookup_whois(domain):
-    """Lookup WHOIS information"""
-    if not WHOIS_AVAILABLE:
-        return False, "WHOIS library not available"
-    
-    try:
-        w = whois.whois(domain)
-        return True, w
-    except Exception as e:
-        return False, f"WHOIS error: {str(e)}"
-
 def get_client_ip():
     """Get client's public IP address"""
     try:
@@ -708,37 +933,6 @@ def parse_ng_whois_simplified(html):
     
     return essential_sections
     
-def display_ng_whois_simplified(domain):
-    """Display only essential .ng WHOIS data"""
-    html = query_ng_whois(domain)
-    sections = parse_ng_whois_simplified(html)
-    dnssec_status = get_dnssec_info(domain)
-    ns_list = get_live_ns(domain)
-    
-    st.markdown("### 🇳🇬 Registration Data")
-    
-    if 'Domain Information' in sections:
-        with st.expander("📋 Domain Information", expanded=True):
-            cols = st.columns(2)
-            for i, (k, v) in enumerate(sections['Domain Information'].items()):
-                cols[i % 2].markdown(f"**{k}:** {v}")
-    
-    if 'Registrar Information' in sections:
-        with st.expander("📋 Registrar Information", expanded=True):
-            cols = st.columns(2)
-            for i, (k, v) in enumerate(sections['Registrar Information'].items()):
-                cols[i % 2].markdown(f"**{k}:** {v}")
-    
-    with st.expander("🛡️ DNSSEC Status", expanded=True):
-        st.info(f"**Status:** {dnssec_status}")
-    
-    with st.expander("🌐 Name Servers", expanded=True):
-        if ns_list:
-            for ns in ns_list:
-                st.code(ns)
-        else:
-            st.warning("No nameservers found")    
-
 def get_dnssec_info(domain):
     """Get DNSSEC status - Info only"""
     try:
@@ -759,218 +953,4145 @@ def get_live_ns(domain):
         pass
     return []
 
-def search_kb(query):
-    """Search knowledge base for relevant articles"""
-    query = query.lower()
-    results = []
-   
-    for category, articles in HOSTAFRICA_KB.items():
-        for article in articles:
-            # Check if query matches title or keywords
-            if query in article['title'].lower():
-                results.append({**article, 'category': category, 'relevance': 2})
-            elif any(query in keyword for keyword in article['keywords']):
-                results.append({**article, 'category': category, 'relevance': 1})
-   
-    # Sort by relevance
-    results.sort(key=lambda x: x['relevance'], reverse=True)
-    return results[:10]
-    
-# Knowledge Base Articles Database
-HOSTAFRICA_KB = {
-    'email': [
-        {
-            'title': 'DirectAdmin and cPanel Email',
-            'url': 'https://help.hostafrica.com/category/control-panel-and-emails',
-            'keywords': ['email', 'setup', 'imap', 'smtp', 'outlook', 'thunderbird', 'mail', 'configure', 'client']
-        },
-        {
-            'title': 'HMail and Workspace',
-            'url': 'https://help.hostafrica.com/category/professional-email-and-workspace',
-            'keywords': ['Hmail', 'Professional Mail', 'email', 'setup', 'imap', 'smtp', 'outlook', 'thunderbird', 'mail', 'configure', 'client']
-        }
-    ],
-    'domain': [
-        {
-            'title': 'How to Point Your Domain to HostAfrica',
-            'url': 'https://help.hostafrica.com/category/domains',
-            'keywords': ['domain', 'nameservers', 'dns', 'pointing', 'ns1', 'ns2', 'setup']
-        },
-        {
-            'title': 'Understanding DNS Records (A, CNAME, MX, TXT)',
-            'url': 'https://help.hostafrica.com/category/dns-and-nameservers',
-            'keywords': ['dns', 'records', 'a record', 'cname', 'mx', 'txt', 'zone', 'propagation']
-        },
-        {
-            'title': 'Domain Transfer Guide',
-            'url': 'https://help.hostafrica.com/category/domains',
-            'keywords': ['domain', 'transfer', 'epp', 'auth code', 'registrar', 'migrate']
-        }
-    ],
-    'cpanel': [
-        {
-            'title': 'cPanel Getting Started Guide',
-            'url': 'https://help.hostafrica.com/category/control-panel-and-emails/cpanel',
-            'keywords': ['cpanel', 'getting started', 'basics', 'login', 'dashboard', 'control panel']
-        },
-        {
-            'title': 'DirectAdmin Getting Started Guide',
-            'url': 'https://help.hostafrica.com/category/control-panel-and-emails/directadmin',
-            'keywords': ['DirectAdmin', 'getting started', 'basics', 'login', 'dashboard']
-        }
-    ],
-    'ssl': [
-        {
-            'title': 'SSL Certificate',
-            'url': 'https://help.hostafrica.com/category/ssl-certificates',
-            'keywords': ['ssl', 'https', 'certificate', 'secure']
-        }
-    ],
-    'wordpress': [
-        {
-            'title': 'WordPress',
-            'url': 'https://help.hostafrica.com/category/wordpress',
-            'keywords': ['wordpress', 'install', 'softaculous', 'one click', 'wp', 'setup']
-        },
-        {
-            'title': 'Softaculous',
-            'url': 'https://help.hostafrica.com/category/softaculous',
-            'keywords': ['softaculous', 'one click']
-        }
-    ]
-} 
-
-# ============================================================================
-# SINGLE-PAGE NAVIGATION RENDERER
-# ============================================================================
-def _sanitize_key(s: str) -> str:
-    """Return a safe key fragment for Streamlit widget keys"""
-    return re.sub(r'\W+', '_', s).strip('_')
+def fetch_ssl_certificate(domain, port=443, timeout=None):
+    """Verified TLS handshake; returns (success, certificate summary or error message)"""
+    try:
+        context = ssl.create_default_context()
+        with socket.create_connection((domain, port), timeout=timeout or CONFIG['request_timeout']) as sock:
+            with context.wrap_socket(sock, server_hostname=domain) as ssock:
+                cert = ssock.getpeercert()
+                der = ssock.getpeercert(binary_form=True)
+    except ssl.SSLError as e:
+        return False, f"SSL Error: {str(e)}"
+    except socket.gaierror:
+        return False, "Could not resolve domain"
+    except socket.timeout:
+        return False, "Connection timed out"
+    except Exception as e:
+        return False, f"Error: {str(e)}"
 
-def render_all_categories_and_tools():
-    """Render a single page with all categories and their tools (grid of buttons)"""
-    
-    # HEADER
-    # ---------------------------------------------------
-    st.markdown("""
-        <style>
-        .centered-header {
-            text-align: center;
-            margin: 1rem 0 2rem 0;
-            padding: 0 1rem;
-        }
-        
-        .centered-header h1 {
-            font-size: 2rem;
-            font-weight: 700;
-            color: #0F1724;
-            margin-bottom: 0.5rem;
-            letter-spacing: -0.02em;
-        }
-        
-        .centered-header h3 {
-            font-size: 1.1rem;
-            font-weight: 400;
-            color: #586069;
-            margin-bottom: 1rem;
-            margin-top: 0;
-        }
-        
-        .centered-header .tools-badge {
-            display: inline-block;
-            background: linear-gradient(90deg, #0078D4 0%, #2B88D8 100%);
-            color: white;
-            padding: 0.6rem 1.5rem;
-            border-radius: 8px;
-            font-size: 0.95rem;
-            font-weight: 700;
-            box-shadow: 0 4px 12px rgba(0, 120, 212, 0.2);
-            margin-bottom: 1.5rem;
-            transition: transform 180ms ease, box-shadow 180ms ease;
-        }
-        
-        .centered-header .tools-badge:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 6px 16px rgba(0, 120, 212, 0.25);
-        }
-        
-        .centered-header hr {
-            margin: 1.5rem auto;
-            max-width: 80%;
-            border: none;
-            border-top: 1px solid rgba(0, 0, 0, 0.08);
-        }
-        </style>
-        
-        <div class="centered-header">
-            <h1>🏠 Welcome to Support Buddy</h1>
-            <h3>Your Complete Technical Support Toolkit.</h3>
-            <div class="tools-badge">📊 36 tools available</div>
-            <hr>
-        </div>
-    """, unsafe_allow_html=True)
+    issuer = dict(x[0] for x in cert['issuer'])
+    expires = datetime.fromtimestamp(ssl.cert_time_to_seconds(cert['notAfter']), timezone.utc)
+    return True, {
+        'issuer': issuer.get('organizationName') or issuer.get('commonName', 'Unknown'),
+        'subject': dict(x[0] for x in cert['subject']).get('commonName', ''),
+        'not_before': cert['notBefore'],
+        'not_after': cert['notAfter'],
+        'expires': expires,
+        'days_left': (expires - datetime.now(timezone.utc)).days,
+        'san': [value for _, value in cert.get('subjectAltName', ())],
+        'fingerprint': hashlib.sha256(der).hexdigest()
+    }
 
-    for category_name, category_info in TOOL_CATEGORIES.items():
-        icon = category_info.get('icon', '')
-        description = category_info.get('description', '')
-        color = category_info.get('color', None)
+def fetch_unverified_certificate(domain, port=443, timeout=None):
+    """Unverified TLS handshake to read a certificate the verified one rejected.
 
-        # Category header
-        st.markdown(f"## {icon} {category_name}")
-        if description:
-            st.caption(description)
+    For reporting expiry and fingerprint only. Issuer, dates and SANs need the
+    cryptography package; without it just the fingerprint comes back.
+    """
+    try:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        with socket.create_connection((domain, port), timeout=timeout or CONFIG['request_timeout']) as sock:
+            with context.wrap_socket(sock, server_hostname=domain) as ssock:
+                der = ssock.getpeercert(binary_form=True)
+    except Exception as e:
+        return False, f"Error: {str(e)}"
 
-        tools = category_info.get('tools', [])
-        num_cols = 4
+    summary = {'issuer': None, 'subject': '', 'expires': None, 'days_left': None, 'san': [],
+               'fingerprint': hashlib.sha256(der).hexdigest()}
+    if not X509_AVAILABLE:
+        return True, summary
+    try:
+        cert = x509.load_der_x509_certificate(der)
+    except ValueError:
+        return True, summary
 
-        # Render tools in rows of num_cols
-        for row_start in range(0, len(tools), num_cols):
-            cols = st.columns(num_cols)
-            for i in range(num_cols):
-                tool_idx = row_start + i
-                if tool_idx < len(tools):
-                    tool = tools[tool_idx]
-                    safe_cat = _sanitize_key(category_name)
-                    # Unique key per category + index
-                    btn_key = f"btn_{safe_cat}_{tool_idx}"
-                    with cols[i]:
-                        if st.button(tool, key=btn_key, use_container_width=True):
-                            st.session_state.selected_tool = tool
-                            st.rerun()
+    def name_value(name, *oids):
+        for oid in oids:
+            attributes = name.get_attributes_for_oid(oid)
+            if attributes:
+                return attributes[0].value
+        return None
 
-        st.markdown("---")
+    expires = getattr(cert, 'not_valid_after_utc', None) or cert.not_valid_after.replace(tzinfo=timezone.utc)
+    try:
+        san = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value.get_values_for_type(x509.DNSName)
+    except x509.ExtensionNotFound:
+        san = []
+    summary.update(
+        issuer=name_value(cert.issuer, NameOID.ORGANIZATION_NAME, NameOID.COMMON_NAME) or 'Unknown',
+        subject=name_value(cert.subject, NameOID.COMMON_NAME) or '',
+        expires=expires,
+        days_left=(expires - datetime.now(timezone.utc)).days,
+        san=san
+    )
+    return True, summary
 
 # ============================================================================
-# MAIN APP ROUTING (SINGLE-STATE: selected_tool only)
+# DNS TRACE & DELEGATION CACHE
 # ============================================================================
-if st.session_state.selected_tool is None:
-    # Show all categories with their tools on a single page
-    render_all_categories_and_tools()
+class TTLCache:
+    """Thread-safe in-memory cache where every entry carries its own expiry"""
 
-else:
-    # Show the selected tool (existing implementations reused)
-    tool = st.session_state.selected_tool
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data = {}
+        self._lock = threading.Lock()
 
-    # Back button
-    if st.button("← Back to All Tools", key="back_to_all_tools"):
-        st.session_state.selected_tool = None
-        st.rerun()
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.hits += 1
+                    return entry[1]
+                del self._data[key]
+            self.misses += 1
+            return default
 
-# ============================================================================
-# MAIN CONTENT - TOOL IMPLEMENTATIONS (unchanged, uses 'tool' variable)
-# ============================================================================
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            if key not in self._data and len(self._data) >= self.max_entries:
+                now = time.monotonic()
+                for k in [k for k, v in self._data.items() if v[0] <= now]:
+                    del self._data[k]
+                while len(self._data) >= self.max_entries:
+                    del self._data[next(iter(self._data))]
+            self._data[key] = (time.monotonic() + ttl, value)
 
-    if tool == "🔐 PIN Checker":
-        st.title("🔐 PIN Checker")
-        st.markdown("Verify customer PINs for secure account access and verification.")
-        
-        col1, col2 = st.columns([3, 1])
-        with col1:
-            st.info("Check the provided customer PIN against the WHMCS records.")
-        with col2:
-            st.link_button("Open Tool", "https://my.hostafrica.com/admin/admin_tool/client-pin", use_container_width=True)
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
 
-    elif tool == "🔓 IP Unban":
+    def __len__(self):
+        return len(self._data)
+
+# IPv4 addresses of the 13 root servers (from the IANA root hints file)
+ROOT_SERVERS = {
+    'a.root-servers.net': '198.41.0.4',
+    'b.root-servers.net': '170.247.170.2',
+    'c.root-servers.net': '192.33.4.12',
+    'd.root-servers.net': '199.7.91.13',
+    'e.root-servers.net': '192.203.230.10',
+    'f.root-servers.net': '192.5.5.241',
+    'g.root-servers.net': '192.112.36.4',
+    'h.root-servers.net': '198.97.190.53',
+    'i.root-servers.net': '192.36.148.17',
+    'j.root-servers.net': '192.58.128.30',
+    'k.root-servers.net': '193.0.14.129',
+    'l.root-servers.net': '199.7.83.42',
+    'm.root-servers.net': '202.12.27.33'
+}
+
+@st.cache_resource
+def get_delegation_cache():
+    """Process-wide cache of root and TLD referrals shared by all traces"""
+    return TTLCache(max_entries=5000)
+
+def dns_query_server(qname, rdtype, server_ip, port=53, recursion=False, timeout=None):
+    """Send a single query to one server, retrying over TCP when truncated.
+
+    Returns (response, latency_ms).
+    """
+    timeout = timeout or CONFIG['dns_timeout']
+    query = dns.message.make_query(qname, rdtype)
+    if not recursion:
+        query.flags &= ~dns.flags.RD
+    start = time.perf_counter()
+    response = dns.query.udp(query, server_ip, timeout=timeout, port=port)
+    if response.flags & dns.flags.TC:
+        response = dns.query.tcp(query, server_ip, timeout=timeout, port=port)
+    return response, (time.perf_counter() - start) * 1000
+
+def _referral_from_response(response, current_zone):
+    """Extract (zone, [(ns, ip)], glue) from a referral, or None"""
+    for rrset in response.authority:
+        if rrset.rdtype != dns.rdatatype.NS:
+            continue
+        zone = rrset.name
+        if zone == current_zone or not zone.is_subdomain(current_zone):
+            return None  # Upward or sideways referral - lame delegation
+        glue = {}
+        for add in response.additional:
+            if add.rdtype in (dns.rdatatype.A, dns.rdatatype.AAAA):
+                glue.setdefault(add.name.to_text().lower(), []).extend(str(r) for r in add)
+        servers = []
+        for rdata in rrset:
+            ns = rdata.target.to_text().lower()
+            ipv4 = [ip for ip in glue.get(ns, []) if ':' not in ip]
+            servers.append((ns.rstrip('.'), ipv4[0] if ipv4 else None))
+        return {
+            'zone': zone,
+            'servers': servers,
+            'glue': {k.rstrip('.'): v for k, v in glue.items()},
+            'ttl': rrset.ttl
+        }
+    return None
+
+def _closest_cached_delegation(qname):
+    """Return the deepest cached referral enclosing qname, or None"""
+    cache = get_delegation_cache()
+    name = qname
+    while name != dns.name.root:
+        referral = cache.get(name.to_text().lower())
+        if referral:
+            return referral
+        name = name.parent()
+    return None
+
+def _nameserver_address(ns, ip):
+    """Return the glue address, resolving out-of-bailiwick nameservers recursively"""
+    if ip:
+        return ip
+    success, addrs = lookup_dns_record(ns, 'A')
+    return addrs[0] if success and addrs else None
+
+def trace_dns(domain, record_type='A', use_cache=True, root_servers=None, port=53):
+    """Resolve iteratively from the roots, following referrals and CNAMEs.
+
+    Returns a list of hop dicts in the order they were taken.
+    """
+    hops = []
+    cache = get_delegation_cache()
+    roots = list((root_servers or ROOT_SERVERS).items())
+    qname = dns.name.from_text(domain)
+    rdtype = dns.rdatatype.from_text(record_type)
+    chain = 0
+
+    while True:
+        zone, servers = dns.name.root, roots
+        cached = _closest_cached_delegation(qname) if use_cache else None
+        if cached:
+            zone, servers = cached['zone'], cached['servers']
+            hops.append({
+                'zone': zone.to_text(), 'server': '(cache)', 'server_ip': '',
+                'latency_ms': 0.0, 'result': 'cached referral', 'qname': qname.to_text(),
+                'details': ', '.join(ns for ns, _ in servers), 'glue': cached['glue']
+            })
+
+        next_name = None
+        while len(hops) < CONFIG['trace_max_hops']:
+            response, server, server_ip, latency, error = None, None, None, 0.0, None
+            for ns, ip in servers:
+                ip = _nameserver_address(ns, ip)
+                if not ip:
+                    continue
+                try:
+                    response, latency = dns_query_server(qname, rdtype, ip, port=port)
+                    server, server_ip = ns, ip
+                    break
+                except Exception as e:
+                    error = f"{ns} ({ip}): {e}"
+            hop = {
+                'zone': zone.to_text(), 'server': server or '-', 'server_ip': server_ip or '',
+                'latency_ms': round(latency, 1), 'qname': qname.to_text(), 'details': '', 'glue': {}
+            }
+            hops.append(hop)
+
+            if response is None:
+                hop['result'] = 'error'
+                hop['details'] = error or 'No reachable nameserver address'
+                return hops
+
+            rcode = response.rcode()
+            if rcode == dns.rcode.NXDOMAIN:
+                hop['result'] = 'NXDOMAIN'
+                hop['details'] = f"{qname.to_text()} does not exist"
+                return hops
+            if rcode != dns.rcode.NOERROR:
+                hop['result'] = 'error'
+                hop['details'] = f"Server returned {dns.rcode.to_text(rcode)}"
+                return hops
+
+            answer = [r for r in response.answer if r.name == qname]
+            direct = [r for r in answer if r.rdtype == rdtype]
+            cname = [r for r in answer if r.rdtype == dns.rdatatype.CNAME]
+            if direct:
+                hop['result'] = 'answer'
+                hop['details'] = ', '.join(str(r) for r in direct[0])
+                hop['ttl'] = direct[0].ttl
+                return hops
+            if cname:
+                next_name = cname[0][0].target
+                hop['result'] = 'CNAME'
+                hop['details'] = f"→ {next_name.to_text()}"
+                break
+
+            referral = _referral_from_response(response, zone)
+            if referral:
+                hop['result'] = 'referral'
+                hop['details'] = f"{referral['zone'].to_text()} → " + ', '.join(ns for ns, _ in referral['servers'])
+                hop['glue'] = referral['glue']
+                if use_cache and len(zone) <= 2:
+                    # Only referrals handed out by the root and TLD servers are shared
+                    ttl = min(referral['ttl'], CONFIG['delegation_cache_max_ttl'])
+                    cache.set(referral['zone'].to_text().lower(), referral, ttl)
+                zone, servers = referral['zone'], referral['servers']
+                continue
+
+            if any(r.rdtype == dns.rdatatype.SOA for r in response.authority):
+                hop['result'] = 'NODATA'
+                hop['details'] = f"No {record_type} records at {qname.to_text()}"
+            else:
+                hop['result'] = 'lame'
+                hop['details'] = "Server is not authoritative and gave no usable referral"
+            return hops
+        else:
+            hops.append({
+                'zone': zone.to_text(), 'server': '-', 'server_ip': '', 'latency_ms': 0.0,
+                'qname': qname.to_text(), 'result': 'error', 'glue': {},
+                'details': f"Gave up after {CONFIG['trace_max_hops']} hops"
+            })
+            return hops
+
+        chain += 1
+        if chain > CONFIG['trace_max_cname_chain']:
+            hops.append({
+                'zone': '', 'server': '-', 'server_ip': '', 'latency_ms': 0.0,
+                'qname': next_name.to_text(), 'result': 'error', 'glue': {},
+                'details': f"CNAME chain longer than {CONFIG['trace_max_cname_chain']}"
+            })
+            return hops
+        qname = next_name
+
+# ============================================================================
+# DNS LATENCY BENCHMARK
+# ============================================================================
+PUBLIC_RESOLVERS = {
+    'Google (8.8.8.8)': '8.8.8.8',
+    'Cloudflare (1.1.1.1)': '1.1.1.1',
+    'Quad9 (9.9.9.9)': '9.9.9.9',
+    'OpenDNS (208.67.222.222)': '208.67.222.222'
+}
+
+def get_authoritative_servers(domain):
+    """Return [(nameserver, ip)] for the domain's delegated nameservers"""
+    success, ns_records = lookup_dns_record(domain, 'NS')
+    if not success:
+        return []
+    servers = []
+    for ns in sorted(r.rstrip('.').lower() for r in ns_records):
+        ok, addrs = lookup_dns_record(ns, 'A')
+        if ok and addrs:
+            servers.append((ns, addrs[0]))
+    return servers
+
+def benchmark_dns_server(server_ip, domain, record_type='A', count=20, concurrency=5,
+                         cold=False, recursion=True, port=53):
+    """Time repeated queries against one server.
+
+    Cold passes query a unique random label per request so a recursive
+    resolver cannot answer from its cache. Failed queries are NaN.
+    """
+    def one_query(i):
+        if cold:
+            qname = f"sb-{random.getrandbits(48):012x}.{domain}"
+        else:
+            qname = domain
+        try:
+            _, latency = dns_query_server(qname, record_type, server_ip, port=port, recursion=recursion)
+            return latency
+        except Exception:
+            return np.nan
+
+    if not cold:
+        one_query(-1)  # Prime the cache so every timed query is a hit
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        samples = list(pool.map(one_query, range(count)))
+    return np.array(samples, dtype=float)
+
+def summarize_latencies(samples):
+    """Return min/p50/p95/p99/max statistics (ms) for a latency array"""
+    ok = samples[~np.isnan(samples)]
+    stats = {'queries': int(samples.size), 'errors': int(samples.size - ok.size)}
+    if ok.size == 0:
+        return {**stats, 'min': np.nan, 'p50': np.nan, 'p95': np.nan, 'p99': np.nan, 'max': np.nan, 'mean': np.nan}
+    p50, p95, p99 = np.percentile(ok, [50, 95, 99])
+    return {
+        **stats,
+        'min': float(ok.min()),
+        'p50': float(p50),
+        'p95': float(p95),
+        'p99': float(p99),
+        'max': float(ok.max()),
+        'mean': float(ok.mean())
+    }
+
+# ============================================================================
+# SUBDOMAIN DISCOVERY
+# ============================================================================
+SUBDOMAIN_WORDLIST = [
+    'www', 'mail', 'webmail', 'smtp', 'pop', 'pop3', 'imap', 'mx', 'mx1', 'mx2',
+    'email', 'autodiscover', 'autoconfig', 'cpanel', 'whm', 'webdisk', 'cpcalendars',
+    'cpcontacts', 'directadmin', 'plesk', 'ftp', 'sftp', 'ns', 'ns1', 'ns2', 'ns3',
+    'dns', 'dns1', 'dns2', 'admin', 'administrator', 'portal', 'login', 'secure',
+    'vpn', 'remote', 'rdp', 'owa', 'exchange', 'lyncdiscover', 'sip', 'enterpriseregistration',
+    'enterpriseenrollment', 'msoid', 'shop', 'store', 'cart', 'checkout', 'pay', 'payments',
+    'billing', 'invoice', 'crm', 'erp', 'hr', 'intranet', 'extranet', 'staff', 'support',
+    'help', 'helpdesk', 'ticket', 'tickets', 'kb', 'docs', 'wiki', 'blog', 'news', 'forum',
+    'community', 'events', 'media', 'img', 'images', 'static', 'assets', 'cdn', 'files',
+    'download', 'downloads', 'upload', 'uploads', 'backup', 'backups', 'storage', 'cloud',
+    'dev', 'development', 'staging', 'stage', 'test', 'testing', 'qa', 'uat', 'demo',
+    'beta', 'preview', 'old', 'new', 'legacy', 'v1', 'v2', 'app', 'apps', 'api',
+    'api2', 'm', 'mobile', 'web', 'web1', 'web2', 'server', 'server1', 'host', 'cp',
+    'panel', 'dashboard', 'monitor', 'status', 'stats', 'analytics', 'git', 'gitlab',
+    'jenkins', 'ci', 'db', 'mysql', 'sql', 'phpmyadmin', 'pma', 'crm2', 'office',
+    'calendar', 'meet', 'chat', 'video', 'live', 'radio', 'tv', 'go', 'link', 'links',
+    'click', 'track', 'email2', 'newsletter', 'lists', 'list', 'bounce', 'relay',
+    'mailgw', 'gateway', 'proxy', 'fw', 'firewall', 'router', 'wp', 'wordpress',
+    'joomla', 'moodle', 'elearning', 'learn', 'lms', 'careers', 'jobs', 'partners',
+    'partner', 'clients', 'client', 'my', 'account', 'accounts', 'members', 'member',
+    'signup', 'register', 'auth', 'sso', 'id', 'identity', 'ldap', 'ad', 'dc', 'smtp2',
+    'imap2', 'mail2', 'webmail2', 'shop2', 'store2', 'en', 'fr', 'za', 'ng', 'ke', 'gh'
+]
+
+class RateLimiter:
+    """Thread-safe token bucket limiting calls to `rate` per second"""
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = float(rate)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def resolve_host(name, resolver, limiter=None):
+    """Resolve A/AAAA for a name, reporting any CNAME in front of it.
+
+    Returns None when the name does not exist.
+    """
+    host = {'name': name, 'cname': None, 'ttl': None, 'A': [], 'AAAA': []}
+    for rdtype in ('A', 'AAAA'):
+        if limiter:
+            limiter.acquire()
+        try:
+            answer = resolver.resolve(name, rdtype, raise_on_no_answer=False)
+        except dns.resolver.NXDOMAIN:
+            return None
+        except dns.exception.DNSException:
+            continue
+        for rrset in answer.response.answer:
+            if rrset.rdtype == dns.rdatatype.CNAME and rrset.name.to_text().rstrip('.').lower() == name:
+                host['cname'] = rrset[0].target.to_text().rstrip('.')
+                host['ttl'] = rrset.ttl
+        if answer.rrset is not None:
+            host[rdtype] = sorted(str(r) for r in answer.rrset)
+            host['ttl'] = host['ttl'] or answer.rrset.ttl
+    return host
+
+def detect_wildcard(domain, resolver, probes=3):
+    """Probe random labels; return the set of answers a wildcard hands out"""
+    answers = set()
+    for _ in range(probes):
+        host = resolve_host(f"sb-{random.getrandbits(48):012x}.{domain}", resolver)
+        if host:
+            answers.update(host['A'] + host['AAAA'])
+            if host['cname']:
+                answers.add(host['cname'])
+    return answers
+
+def subdomain_names(domain, labels):
+    """Build label.domain names, dropping labels that cannot form a valid DNS name.
+
+    Returns (names, skipped_labels).
+    """
+    names, skipped = [], []
+    for label in labels:
+        label = label.strip().lower().strip('.')
+        if not label:
+            continue
+        name = f"{label}.{domain}"
+        try:
+            dns.name.from_text(name)
+        except dns.exception.DNSException:
+            skipped.append(label)
+            continue
+        names.append(name)
+    return list(dict.fromkeys(names)), skipped
+
+def discover_subdomains(domain, labels, resolver=None, max_workers=None, rate=None, progress_cb=None):
+    """Resolve label.domain for every label concurrently under a rate cap.
+
+    Returns (hosts, wildcard_answers, skipped_labels). Hosts whose answers
+    match the wildcard are dropped.
+    """
+    resolver = resolver or get_resolver()
+    limiter = RateLimiter(rate or CONFIG['discovery_rate_limit'])
+    names, skipped = subdomain_names(domain, labels)
+    wildcard = detect_wildcard(domain, resolver)
+    hosts = []
+
+    with ThreadPoolExecutor(max_workers=max_workers or CONFIG['discovery_workers']) as pool:
+        futures = [pool.submit(resolve_host, name, resolver, limiter) for name in names]
+        for done, future in enumerate(as_completed(futures), 1):
+            host = future.result()
+            if progress_cb:
+                progress_cb(done, len(futures))
+            if not host or not (host['A'] or host['AAAA'] or host['cname']):
+                continue
+            seen = set(host['A'] + host['AAAA'])
+            if host['cname']:
+                seen.add(host['cname'])
+            if wildcard and seen <= wildcard:
+                continue
+            hosts.append(host)
+
+    hosts.sort(key=lambda h: h['name'])
+    return hosts, wildcard, skipped
+
+def hosts_to_zone_records(hosts, domain):
+    """Flatten discovered hosts into zone-file style rows"""
+    rows = []
+    for host in hosts:
+        label = host['name'][:-(len(domain) + 1)]
+        ttl = host['ttl'] or 3600
+        if host['cname']:
+            rows.append({'Name': label, 'TTL': ttl, 'Type': 'CNAME', 'Value': host['cname'] + '.'})
+            continue
+        for rdtype in ('A', 'AAAA'):
+            for value in host[rdtype]:
+                rows.append({'Name': label, 'TTL': ttl, 'Type': rdtype, 'Value': value})
+    return rows
+
+# ============================================================================
+# ZONE FILE IMPORT & DIFF
+# ============================================================================
+ZONE_DIFF_SKIP_TYPES = {'SOA', 'RRSIG', 'NSEC', 'NSEC3', 'NSEC3PARAM', 'DNSKEY'}
+
+def _normalize_rdata(rdata):
+    """Comparable text form of an rdata (TXT strings are joined, case folded)"""
+    if rdata.rdtype in (dns.rdatatype.TXT, dns.rdatatype.SPF):
+        return b''.join(rdata.strings).decode('utf-8', errors='replace')
+    return rdata.to_text().lower()
+
+def parse_zone_file(text, origin):
+    """Parse a BIND/cPanel zone export into {(name, type): {values}}"""
+    zone = dns.zone.from_text(text, origin=origin, relativize=False, check_origin=False)
+    records = {}
+    for name, node in zone.nodes.items():
+        for rdataset in node.rdatasets:
+            rdtype = dns.rdatatype.to_text(rdataset.rdtype)
+            if rdtype in ZONE_DIFF_SKIP_TYPES:
+                continue
+            key = (name.to_text().lower(), rdtype)
+            records.setdefault(key, set()).update(_normalize_rdata(r) for r in rdataset)
+    return records
+
+def query_live_rrset(name, rdtype, servers, port=53):
+    """Ask the authoritative servers directly; returns (status, {values}).
+
+    A REFUSED/SERVFAIL answer moves on to the next server. Names at or
+    below a zone cut get a referral rather than an answer: the delegation
+    NS set and any glue are read from the referral, anything else comes
+    back as DELEGATED.
+    """
+    error = "No authoritative servers"
+    qname = dns.name.from_text(name)
+    wanted = dns.rdatatype.from_text(rdtype)
+    for ns, ip in servers:
+        try:
+            response, _ = dns_query_server(name, rdtype, ip, port=port)
+        except Exception as e:
+            error = f"{ns}: {e}"
+            continue
+        rcode = response.rcode()
+        if rcode == dns.rcode.NXDOMAIN:
+            return 'NXDOMAIN', set()
+        if rcode != dns.rcode.NOERROR:
+            error = f"{ns}: {dns.rcode.to_text(rcode)}"
+            continue
+        values = set()
+        for rrset in response.answer:
+            if rrset.name == qname and rrset.rdtype == wanted:
+                values.update(_normalize_rdata(r) for r in rrset)
+        cut = next((rrset for rrset in response.authority if rrset.rdtype == dns.rdatatype.NS), None)
+        if not response.answer and not response.flags & dns.flags.AA and cut is not None:
+            section = response.authority if wanted == dns.rdatatype.NS and cut.name == qname else response.additional
+            for rrset in section:
+                if rrset.name == qname and rrset.rdtype == wanted:
+                    values.update(_normalize_rdata(r) for r in rrset)
+            if not values:
+                return f"DELEGATED to {cut.name.to_text().rstrip('.')}", set()
+        return 'OK', values
+    return f"ERROR: {error}", set()
+
+def diff_zone(records, servers, port=53, max_workers=None, progress_cb=None):
+    """Resolve every (name, type) in the file against the live servers"""
+    keys = sorted(records)
+    rows = []
+
+    def check(index, key):
+        # Rotate the starting server so load spreads over every nameserver
+        rotated = servers[index % len(servers):] + servers[:index % len(servers)] if servers else []
+        return key, query_live_rrset(key[0], key[1], rotated, port=port)
+
+    with ThreadPoolExecutor(max_workers=max_workers or CONFIG['zone_diff_workers']) as pool:
+        futures = [pool.submit(check, i, key) for i, key in enumerate(keys)]
+        for done, future in enumerate(as_completed(futures), 1):
+            (name, rdtype), (status, live) = future.result()
+            expected = records[(name, rdtype)]
+            missing, extra = expected - live, live - expected
+            if status.startswith('ERROR'):
+                result = '⚠️ Error'
+            elif status.startswith('DELEGATED'):
+                result = '↪️ Delegated'
+            elif not live:
+                result = '❌ Missing'
+            elif missing and extra:
+                result = '🔄 Changed'
+            elif missing:
+                result = '❌ Missing'
+            elif extra:
+                result = '➕ Extra'
+            else:
+                result = '✅ Match'
+            rows.append({
+                'Name': name,
+                'Type': rdtype,
+                'Status': result,
+                'File': '\n'.join(sorted(expected)),
+                'Live': '\n'.join(sorted(live)) if live else ('(no records)' if status == 'OK' else status),
+                'Missing Live': '\n'.join(sorted(missing)) if live else '',
+                'Extra Live': '\n'.join(sorted(extra))
+            })
+            if progress_cb:
+                progress_cb(done, len(futures))
+
+    rows.sort(key=lambda r: (r['Name'], r['Type']))
+    return rows
+
+# ============================================================================
+# CACHED RESOLVER & SPF EVALUATION
+# ============================================================================
+@st.cache_resource
+def get_dns_cache():
+    """Process-wide answer cache shared by SPF, DKIM, PTR and DNSBL lookups"""
+    return TTLCache(max_entries=50000)
+
+# Bound once per script run so worker threads never touch the cache registry
+DNS_CACHE = get_dns_cache()
+
+def resolve_cached(name, record_type, resolver=None):
+    """Resolve through the shared cache, honouring each answer's TTL.
+
+    Returns (status, values) where status is OK, NXDOMAIN, NODATA or an
+    ERROR message. Errors are not cached.
+    """
+    name = name.rstrip('.').lower()
+    resolver_key = tuple(resolver.nameservers) + (resolver.port,) if resolver else ()
+    key = (name, record_type, resolver_key)
+    cache = DNS_CACHE
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    resolver = resolver or get_resolver()
+    try:
+        answer = resolver.resolve(name, record_type, raise_on_no_answer=False)
+        if answer.rrset is None:
+            result, ttl = ('NODATA', []), CONFIG['negative_cache_ttl']
+        elif record_type in ('TXT', 'SPF'):
+            values = [b''.join(r.strings).decode('utf-8', errors='replace') for r in answer.rrset]
+            result, ttl = ('OK', values), answer.rrset.ttl
+        else:
+            result, ttl = ('OK', [str(r) for r in answer.rrset]), answer.rrset.ttl
+    except dns.resolver.NXDOMAIN:
+        result, ttl = ('NXDOMAIN', []), CONFIG['negative_cache_ttl']
+    except dns.resolver.Timeout:
+        return 'ERROR: DNS query timed out', []
+    except Exception as e:
+        return f"ERROR: {str(e)}", []
+
+    cache.set(key, result, ttl)
+    return result
+
+SPF_DNS_MECHANISMS = {'include', 'a', 'mx', 'ptr', 'exists'}
+SPF_QUALIFIERS = {'+': 'pass', '-': 'fail', '~': 'softfail', '?': 'neutral'}
+
+def get_spf_record(domain, resolver=None):
+    """Return (status, record) where status is OK, none, permerror or temperror"""
+    status, values = resolve_cached(domain, 'TXT', resolver)
+    if status.startswith('ERROR'):
+        return 'temperror', status[7:]
+    spf = [v for v in values if v.lower() == 'v=spf1' or v.lower().startswith('v=spf1 ')]
+    if not spf:
+        return 'none', f"No SPF record at {domain}"
+    if len(spf) > 1:
+        return 'permerror', f"{len(spf)} SPF records published at {domain}"
+    return 'OK', spf[0]
+
+def parse_spf_terms(record):
+    """Split an SPF record into mechanism and modifier dicts"""
+    terms = []
+    for token in record.split()[1:]:
+        if re.match(r'^[a-zA-Z][\w.-]*=', token):
+            name, value = token.split('=', 1)
+            terms.append({'type': 'modifier', 'name': name.lower(), 'value': value, 'text': token})
+            continue
+        qualifier = '+'
+        if token[0] in SPF_QUALIFIERS:
+            qualifier, token = token[0], token[1:]
+        match = re.match(r'^([a-zA-Z0-9]+)([:/].*)?$', token)
+        name = match.group(1).lower() if match else token.lower()
+        rest = (match.group(2) or '') if match else ''
+        value, cidr = rest, ''
+        if rest.startswith(':'):
+            value = rest[1:]
+            if name in ('a', 'mx') and '/' in value:
+                value, cidr = value.split('/', 1)
+                cidr = '/' + cidr
+        elif rest.startswith('/'):
+            value, cidr = '', rest
+        terms.append({
+            'type': 'mechanism', 'qualifier': qualifier, 'name': name,
+            'value': value, 'cidr': cidr, 'text': (qualifier if qualifier != '+' else '') + token
+        })
+    return terms
+
+def _spf_targets(terms):
+    """Domains that must be fetched as SPF records (include and redirect)"""
+    targets = [t['value'] for t in terms if t['type'] == 'mechanism' and t['name'] == 'include' and t['value']]
+    has_all = any(t['type'] == 'mechanism' and t['name'] == 'all' for t in terms)
+    redirect = next((t['value'] for t in terms if t['type'] == 'modifier' and t['name'] == 'redirect'), None)
+    if redirect and not has_all:
+        targets.append(redirect)
+    return targets
+
+def expand_spf_tree(domain, resolver=None, max_depth=10):
+    """Fetch the whole include/redirect tree level by level, concurrently.
+
+    Returns (root_node, total_lookups). Each node holds its record, parsed
+    terms, own DNS-lookup count and children.
+    """
+    root = {'domain': domain, 'children': [], 'depth': 0}
+    level = [root]
+    total_lookups = 0
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        while level:
+            results = list(pool.map(lambda n: get_spf_record(n['domain'], resolver), level))
+            next_level = []
+            for node, (status, record) in zip(level, results):
+                node['status'] = status
+                node['record'] = record if status == 'OK' else None
+                node['error'] = None if status == 'OK' else record
+                node['terms'] = parse_spf_terms(record) if status == 'OK' else []
+                mechanism_lookups = sum(
+                    1 for t in node['terms'] if t['type'] == 'mechanism' and t['name'] in SPF_DNS_MECHANISMS
+                )
+                redirect_lookups = 1 if any(
+                    t['type'] == 'modifier' and t['name'] == 'redirect' for t in node['terms']
+                ) and not any(t['type'] == 'mechanism' and t['name'] == 'all' for t in node['terms']) else 0
+                node['lookups'] = mechanism_lookups + redirect_lookups
+                total_lookups += node['lookups']
+                if node['depth'] >= max_depth:
+                    node['error'] = node['error'] or "Include depth limit reached"
+                    continue
+                for target in _spf_targets(node['terms']):
+                    if '%' in target:
+                        continue  # Macro targets depend on the sender - evaluated by check_host
+                    child = {'domain': target.lower(), 'children': [], 'depth': node['depth'] + 1}
+                    node['children'].append(child)
+                    next_level.append(child)
+            level = next_level
+    return root, total_lookups
+
+def expand_spf_macros(spec, ip, domain, sender):
+    """Expand RFC 7208 section 7 macros in a domain-spec"""
+    sender = sender or f"postmaster@{domain}"
+    local, _, sender_domain = sender.rpartition('@')
+    addr = ipaddress.ip_address(ip)
+    if addr.version == 4:
+        i_value = str(addr)
+    else:
+        i_value = '.'.join(addr.exploded.replace(':', ''))
+    values = {
+        's': sender, 'l': local or 'postmaster', 'o': sender_domain, 'd': domain,
+        'i': i_value, 'p': 'unknown', 'v': 'in-addr' if addr.version == 4 else 'ip6', 'h': domain
+    }
+
+    def replace(match):
+        letter, digits, reverse, delimiters = match.groups()
+        value = values.get(letter.lower(), '')
+        parts = re.split('[' + re.escape(delimiters or '.') + ']', value)
+        if reverse:
+            parts.reverse()
+        if digits:
+            parts = parts[-int(digits):]
+        return '.'.join(parts)
+
+    spec = spec.replace('%%', '\x00').replace('%_', ' ').replace('%-', '%20')
+    spec = re.sub(r'%\{([slodipvhSLODIPVH])(\d*)(r?)([.\-+,/_=]*)\}', replace, spec)
+    return spec.replace('\x00', '%')
+
+def _spf_addresses(host, version, state, resolver):
+    """A/AAAA addresses for a host, counting void lookups"""
+    status, values = resolve_cached(host, 'A' if version == 4 else 'AAAA', resolver)
+    if status.startswith('ERROR'):
+        raise RuntimeError(status)
+    if status in ('NXDOMAIN', 'NODATA'):
+        state['void'] += 1
+        if state['void'] > CONFIG['spf_void_lookup_limit']:
+            raise ValueError("Too many void DNS lookups")
+    return [ipaddress.ip_address(v) for v in values]
+
+def _spf_network_match(addr, hosts_ips, cidr):
+    """Check addr against resolved addresses using the a/mx dual-cidr-length"""
+    cidr4, cidr6 = 32, 128
+    if cidr:
+        parts = cidr.split('//')
+        if parts[0].strip('/'):
+            cidr4 = int(parts[0].strip('/'))
+        if len(parts) > 1 and parts[1]:
+            cidr6 = int(parts[1])
+    prefix = cidr4 if addr.version == 4 else cidr6
+    return any(addr in ipaddress.ip_network(f"{ip}/{prefix}", strict=False) for ip in hosts_ips)
+
+def check_host(ip, domain, sender=None, resolver=None, _state=None):
+    """Evaluate SPF check_host() for a sending IP (RFC 7208 section 4).
+
+    Returns a dict with result, the matched mechanism and domain, and the
+    evaluation trace.
+    """
+    state = _state or {'lookups': 0, 'void': 0, 'trace': []}
+    addr = ipaddress.ip_address(ip)
+
+    def finish(result, mechanism=None, matched_domain=None, reason=''):
+        return {
+            'result': result, 'mechanism': mechanism, 'domain': matched_domain or domain,
+            'reason': reason, 'lookups': state['lookups'], 'trace': state['trace']
+        }
+
+    status, record = get_spf_record(domain, resolver)
+    if status != 'OK':
+        return finish(status, reason=record)
+    terms = parse_spf_terms(record)
+    state['trace'].append(f"{domain}: {record}")
+
+    def count_lookup():
+        state['lookups'] += 1
+        if state['lookups'] > CONFIG['spf_lookup_limit']:
+            raise ValueError(f"More than {CONFIG['spf_lookup_limit']} DNS lookups")
+
+    try:
+        for term in terms:
+            if term['type'] != 'mechanism':
+                continue
+            name = term['name']
+            target = expand_spf_macros(term['value'], ip, domain, sender) if term['value'] else domain
+            matched = False
+
+            if name == 'all':
+                matched = True
+            elif name == 'ip4' or name == 'ip6':
+                network = ipaddress.ip_network(term['value'] + term['cidr'], strict=False)
+                matched = addr.version == network.version and addr in network
+            elif name == 'a':
+                count_lookup()
+                matched = _spf_network_match(addr, _spf_addresses(target, addr.version, state, resolver), term['cidr'])
+            elif name == 'mx':
+                count_lookup()
+                mx_status, mx_values = resolve_cached(target, 'MX', resolver)
+                if mx_status.startswith('ERROR'):
+                    return finish('temperror', term['text'], reason=mx_status)
+                hosts = [v.split()[-1].rstrip('.') for v in mx_values]
+                if len(hosts) > 10:
+                    # RFC 7208 section 4.6.4: more than 10 MX names is a permerror, not a truncation
+                    return finish('permerror', term['text'], reason=f"mx:{target} returned {len(hosts)} names (limit 10)")
+                addrs = []
+                for host in hosts:
+                    addrs += _spf_addresses(host, addr.version, state, resolver)
+                matched = _spf_network_match(addr, addrs, term['cidr'])
+            elif name == 'ptr':
+                count_lookup()
+                ptr_status, names = resolve_cached(dns.reversename.from_address(ip).to_text(), 'PTR', resolver)
+                for ptr_name in [n.rstrip('.').lower() for n in names][:10]:
+                    if ptr_name == target.lower() or ptr_name.endswith('.' + target.lower()):
+                        if addr in _spf_addresses(ptr_name, addr.version, state, resolver):
+                            matched = True
+                            break
+            elif name == 'exists':
+                count_lookup()
+                matched = bool(_spf_addresses(target, 4, state, resolver))
+            elif name == 'include':
+                count_lookup()
+                sub = check_host(ip, target, sender, resolver, state)
+                if sub['result'] == 'pass':
+                    matched = True
+                elif sub['result'] in ('temperror',):
+                    return finish('temperror', term['text'], reason=f"include:{target} - {sub['reason']}")
+                elif sub['result'] in ('permerror', 'none'):
+                    return finish('permerror', term['text'], reason=f"include:{target} - {sub['reason'] or sub['result']}")
+            else:
+                return finish('permerror', term['text'], reason=f"Unknown mechanism '{name}'")
+
+            if matched:
+                result = SPF_QUALIFIERS[term['qualifier']]
+                state['trace'].append(f"{domain}: {term['text']} matched → {result}")
+                return finish(result, term['text'], domain)
+
+        redirect = next((t for t in terms if t['type'] == 'modifier' and t['name'] == 'redirect'), None)
+        if redirect:
+            count_lookup()
+            target = expand_spf_macros(redirect['value'], ip, domain, sender)
+            sub = check_host(ip, target, sender, resolver, state)
+            if sub['result'] == 'none':
+                return finish('permerror', redirect['text'], reason=f"redirect target {target} has no SPF record")
+            return sub
+    except ValueError as e:
+        return finish('permerror', reason=str(e))
+    except RuntimeError as e:
+        return finish('temperror', reason=str(e))
+
+    return finish('neutral', reason="No mechanism matched")
+
+# ============================================================================
+# REVERSE DNS & DMARC AGGREGATE REPORTS
+# ============================================================================
+def lookup_ptr(ip, resolver=None):
+    """Return the PTR hostnames for an IP through the shared cache"""
+    try:
+        reverse_name = dns.reversename.from_address(ip).to_text()
+    except Exception:
+        return 'ERROR: Invalid IP address', []
+    status, names = resolve_cached(reverse_name, 'PTR', resolver)
+    return status, [n.rstrip('.').lower() for n in names]
+
+def lookup_ptrs(ips, resolver=None, max_workers=None):
+    """Resolve many PTRs concurrently; returns {ip: (status, [names])}"""
+    ips = list(dict.fromkeys(ips))
+    if not ips:
+        return {}
+    workers = min(len(ips), max_workers or CONFIG['ptr_workers'])
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(zip(ips, pool.map(lambda ip: lookup_ptr(ip, resolver), ips)))
+
+def expand_ip_targets(entries, limit=None):
+    """Expand IPs and CIDR ranges (v4/v6) into a deduplicated address list.
+
+    Returns (addresses, errors); ranges larger than the limit are rejected.
+    """
+    limit = limit or CONFIG['ptr_max_addresses']
+    addresses, errors = {}, []
+    for entry in entries:
+        try:
+            if '/' in entry:
+                network = ipaddress.ip_network(entry, strict=False)
+                if network.num_addresses > limit:
+                    errors.append(f"{entry}: {network.num_addresses:,} addresses exceeds the {limit:,} limit")
+                    continue
+                hosts = list(network.hosts()) or [network.network_address]
+            else:
+                hosts = [ipaddress.ip_address(entry)]
+        except ValueError:
+            errors.append(f"{entry}: not an IP address or CIDR range")
+            continue
+        for host in hosts:
+            addresses[str(host)] = None
+    if len(addresses) > limit:
+        errors.append(f"Only the first {limit:,} of {len(addresses):,} addresses were kept")
+    return list(addresses)[:limit], errors
+
+def resolve_forward(hostname, resolver=None):
+    """Return (status, [addresses]) from the A and AAAA records of a hostname"""
+    addresses, statuses = [], []
+    for rdtype in ('A', 'AAAA'):
+        status, values = resolve_cached(hostname, rdtype, resolver)
+        statuses.append(status)
+        addresses.extend(values)
+    if addresses:
+        return 'OK', addresses
+    errors = [s for s in statuses if s.startswith('ERROR')]
+    return (errors[0] if errors else statuses[0]), []
+
+GENERIC_PTR_PATTERN = re.compile(r'(^|[.-])(dynamic|dyn|dhcp|dsl|adsl|pool|cable|ppp|pppoe|broadband|cust|client)([.-]|\d)')
+
+def looks_generic_ptr(ip, hostname):
+    """True for ISP-style PTRs that embed the address or dynamic-pool keywords"""
+    if GENERIC_PTR_PATTERN.search(hostname):
+        return True
+    parts = ip.split('.')
+    if len(parts) != 4:
+        return False
+    return any(sep.join(order) in hostname for sep in ('-', '.') for order in (parts, parts[::-1]))
+
+def check_fcrdns(ips, resolver=None, max_workers=None, progress_cb=None):
+    """Forward-confirmed reverse DNS for many IPs.
+
+    PTR lookups and the forward A/AAAA confirmations share one pool, so a
+    hostname's forward lookup starts as soon as its PTR answer arrives and
+    each hostname is resolved only once however many IPs point at it.
+    """
+    ips = list(dict.fromkeys(ips))
+    if not ips:
+        return [], {}
+    resolver = resolver or get_resolver()
+    ptrs, forward = {}, {}
+    with ThreadPoolExecutor(max_workers=min(len(ips), max_workers or CONFIG['ptr_workers'])) as pool:
+        pending = {pool.submit(lookup_ptr, ip, resolver): ('ptr', ip) for ip in ips}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, key = pending.pop(future)
+                if kind == 'fwd':
+                    forward[key] = future.result()
+                    continue
+                ptrs[key] = future.result()
+                for host in ptrs[key][1]:
+                    if host not in forward:
+                        forward[host] = None
+                        pending[pool.submit(resolve_forward, host, resolver)] = ('fwd', host)
+                if progress_cb:
+                    progress_cb(len(ptrs), len(ips))
+
+    rows = []
+    for ip in ips:
+        status, names = ptrs[ip]
+        address = ipaddress.ip_address(ip)
+        confirmed, forward_addresses = [], []
+        for host in names:
+            _, addresses = forward[host]
+            forward_addresses.extend(addresses)
+            if any(ipaddress.ip_address(a) == address for a in addresses):
+                confirmed.append(host)
+        if status.startswith('ERROR'):
+            result = '⚠️ Error'
+        elif not names:
+            result = '❌ No PTR'
+        elif confirmed:
+            result = '✅ Pass'
+        elif not forward_addresses:
+            result = '⚠️ PTR host does not resolve'
+        else:
+            result = '❌ Mismatch'
+        notes = []
+        if len(names) > 1:
+            notes.append('Multiple PTR records')
+        if names and looks_generic_ptr(ip, names[0]):
+            notes.append('Generic ISP hostname - many receivers treat it as dynamic')
+        rows.append({
+            'IP': ip, 'PTR': ', '.join(names) or (status if status != 'OK' else '-'),
+            'Forward': ', '.join(dict.fromkeys(forward_addresses)) or '-', 'FCrDNS': result,
+            'Notes': '; '.join(notes)
+        })
+    return rows, forward
+
+def iter_report_streams(filename, fileobj):
+    """Yield (name, binary stream) for each XML report in a raw, .gz or .zip upload"""
+    lower = filename.lower()
+    if lower.endswith('.zip'):
+        with zipfile.ZipFile(fileobj) as archive:
+            for member in archive.infolist():
+                if member.is_dir():
+                    continue
+                with archive.open(member) as stream:
+                    if member.filename.lower().endswith('.gz'):
+                        with gzip.GzipFile(fileobj=stream) as inner:
+                            yield member.filename, inner
+                    else:
+                        yield member.filename, stream
+    elif lower.endswith('.gz'):
+        with gzip.GzipFile(fileobj=fileobj) as stream:
+            yield filename, stream
+    else:
+        yield filename, fileobj
+
+def _xml_text(elem, *tags, default=''):
+    """Text of a nested child, walking one plain tag at a time (C fast path)"""
+    for tag in tags:
+        if elem is None:
+            return default
+        elem = elem.find(tag)
+    return elem.text.strip() if elem is not None and elem.text else default
+
+def iter_dmarc_records(stream):
+    """Stream-parse one aggregate report, yielding a dict per <record>.
+
+    Processed elements are cleared as we go so memory stays flat no matter
+    how large the report is.
+    """
+    org, policy_domain, root = '', '', None
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if '}' in elem.tag:
+                elem.tag = elem.tag.split('}', 1)[1]  # Drop the DMARC 2.0 namespace
+            if root is None:
+                root = elem
+            continue
+        tag = elem.tag
+        if tag == 'record':
+            row = elem.find('row')
+            evaluated = row.find('policy_evaluated') if row is not None else None
+            auth = elem.find('auth_results')
+            yield {
+                'reporter': org,
+                'policy_domain': policy_domain,
+                'source_ip': _xml_text(row, 'source_ip'),
+                'count': int(_xml_text(row, 'count', default='0') or 0),
+                'disposition': _xml_text(evaluated, 'disposition', default='none'),
+                'dkim_aligned': _xml_text(evaluated, 'dkim') == 'pass',
+                'spf_aligned': _xml_text(evaluated, 'spf') == 'pass',
+                'header_from': _xml_text(elem, 'identifiers', 'header_from').lower(),
+                'dkim_domain': _xml_text(auth, 'dkim', 'domain').lower(),
+                'spf_domain': _xml_text(auth, 'spf', 'domain').lower()
+            }
+            root.clear()
+        elif tag == 'report_metadata':
+            org = _xml_text(elem, 'org_name')
+            root.clear()
+        elif tag == 'policy_published':
+            policy_domain = _xml_text(elem, 'domain')
+            root.clear()
+
+def aggregate_dmarc_reports(uploads):
+    """Fold many reports into per-source totals.
+
+    `uploads` is an iterable of (filename, fileobj). Returns
+    (DataFrame, stats) where stats counts reports, records and parse errors.
+    """
+    totals = {}
+    stats = {'reports': 0, 'records': 0, 'errors': [], 'reporters': set()}
+    for filename, fileobj in uploads:
+        try:
+            for name, stream in iter_report_streams(filename, fileobj):
+                stats['reports'] += 1
+                try:
+                    for rec in iter_dmarc_records(stream):
+                        stats['records'] += 1
+                        stats['reporters'].add(rec['reporter'])
+                        key = (rec['source_ip'], rec['header_from'], rec['dkim_aligned'],
+                               rec['spf_aligned'], rec['disposition'], rec['dkim_domain'], rec['spf_domain'])
+                        totals[key] = totals.get(key, 0) + rec['count']
+                except (ET.ParseError, ValueError, EOFError, OSError, zlib.error) as e:
+                    # One truncated or malformed report must not sink the rest of the upload
+                    stats['errors'].append(f"{name}: {e}")
+        except (zipfile.BadZipFile, OSError) as e:
+            stats['errors'].append(f"{filename}: {e}")
+
+    columns = ['source_ip', 'header_from', 'dkim_aligned', 'spf_aligned',
+               'disposition', 'dkim_domain', 'spf_domain', 'messages']
+    df = pd.DataFrame([(*k, v) for k, v in totals.items()], columns=columns)
+    df['dmarc_pass'] = df['dkim_aligned'] | df['spf_aligned']
+    return df, stats
+
+# ============================================================================
+# EMAIL AUTHENTICATION & TRANSPORT SECURITY CHECKS
+# ============================================================================
+DKIM_COMMON_SELECTORS = ['default', 'google', 'k1', 'selector1', 'selector2', 'dkim', 'mail']
+
+def parse_tag_record(record):
+    """Parse a `k=v; k=v` record (DMARC, MTA-STS, TLS-RPT, BIMI, DKIM)"""
+    tags = {}
+    for part in record.split(';'):
+        if '=' in part:
+            key, value = part.split('=', 1)
+            tags[key.strip().lower()] = value.strip()
+    return tags
+
+def fetch_mta_sts_policy(domain, timeout=None):
+    """Fetch and parse https://mta-sts.<domain>/.well-known/mta-sts.txt"""
+    url = f"https://mta-sts.{domain}/.well-known/mta-sts.txt"
+    # One attempt only (no retrying session) so the fetch cannot outlive the caller's deadline;
+    # RFC 8461 forbids following redirects when fetching the policy
+    try:
+        response = requests.get(url, allow_redirects=False, timeout=timeout or CONFIG['email_auth_deadline'],
+                                headers={'User-Agent': CONFIG['user_agent']})
+    except requests.exceptions.Timeout:
+        return False, "Request timed out"
+    except requests.exceptions.ConnectionError:
+        return False, "Connection error - unable to reach server"
+    except requests.exceptions.RequestException as e:
+        return False, f"Request error: {str(e)}"
+    if response.status_code != 200:
+        return False, f"HTTP {response.status_code} from {url}"
+    sts_policy = {'mx': [], 'raw': response.text}
+    for line in response.text.splitlines():
+        if ':' not in line:
+            continue
+        key, value = (p.strip() for p in line.split(':', 1))
+        if key.lower() == 'mx':
+            sts_policy['mx'].append(value.lower().rstrip('.'))
+        else:
+            sts_policy[key.lower()] = value
+    errors = []
+    if sts_policy.get('version') != 'STSv1':
+        errors.append("version must be STSv1")
+    if sts_policy.get('mode') not in ('enforce', 'testing', 'none'):
+        errors.append(f"invalid mode '{sts_policy.get('mode')}'")
+    if not str(sts_policy.get('max_age', '')).isdigit():
+        errors.append("max_age missing or not a number")
+    if sts_policy.get('mode') != 'none' and not sts_policy['mx']:
+        errors.append("no mx patterns")
+    sts_policy['errors'] = errors
+    return True, sts_policy
+
+def mx_matches_sts_pattern(host, pattern):
+    """MTA-STS mx matching: a leading *. matches exactly one label"""
+    host, pattern = host.lower().rstrip('.'), pattern.lower().rstrip('.')
+    if pattern.startswith('*.'):
+        head, _, rest = host.partition('.')
+        return bool(head) and rest == pattern[2:]
+    return host == pattern
+
+def run_email_auth_checks(domain, selectors=None, spf_ip=None, spf_sender=None, deadline=None):
+    """Run every email-auth lookup in parallel under one deadline.
+
+    Returns {check: result}; a check that missed the deadline maps to None
+    and one that raised maps to the exception.
+    """
+    selectors = selectors or DKIM_COMMON_SELECTORS
+    deadline = deadline or CONFIG['email_auth_deadline']
+    deadline_at = time.monotonic() + deadline
+    tasks = {
+        'spf': lambda: expand_spf_tree(domain),
+        'dmarc': lambda: resolve_cached(f"_dmarc.{domain}", 'TXT'),
+        'mx': lambda: resolve_cached(domain, 'MX'),
+        'mta_sts': lambda: resolve_cached(f"_mta-sts.{domain}", 'TXT'),
+        'mta_sts_policy': lambda: fetch_mta_sts_policy(domain, timeout=max(deadline_at - time.monotonic(), 0.1)),
+        'tls_rpt': lambda: resolve_cached(f"_smtp._tls.{domain}", 'TXT'),
+        'bimi': lambda: resolve_cached(f"default._bimi.{domain}", 'TXT')
+    }
+    for selector in selectors:
+        tasks[f"dkim:{selector}"] = (lambda sel=selector: resolve_cached(f"{sel}._domainkey.{domain}", 'TXT'))
+    if spf_ip:
+        tasks['check_host'] = lambda: check_host(spf_ip, domain, spf_sender)
+
+    pool = ThreadPoolExecutor(max_workers=len(tasks))
+    futures = {pool.submit(fn): name for name, fn in tasks.items()}
+    done, _ = wait(futures, timeout=deadline)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    results = {name: None for name in tasks}
+    for future in done:
+        try:
+            results[futures[future]] = future.result()
+        except Exception as e:
+            results[futures[future]] = e
+    return results
+
+def email_check_records(result):
+    """(status, values) for a DNS task from run_email_auth_checks - timeouts and failures become an error status"""
+    if result is None:
+        return 'TIMEOUT', []
+    if isinstance(result, Exception):
+        return f"ERROR: {result}", []
+    return result
+
+# ============================================================================
+# DKIM & ARC VERIFICATION
+# ============================================================================
+# DER DigestInfo prefixes for EMSA-PKCS1-v1_5 (RFC 8017 section 9.2)
+DIGEST_INFO_PREFIX = {
+    'sha256': bytes.fromhex('3031300d060960864801650304020105000420'),
+    'sha1': bytes.fromhex('3021300906052b0e03021a05000414')
+}
+
+def split_raw_message(raw):
+    """Split a raw RFC 5322 message into ([(name, raw_header)], body), CRLF-normalized"""
+    raw = raw.replace(b'\r\n', b'\n').replace(b'\n', b'\r\n')
+    head, sep, body = raw.partition(b'\r\n\r\n')
+    if not sep:
+        head, body = raw, b''
+    headers = []
+    for line in head.split(b'\r\n'):
+        if line[:1] in (b' ', b'\t') and headers:
+            name, value = headers[-1]
+            headers[-1] = (name, value + b'\r\n' + line)
+        elif b':' in line:
+            headers.append((line.split(b':', 1)[0].decode('ascii', errors='replace').strip(), line))
+    return [(name, value + b'\r\n') for name, value in headers], body
+
+def _canon_header(raw, method):
+    if method == 'simple':
+        return raw
+    name, value = raw.split(b':', 1)
+    value = re.sub(rb'\r\n(?=[ \t])', b'', value)
+    value = re.sub(rb'[ \t]+', b' ', value).strip(b' \t\r\n')
+    return name.strip().lower() + b':' + value + b'\r\n'
+
+def _canon_body(body, method, length=None):
+    if method == 'relaxed':
+        body = re.sub(rb'[ \t]+\r\n', b'\r\n', body)
+        body = re.sub(rb'[ \t]+', b' ', body)
+        body = re.sub(rb'[ \t]+$', b'', body)
+    body = re.sub(rb'(\r\n)*$', b'', body)
+    if body or method == 'simple':
+        body += b'\r\n'
+    return body[:length] if length is not None else body
+
+def _select_headers(headers, names):
+    """Pick signed header instances bottom-up, as RFC 6376 section 5.4.2 requires"""
+    used, selected = set(), []
+    for name in names:
+        for index in range(len(headers) - 1, -1, -1):
+            if index not in used and headers[index][0].lower() == name:
+                used.add(index)
+                selected.append(headers[index][1])
+                break
+    return selected
+
+def _strip_signature_value(raw):
+    """Empty the b= tag of a signature header, leaving everything else intact"""
+    name, value = raw.split(b':', 1)
+    value = re.sub(rb'((?:^|;)[ \t\r\n]*b[ \t\r\n]*=)[^;]*', rb'\1', value)
+    return name + b':' + value
+
+def parse_signature_tags(raw):
+    """Parse the tag list of a DKIM/ARC signature header"""
+    value = raw.split(b':', 1)[1].decode('ascii', errors='replace')
+    tags = parse_tag_record(re.sub(r'\r\n', '', value))
+    for key in ('b', 'bh'):
+        if key in tags:
+            tags[key] = re.sub(r'\s+', '', tags[key])
+    return tags
+
+def _der_read(data, pos):
+    """Read one DER TLV; returns (tag, content, next_pos)"""
+    tag, length = data[pos], data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        count = length & 0x7F
+        length = int.from_bytes(data[pos:pos + count], 'big')
+        pos += count
+    return tag, data[pos:pos + length], pos + length
+
+def _rsa_public_key(der):
+    """Return (n, e) from a SubjectPublicKeyInfo or bare RSAPublicKey"""
+    tag, content, _ = _der_read(der, 0)
+    first_tag, first, after = _der_read(content, 0)
+    if first_tag == 0x30:  # SubjectPublicKeyInfo: AlgorithmIdentifier then BIT STRING
+        _, bits, _ = _der_read(content, after)
+        _, content, _ = _der_read(bits[1:], 0)
+    _, n, pos = _der_read(content, 0)
+    _, e, _ = _der_read(content, pos)
+    return int.from_bytes(n, 'big'), int.from_bytes(e, 'big')
+
+def _verify_with_key(algorithm, key_tags, signed_data, signature):
+    """Verify signed_data against a DNS key record; returns (ok, detail)"""
+    key_type = key_tags.get('k', 'rsa').lower()
+    public = base64.b64decode(re.sub(r'\s+', '', key_tags.get('p', '')))
+    if not public:
+        return False, "Key has been revoked (empty p=)"
+    if algorithm == 'ed25519-sha256':
+        if key_type != 'ed25519':
+            return False, f"Key type {key_type} does not match {algorithm}"
+        if not ED25519_AVAILABLE:
+            return False, "ed25519 verification needs the cryptography package"
+        try:
+            Ed25519PublicKey.from_public_bytes(public).verify(signature, hashlib.sha256(signed_data).digest())
+            return True, "ed25519 signature valid"
+        except Exception:
+            return False, "ed25519 signature does not verify"
+    hash_name = algorithm.split('-')[-1]
+    if key_type != 'rsa' or hash_name not in DIGEST_INFO_PREFIX:
+        return False, f"Unsupported algorithm {algorithm} / key type {key_type}"
+    n, e = _rsa_public_key(public)
+    k = (n.bit_length() + 7) // 8
+    digest = DIGEST_INFO_PREFIX[hash_name] + hashlib.new(hash_name, signed_data).digest()
+    expected = b'\x00\x01' + b'\xff' * (k - len(digest) - 3) + b'\x00' + digest
+    decrypted = pow(int.from_bytes(signature, 'big'), e, n).to_bytes(k, 'big')
+    if decrypted == expected:
+        return True, f"RSA-{n.bit_length()} signature valid"
+    return False, "RSA signature does not verify"
+
+def fetch_dkim_key(selector, domain, resolver=None):
+    """Fetch selector._domainkey.domain through the shared TTL cache"""
+    status, records = resolve_cached(f"{selector}._domainkey.{domain}", 'TXT', resolver)
+    if status != 'OK' or not records:
+        return None, f"No key at {selector}._domainkey.{domain} ({status})"
+    return parse_tag_record(''.join(records)), None
+
+def verify_message_signature(headers, body, sig_raw, resolver=None, body_cache=None):
+    """Verify one DKIM-Signature or ARC-Message-Signature header.
+
+    Body hash and header signature are reported separately, with the time
+    spent on each step.
+    """
+    timings = {}
+    start = time.perf_counter()
+    tags = parse_signature_tags(sig_raw)
+    algorithm = tags.get('a', 'rsa-sha256').lower()
+    header_canon, _, body_canon = tags.get('c', 'simple/simple').lower().partition('/')
+    body_canon = body_canon or 'simple'
+    result = {
+        'domain': tags.get('d', ''), 'selector': tags.get('s', ''), 'algorithm': algorithm,
+        'canonicalization': f"{header_canon}/{body_canon}", 'instance': tags.get('i', ''),
+        'body_hash': 'fail', 'signature': 'fail', 'detail': '', 'timings': timings
+    }
+    timings['parse_ms'] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    hash_name = 'sha1' if algorithm.endswith('sha1') else 'sha256'
+    length = int(tags['l']) if tags.get('l', '').isdigit() else None
+    cache_key = (body_canon, hash_name, length)
+    if body_cache is not None and cache_key in body_cache:
+        computed = body_cache[cache_key]
+    else:
+        computed = base64.b64encode(hashlib.new(hash_name, _canon_body(body, body_canon, length)).digest()).decode()
+        if body_cache is not None:
+            body_cache[cache_key] = computed
+    result['body_hash'] = 'pass' if computed == tags.get('bh') else 'fail'
+    timings['body_ms'] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    hits_before = DNS_CACHE.hits
+    key_tags, error = fetch_dkim_key(result['selector'], result['domain'], resolver)
+    result['key_cached'] = DNS_CACHE.hits > hits_before
+    timings['key_ms'] = (time.perf_counter() - start) * 1000
+    if error:
+        result['signature'] = 'error'
+        result['detail'] = error
+        return result
+
+    start = time.perf_counter()
+    names = [h.strip().lower() for h in tags.get('h', '').split(':') if h.strip()]
+    signed = b''.join(_canon_header(h, header_canon) for h in _select_headers(headers, names))
+    signed += _canon_header(_strip_signature_value(sig_raw), header_canon).rstrip(b'\r\n')
+    try:
+        ok, detail = _verify_with_key(algorithm, key_tags, signed, base64.b64decode(tags.get('b', '')))
+    except Exception as e:
+        ok, detail = False, f"Verification error: {str(e)}"
+    result['signature'] = 'pass' if ok else 'fail'
+    result['detail'] = detail
+    timings['header_ms'] = (time.perf_counter() - start) * 1000
+    return result
+
+def verify_dkim(raw, resolver=None):
+    """Verify every DKIM-Signature in a raw message"""
+    headers, body = split_raw_message(raw)
+    body_cache = {}
+    return [
+        verify_message_signature(headers, body, value, resolver, body_cache)
+        for name, value in headers if name.lower() == 'dkim-signature'
+    ]
+
+def verify_arc_chain(raw, resolver=None):
+    """Validate an ARC chain (RFC 8617): structure, newest AMS and every ARC-Seal"""
+    headers, body = split_raw_message(raw)
+    sets = {}
+    for name, value in headers:
+        lname = name.lower()
+        if lname in ('arc-seal', 'arc-message-signature', 'arc-authentication-results'):
+            if lname == 'arc-authentication-results':
+                match = re.search(rb':\s*i\s*=\s*(\d+)', value)
+                instance = int(match.group(1)) if match else 0
+            else:
+                instance = int(parse_signature_tags(value).get('i', '0') or 0)
+            sets.setdefault(instance, {})[lname] = value
+    if not sets:
+        return {'result': 'none', 'reason': 'No ARC headers', 'seals': [], 'ams': None}
+
+    count = max(sets)
+    if sorted(sets) != list(range(1, count + 1)) or any(len(v) != 3 for v in sets.values()):
+        return {'result': 'fail', 'reason': 'ARC sets are incomplete or not numbered 1..N', 'seals': [], 'ams': None}
+
+    seals, chain_ok, reason = [], True, ''
+    for i in range(1, count + 1):
+        cv = parse_signature_tags(sets[i]['arc-seal']).get('cv', '').lower()
+        if (i == 1 and cv != 'none') or (i > 1 and cv != 'pass'):
+            chain_ok, reason = False, f"ARC-Seal i={i} has cv={cv}"
+
+    ams = verify_message_signature(headers, body, sets[count]['arc-message-signature'], resolver)
+    if ams['signature'] != 'pass' or ams['body_hash'] != 'pass':
+        chain_ok, reason = False, reason or f"ARC-Message-Signature i={count} did not verify"
+
+    for i in range(1, count + 1):
+        start = time.perf_counter()
+        seal_raw = sets[i]['arc-seal']
+        tags = parse_signature_tags(seal_raw)
+        signed = b''
+        for j in range(1, i + 1):
+            for lname in ('arc-authentication-results', 'arc-message-signature', 'arc-seal'):
+                value = sets[j][lname]
+                if j == i and lname == 'arc-seal':
+                    signed += _canon_header(_strip_signature_value(value), 'relaxed').rstrip(b'\r\n')
+                else:
+                    signed += _canon_header(value, 'relaxed')
+        key_tags, error = fetch_dkim_key(tags.get('s', ''), tags.get('d', ''), resolver)
+        if error:
+            ok, detail = False, error
+        else:
+            try:
+                ok, detail = _verify_with_key(tags.get('a', 'rsa-sha256').lower(), key_tags, signed, base64.b64decode(tags.get('b', '')))
+            except Exception as e:
+                ok, detail = False, f"Verification error: {str(e)}"
+        seals.append({
+            'instance': i, 'domain': tags.get('d', ''), 'selector': tags.get('s', ''),
+            'cv': tags.get('cv', ''), 'seal': 'pass' if ok else 'fail', 'detail': detail,
+            'ms': (time.perf_counter() - start) * 1000
+        })
+        if not ok:
+            chain_ok, reason = False, reason or f"ARC-Seal i={i} did not verify"
+
+    return {'result': 'pass' if chain_ok else 'fail', 'reason': reason, 'seals': seals, 'ams': ams}
+
+# ============================================================================
+# DNSBL REPUTATION
+# ============================================================================
+SPAMHAUS_ERRORS = {
+    '127.255.255.252': 'Query error (typo in zone name)',
+    '127.255.255.254': 'Query refused - public/open resolver used',
+    '127.255.255.255': 'Query refused - excessive number of queries'
+}
+
+DNSBL_ZONES = [
+    # IP-based lists
+    {'zone': 'zen.spamhaus.org', 'type': 'ip', 'codes': {
+        '127.0.0.2': 'SBL - Spamhaus Block List', '127.0.0.3': 'SBL CSS - snowshoe spam',
+        '127.0.0.4': 'XBL - exploited/botnet host', '127.0.0.5': 'XBL - exploited/botnet host',
+        '127.0.0.6': 'XBL - exploited/botnet host', '127.0.0.7': 'XBL - exploited/botnet host',
+        '127.0.0.9': 'DROP - hijacked netblock', '127.0.0.10': 'PBL - ISP policy (dynamic range)',
+        '127.0.0.11': 'PBL - Spamhaus policy (should not send direct)'
+    }, 'errors': SPAMHAUS_ERRORS},
+    {'zone': 'b.barracudacentral.org', 'type': 'ip', 'codes': {'127.0.0.2': 'Barracuda reputation - poor'}},
+    {'zone': 'bl.spamcop.net', 'type': 'ip', 'codes': {'127.0.0.2': 'Reported as a spam source to SpamCop'}},
+    {'zone': 'dnsbl.sorbs.net', 'type': 'ip', 'codes': {
+        '127.0.0.2': 'Open HTTP proxy', '127.0.0.3': 'Open SOCKS proxy', '127.0.0.4': 'Other open proxy',
+        '127.0.0.5': 'Open SMTP relay', '127.0.0.6': 'Spam source', '127.0.0.7': 'Vulnerable web server',
+        '127.0.0.8': 'Admin requested block', '127.0.0.9': 'Zombie/hijacked network',
+        '127.0.0.10': 'Dynamic IP range', '127.0.0.11': 'Bad MX/HELO configuration',
+        '127.0.0.12': 'Does not send mail', '127.0.0.14': 'No server expected'
+    }},
+    {'zone': 'psbl.surriel.com', 'type': 'ip', 'codes': {'127.0.0.2': 'Hit spam traps'}},
+    {'zone': 'dnsbl-1.uceprotect.net', 'type': 'ip', 'codes': {'127.0.0.2': 'Level 1 - single IP sent spam'}},
+    {'zone': 'dnsbl-2.uceprotect.net', 'type': 'ip', 'codes': {'127.0.0.2': 'Level 2 - allocation has many listed IPs'}},
+    {'zone': 'dnsbl-3.uceprotect.net', 'type': 'ip', 'codes': {'127.0.0.2': 'Level 3 - whole ASN listed'}},
+    {'zone': 'bl.mailspike.net', 'type': 'ip', 'codes': {
+        '127.0.0.2': 'Spam wave participant', '127.0.0.10': 'Worst reputation', '127.0.0.11': 'Very bad reputation',
+        '127.0.0.12': 'Bad reputation', '127.0.0.13': 'Suspicious reputation', '127.0.0.14': 'Neutral - probably spam'
+    }},
+    {'zone': 'dnsbl.dronebl.org', 'type': 'ip', 'codes': {
+        '127.0.0.3': 'IRC drone', '127.0.0.5': 'Bottler', '127.0.0.6': 'Unknown spambot or drone',
+        '127.0.0.7': 'DDoS drone', '127.0.0.8': 'Open SOCKS proxy', '127.0.0.9': 'Open HTTP proxy',
+        '127.0.0.10': 'Proxy chain', '127.0.0.13': 'Brute force attacker', '127.0.0.14': 'Open Wingate proxy',
+        '127.0.0.15': 'Compromised router', '127.0.0.17': 'Automatically determined botnet IP'
+    }},
+    {'zone': 'ix.dnsbl.manitu.net', 'type': 'ip', 'codes': {'127.0.0.2': 'NiX Spam - sent spam'}},
+    {'zone': 'truncate.gbudb.net', 'type': 'ip', 'codes': {'127.0.0.2': 'GBUdb - truncate (almost all spam)'}},
+    {'zone': 'dnsbl.spfbl.net', 'type': 'ip', 'codes': {
+        '127.0.0.2': 'Bad reputation', '127.0.0.3': 'Suspicious source', '127.0.0.4': 'Dynamic IP / no rDNS',
+        '127.0.0.5': 'Bulk sender'
+    }},
+    {'zone': 'rbl.interserver.net', 'type': 'ip', 'codes': {'127.0.0.2': 'InterServer - abusive host'}},
+    {'zone': 'bl.blocklist.de', 'type': 'ip', 'codes': {'127.0.0.2': 'Reported for attacks (fail2ban)'}},
+    {'zone': 'all.s5h.net', 'type': 'ip', 'codes': {'127.0.0.2': 'Hit s5h.net spam traps'}},
+    {'zone': 'db.wpbl.info', 'type': 'ip', 'codes': {'127.0.0.2': 'Weighted Private Block List - spam source'}},
+    {'zone': 'spam.dnsbl.anonmails.de', 'type': 'ip', 'codes': {'127.0.0.2': 'Hit anonmails.de spam traps'}},
+    {'zone': 'dyna.spamrats.com', 'type': 'ip', 'codes': {'127.0.0.36': 'Dynamic IP sending mail'}},
+    {'zone': 'noptr.spamrats.com', 'type': 'ip', 'codes': {'127.0.0.37': 'No reverse DNS'}},
+    {'zone': 'spam.spamrats.com', 'type': 'ip', 'codes': {'127.0.0.38': 'Sent spam to SpamRats traps'}},
+    {'zone': 'bl.spameatingmonkey.net', 'type': 'ip', 'codes': {'127.0.0.2': 'Hit SEM spam traps'}},
+    {'zone': 'backscatter.spameatingmonkey.net', 'type': 'ip', 'codes': {'127.0.0.2': 'Sends backscatter bounces'}},
+    {'zone': 'bl.nszones.com', 'type': 'ip', 'codes': {'127.0.0.2': 'Spam source', '127.0.0.3': 'Dynamic IP'}},
+    {'zone': 'spamrbl.imp.ch', 'type': 'ip', 'codes': {'127.0.0.2': 'Spam source'}},
+    {'zone': 'wormrbl.imp.ch', 'type': 'ip', 'codes': {'127.0.0.2': 'Infected host (worm/virus)'}},
+    {'zone': 'ubl.unsubscore.com', 'type': 'ip', 'codes': {'127.0.0.2': 'Ignores unsubscribe requests'}},
+    {'zone': 'hostkarma.junkemailfilter.com', 'type': 'ip', 'codes': {
+        '127.0.0.1': 'Allowlisted (good)', '127.0.0.2': 'Blocklisted', '127.0.0.3': 'Yellow - mixed ham and spam',
+        '127.0.0.4': 'Brown - mostly spam', '127.0.0.5': 'No blacklist'
+    }, 'clean': {'127.0.0.1', '127.0.0.3', '127.0.0.5'}},
+    {'zone': 'bl.drmx.org', 'type': 'ip', 'codes': {'127.0.0.2': 'Spam source'}},
+    {'zone': 'dnsbl.kempt.net', 'type': 'ip', 'codes': {'127.0.0.2': 'Spam source'}},
+    {'zone': 'access.redhawk.org', 'type': 'ip', 'codes': {'127.0.0.2': 'Spam source'}},
+    {'zone': 'rbl.realtimeblacklist.com', 'type': 'ip', 'codes': {'127.0.0.2': 'Spam source'}},
+    {'zone': 'dnsbl.inps.de', 'type': 'ip', 'codes': {'127.0.0.2': 'Spam source'}},
+    {'zone': 'z.mailspike.net', 'type': 'ip', 'codes': {'127.0.0.2': 'Recent spam wave participant'}},
+    # Domain-based lists (URIBL / RHSBL)
+    {'zone': 'dbl.spamhaus.org', 'type': 'domain', 'codes': {
+        '127.0.1.2': 'Spam domain', '127.0.1.4': 'Phishing domain', '127.0.1.5': 'Malware domain',
+        '127.0.1.6': 'Botnet C&C domain', '127.0.1.102': 'Abused legit spam', '127.0.1.103': 'Abused spammed redirector',
+        '127.0.1.104': 'Abused legit phish', '127.0.1.105': 'Abused legit malware', '127.0.1.106': 'Abused legit botnet C&C'
+    }, 'errors': {**SPAMHAUS_ERRORS, '127.0.1.255': 'IP queries are not supported'}},
+    {'zone': 'multi.uribl.com', 'type': 'domain', 'bitmask': {2: 'black', 4: 'grey', 8: 'red'},
+     'errors': {'127.0.0.1': 'Query refused - public/open resolver or over quota'}},
+    {'zone': 'multi.surbl.org', 'type': 'domain', 'bitmask': {8: 'phishing', 16: 'malware', 64: 'abuse', 128: 'cracked site'},
+     'errors': {'127.0.0.1': 'Query refused - access blocked'}},
+    {'zone': 'uribl.spameatingmonkey.net', 'type': 'domain', 'codes': {'127.0.0.2': 'Domain seen in spam'}},
+    {'zone': 'fresh15.spameatingmonkey.net', 'type': 'domain', 'codes': {'127.0.0.2': 'Registered in the last 15 days'}},
+    {'zone': 'dbl.nordspam.com', 'type': 'domain', 'codes': {'127.0.0.2': 'Domain seen in spam'}},
+    {'zone': 'rhsbl.sorbs.net', 'type': 'domain', 'codes': {'127.0.0.2': 'Domain listed by SORBS'}}
+]
+
+def get_dnsbl_resolver(nameservers=None, port=53):
+    """Resolver with the short per-zone DNSBL timeout"""
+    resolver = get_resolver(nameservers, port)
+    resolver.timeout = CONFIG['dnsbl_timeout']
+    resolver.lifetime = CONFIG['dnsbl_timeout']
+    return resolver
+
+def dnsbl_query_name(item, zone):
+    """Build the DNSBL query name: reversed octets/nibbles for IPs, prefix for domains"""
+    try:
+        reverse = ipaddress.ip_address(item).reverse_pointer
+        return f"{reverse.rsplit('.', 2)[0]}.{zone}"
+    except ValueError:
+        return f"{item.rstrip('.').lower()}.{zone}"
+
+def describe_dnsbl_code(zone_info, code):
+    """Return (status, meaning) for one DNSBL answer"""
+    if code in zone_info.get('errors', {}):
+        return 'error', zone_info['errors'][code]
+    if not code.startswith('127.'):
+        return 'error', f"Non-127/8 answer {code} - resolver rewrites NXDOMAIN or zone is dead"
+    if code in zone_info.get('clean', ()):
+        return 'clean', zone_info['codes'].get(code, 'Not listed')
+    if 'bitmask' in zone_info:
+        last = int(code.rsplit('.', 1)[-1])
+        flags = [name for bit, name in zone_info['bitmask'].items() if last & bit]
+        return 'listed', f"Listed ({', '.join(flags)})" if flags else f"Listed ({code})"
+    return 'listed', zone_info.get('codes', {}).get(code, 'Listed')
+
+def check_dnsbl(item, zone_info, resolver=None):
+    """Query one zone for one IP or domain"""
+    start = time.perf_counter()
+    qname = dnsbl_query_name(item, zone_info['zone'])
+    status, codes = resolve_cached(qname, 'A', resolver)
+    result = {
+        'item': item, 'zone': zone_info['zone'], 'status': 'clean', 'codes': codes,
+        'meaning': '', 'reason': ''
+    }
+    if status.startswith('ERROR'):
+        result['status'], result['meaning'] = 'error', status[7:]
+    elif status == 'OK':
+        described = [describe_dnsbl_code(zone_info, code) for code in codes]
+        states = {state for state, _ in described}
+        result['status'] = 'listed' if 'listed' in states else 'error' if 'error' in states else 'clean'
+        result['meaning'] = '; '.join(meaning for _, meaning in described)
+        if result['status'] == 'listed':
+            txt_status, reasons = resolve_cached(qname, 'TXT', resolver)
+            if txt_status == 'OK':
+                result['reason'] = ' | '.join(reasons)
+    result['ms'] = (time.perf_counter() - start) * 1000
+    return result
+
+def check_dnsbl_many(items, zones=None, resolver=None, max_workers=None, progress_cb=None):
+    """Check every IP/domain against every matching zone concurrently"""
+    zones = zones or DNSBL_ZONES
+    resolver = resolver or get_dnsbl_resolver()
+    jobs = []
+    for item in dict.fromkeys(items):
+        try:
+            ipaddress.ip_address(item)
+            kind = 'ip'
+        except ValueError:
+            kind = 'domain'
+        jobs.extend((item, zone) for zone in zones if zone['type'] == kind)
+    if not jobs:
+        return []
+
+    results = []
+    with ThreadPoolExecutor(max_workers=min(len(jobs), max_workers or CONFIG['dnsbl_workers'])) as pool:
+        futures = [pool.submit(check_dnsbl, item, zone, resolver) for item, zone in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            results.append(future.result())
+            if progress_cb:
+                progress_cb(done, len(futures))
+    return results
+
+def get_mail_server_ips(domain, resolver=None):
+    """Return [(ip, source)] for a domain's MX hosts and single-host SPF ip4/ip6/a entries"""
+    found = {}
+    status, mx_records = resolve_cached(domain, 'MX', resolver)
+    for record in mx_records if status == 'OK' else []:
+        host = record.split()[-1].rstrip('.')
+        for rdtype in ('A', 'AAAA'):
+            ok, addresses = resolve_cached(host, rdtype, resolver)
+            for ip in addresses if ok == 'OK' else []:
+                found.setdefault(ip, f"MX {host}")
+
+    spf_status, record = get_spf_record(domain, resolver)
+    if spf_status == 'OK':
+        for term in parse_spf_terms(record):
+            if term['type'] != 'mechanism' or term['qualifier'] != '+':
+                continue
+            if term['name'] in ('ip4', 'ip6'):
+                try:
+                    network = ipaddress.ip_network(term['value'], strict=False)
+                except ValueError:
+                    continue
+                if network.num_addresses == 1:
+                    found.setdefault(str(network.network_address), f"SPF {term['text']}")
+            elif term['name'] == 'a':
+                host = term['value'] or domain
+                for rdtype in ('A', 'AAAA'):
+                    ok, addresses = resolve_cached(host, rdtype, resolver)
+                    for ip in addresses if ok == 'OK' else []:
+                        found.setdefault(ip, f"SPF {term['text']}")
+    return list(found.items())
+
+# ============================================================================
+# PUBLIC SUFFIX LIST
+# ============================================================================
+@st.cache_resource
+def get_public_suffix_trie():
+    """Compile the bundled Public Suffix List into a reversed-label trie.
+
+    Each node is a dict of child labels; '$' marks the end of a rule with its
+    section (icann/private), and '!label' children mark exception rules.
+    """
+    root = {}
+    section = 'icann'
+    try:
+        with open(CONFIG['psl_path'], encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return root
+    for line in lines:
+        line = line.strip()
+        if line.startswith('// ===BEGIN PRIVATE'):
+            section = 'private'
+        if not line or line.startswith('//'):
+            continue
+        rule = line.split()[0].lower()
+        exception = rule.startswith('!')
+        try:
+            rule = rule.lstrip('!').encode('idna').decode('ascii')
+        except UnicodeError:
+            continue
+        labels = rule.split('.')[::-1]
+        node = root
+        for label in labels[:-1] if exception else labels:
+            node = node.setdefault(label, {})
+        if exception:
+            node['!' + labels[-1]] = section
+        else:
+            node['$'] = section
+    return root
+
+PSL_TRIE = get_public_suffix_trie()
+
+def split_public_suffix(hostname, include_private=False):
+    """Return (public_suffix, registrable_domain) for a hostname in O(labels).
+
+    registrable_domain is None when the hostname is itself a public suffix.
+    Private-section rules (e.g. blogspot.com) are ignored unless asked for,
+    since registries only know about the ICANN part.
+    """
+    hostname = hostname.strip().rstrip('.').lower()
+    if not hostname.isascii():
+        hostname = hostname.encode('idna').decode('ascii')
+    labels = hostname.split('.')
+    suffix_len = 1  # the implicit '*' rule: an unknown TLD is its own suffix
+    node = PSL_TRIE
+    for depth, label in enumerate(reversed(labels)):
+        if '!' + label in node and (include_private or node['!' + label] == 'icann'):
+            suffix_len = depth
+            break
+        node = node.get(label) or node.get('*')
+        if node is None:
+            break
+        if node.get('$') and (include_private or node['$'] == 'icann'):
+            suffix_len = depth + 1
+    suffix = '.'.join(labels[-suffix_len:])
+    registrable = '.'.join(labels[-suffix_len - 1:]) if len(labels) > suffix_len else None
+    return suffix, registrable
+
+def registrable_domain(hostname):
+    """mail.shop.example.co.za -> example.co.za (None for bare suffixes and IPs)"""
+    try:
+        ipaddress.ip_address(hostname)
+        return None
+    except ValueError:
+        pass
+    return split_public_suffix(hostname)[1]
+
+def group_by_registrable(hostnames):
+    """Collapse hostnames onto their registrable domains.
+
+    Returns ({registrable: [hostnames]}, [hostnames with no registrable domain]).
+    """
+    groups, unmatched = {}, []
+    for hostname in dict.fromkeys(h.strip().rstrip('.').lower() for h in hostnames if h.strip()):
+        domain = registrable_domain(hostname)
+        if domain:
+            groups.setdefault(domain, []).append(hostname)
+        else:
+            unmatched.append(hostname)
+    return groups, unmatched
+
+# ============================================================================
+# NATIVE WHOIS CLIENT
+# ============================================================================
+WHOIS_IANA_SERVER = 'whois.iana.org'
+
+WHOIS_SERVERS = {
+    'com': 'whois.verisign-grs.com', 'net': 'whois.verisign-grs.com', 'org': 'whois.pir.org',
+    'info': 'whois.nic.info', 'biz': 'whois.nic.biz', 'io': 'whois.nic.io', 'co': 'whois.nic.co',
+    'me': 'whois.nic.me', 'us': 'whois.nic.us', 'xyz': 'whois.nic.xyz', 'online': 'whois.nic.online',
+    'site': 'whois.nic.site', 'store': 'whois.nic.store', 'tech': 'whois.nic.tech',
+    'app': 'whois.nic.google', 'dev': 'whois.nic.google', 'africa': 'whois.nic.africa',
+    'za': 'whois.registry.net.za', 'co.za': 'whois.registry.net.za', 'ng': 'whois.nic.net.ng',
+    'ke': 'whois.kenic.or.ke', 'uk': 'whois.nic.uk', 'de': 'whois.denic.de', 'eu': 'whois.eu',
+    'fr': 'whois.nic.fr', 'nl': 'whois.domain-registry.nl', 'ca': 'whois.cira.ca',
+    'au': 'whois.auda.org.au', 'in': 'whois.registry.in'
+}
+
+# Servers that need something other than the bare domain as the query
+WHOIS_QUERY_FORMATS = {
+    'whois.verisign-grs.com': '={}',
+    'whois.denic.de': '-T dn,ace {}'
+}
+
+WHOIS_FIELDS = {
+    'domain': ['domain name', 'domain'],
+    'registrar': ['registrar', 'sponsoring registrar', 'registrar name', 'registrar organization'],
+    'registrar_url': ['registrar url', 'referral url'],
+    'whois_server': ['registrar whois server', 'whois server', 'refer', 'whois'],
+    'creation_date': ['creation date', 'created', 'created on', 'registered on', 'registration time',
+                      'domain registration date', 'registered', 'created date'],
+    'updated_date': ['updated date', 'last updated', 'last modified', 'changed', 'last updated on', 'modified'],
+    'expiration_date': ['registry expiry date', 'registrar registration expiration date', 'expiration date',
+                        'expiry date', 'expires on', 'expires', 'paid-till', 'expiration time', 'renewal date',
+                        'expire', 'domain expiration date'],
+    'status': ['domain status', 'status', 'state'],
+    'name_servers': ['name server', 'nserver', 'nameservers', 'name servers', 'nameserver'],
+    'dnssec': ['dnssec']
+}
+WHOIS_FIELD_LOOKUP = {label: field for field, labels in WHOIS_FIELDS.items() for label in labels}
+
+WHOIS_NOT_FOUND_PATTERN = re.compile(
+    r'no match for|not found|no data found|no entries found|status:\s*(free|available)|'
+    r'is available for registration|no object found|domain not found', re.IGNORECASE
+)
+
+# Throttling and refusal replies - these say nothing about whether the domain exists
+WHOIS_ERROR_PATTERN = re.compile(
+    r'rate limit|limit exceeded|quota exceeded|too many (queries|requests|connections)|'
+    r'try again later|temporarily unavailable|service unavailable|access denied|blacklisted', re.IGNORECASE
+)
+
+WHOIS_DATE_FORMATS = [
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%d-%b-%Y', '%d-%b-%Y %H:%M:%S', '%d/%m/%Y', '%Y.%m.%d',
+    '%Y/%m/%d', '%d.%m.%Y', '%Y%m%d', '%a %b %d %H:%M:%S %Z %Y', '%d %b %Y'
+]
+
+@st.cache_resource
+def get_whois_budget():
+    """Per-server connection slots and query rate, shared by every session"""
+    return {'lock': threading.Lock(), 'servers': {}}
+
+WHOIS_BUDGET = get_whois_budget()
+
+def _whois_server_budget(server):
+    with WHOIS_BUDGET['lock']:
+        if server not in WHOIS_BUDGET['servers']:
+            WHOIS_BUDGET['servers'][server] = (
+                threading.BoundedSemaphore(CONFIG['whois_server_concurrency']),
+                RateLimiter(CONFIG['whois_server_rate'])
+            )
+        return WHOIS_BUDGET['servers'][server]
+
+def whois_query(server, query, port=None, timeout=None):
+    """Send one query to a port-43 server and return the decoded response.
+
+    Connections per server are capped and spaced out so bulk runs do not
+    get the client IP rate-limited or banned by registries.
+    """
+    slots, limiter = _whois_server_budget(server)
+    with slots:
+        limiter.acquire()
+        with socket.create_connection((server, port or CONFIG['whois_port']), timeout=timeout or CONFIG['whois_timeout']) as sock:
+            sock.sendall(f"{query}\r\n".encode('ascii'))
+            chunks = []
+            while True:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    raw = b''.join(chunks)
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('latin-1')
+
+def parse_whois_date(value):
+    """Parse a registry date string into an aware (UTC if unspecified) datetime"""
+    value = value.strip()
+    if not value:
+        return None
+    candidates = [value, value.replace('Z', '+00:00'), re.sub(r'\s*\(.*\)$', '', value)]
+    for candidate in candidates:
+        try:
+            parsed = datetime.fromisoformat(candidate)
+            return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+        except ValueError:
+            pass
+    for fmt in WHOIS_DATE_FORMATS:
+        try:
+            return datetime.strptime(candidates[-1], fmt).replace(tzinfo=timezone.utc)
+        except ValueError:
+            pass
+    return None
+
+def parse_whois_response(text):
+    """Parse `Key: value` WHOIS output into raw fields.
+
+    Handles the indented-block layout some registries use (a `Key:` line
+    followed by more deeply indented values, e.g. Nominet name servers).
+    """
+    fields = {}
+    block_key, block_indent = None, 0
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith(('%', '#', '>>>', 'NOTICE', 'TERMS OF USE')):
+            block_key = None
+            continue
+        indent = len(line) - len(line.lstrip())
+        match = re.match(r'^([A-Za-z][\w /().-]{0,60}?)\s*:\s*(.*)$', stripped)
+        if block_key and indent > block_indent:
+            fields.setdefault(block_key, []).append(stripped)
+            if match and match.group(2).strip():
+                fields.setdefault(match.group(1).strip().lower(), []).append(match.group(2).strip())
+            continue
+        block_key = None
+        if match:
+            key, value = match.group(1).strip().lower(), match.group(2).strip()
+            if value:
+                fields.setdefault(key, []).append(value)
+            else:
+                block_key, block_indent = key, indent
+    return fields
+
+def normalize_whois(fields):
+    """Map raw WHOIS fields onto one structure shared by every TLD"""
+    record = {'status': [], 'name_servers': []}
+    for key, values in fields.items():
+        field = WHOIS_FIELD_LOOKUP.get(key)
+        if not field:
+            continue
+        if field == 'status':
+            for value in values:
+                code = value.split()[0].rstrip(',') if value else ''
+                if code and code not in record['status']:
+                    record['status'].append(code)
+        elif field == 'name_servers':
+            for value in values:
+                for ns in value.replace(',', ' ').split():
+                    ns = ns.rstrip('.').lower()
+                    if '.' in ns and not re.match(r'^[\d.:]+$', ns) and ns not in record['name_servers']:
+                        record['name_servers'].append(ns)
+        elif field.endswith('_date'):
+            if field not in record:
+                record[field] = parse_whois_date(values[0])
+        elif field not in record:
+            record[field] = values[0]
+    return record
+
+def whois_server_for(domain):
+    """Built-in server for the domain's public suffix (or its nearest parent), else None"""
+    labels = split_public_suffix(domain)[0].split('.')
+    for i in range(len(labels)):
+        server = WHOIS_SERVERS.get('.'.join(labels[i:]))
+        if server:
+            return server
+    return None
+
+def native_whois(domain, server=None, port=None, follow_referrals=True):
+    """Query WHOIS over port 43, following IANA and registry->registrar referrals.
+
+    Registry (thin) data wins for dates and status; the registrar's (thick)
+    answer fills in whatever the registry left out. Raises ValueError when
+    the registry throttles the query or answers without any registration data.
+    """
+    domain = domain.strip().rstrip('.').lower().encode('idna').decode('ascii')
+    servers, raw_parts = [], []
+
+    server = server or whois_server_for(domain)
+    if not server:
+        iana = whois_query(WHOIS_IANA_SERVER, domain.rsplit('.', 1)[-1], port)
+        servers.append(WHOIS_IANA_SERVER)
+        server = normalize_whois(parse_whois_response(iana)).get('whois_server')
+        if not server:
+            raise ValueError(f"No WHOIS server known for .{domain.rsplit('.', 1)[-1]}")
+
+    record, registry = {}, server
+    for _ in range(CONFIG['whois_max_referrals']):
+        text = whois_query(server, WHOIS_QUERY_FORMATS.get(server, '{}').format(domain), port)
+        servers.append(server)
+        raw_parts.append(f"# {server}\n{text.strip()}")
+        parsed = normalize_whois(parse_whois_response(text))
+        for key, value in parsed.items():
+            if key in ('status', 'name_servers'):
+                record.setdefault(key, [])
+                if not record[key]:
+                    record[key] = value
+            elif record.get(key) is None:
+                record[key] = value
+        referral = (parsed.get('whois_server') or '').lower().replace('whois://', '').split('/')[0]
+        if not follow_referrals or not referral or referral in servers or WHOIS_NOT_FOUND_PATTERN.search(text):
+            break
+        server = referral
+
+    # Registered needs positive evidence; a reply with none is either "not found" or a failed query
+    first = raw_parts[0] if raw_parts else ''
+    record['registered'] = bool(record.get('creation_date') or record.get('registrar') or record.get('name_servers'))
+    if not record['registered'] and not WHOIS_NOT_FOUND_PATTERN.search(first):
+        error = WHOIS_ERROR_PATTERN.search(first)
+        reason = f"refused the query ({error.group(0)})" if error else "returned no registration data"
+        raise ValueError(f"{registry} {reason}")
+    record['domain'] = (record.get('domain') or domain).lower()
+    record['servers'] = servers
+    record['raw'] = '\n\n'.join(raw_parts)
+    return record
+
+# ============================================================================
+# REGISTRATION DATA (RDAP -> WHOIS -> .ng scraper)
+# ============================================================================
+@st.cache_resource
+def get_http_session():
+    """Pooled keep-alive session shared by every session and worker thread"""
+    session = create_session()
+    adapter = HTTPAdapter(
+        max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504]),
+        pool_connections=CONFIG['http_pool_size'], pool_maxsize=CONFIG['http_pool_size']
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+HTTP_SESSION = get_http_session()
+
+@st.cache_resource
+def get_rdap_bootstrap_state():
+    return {'lock': threading.Lock(), 'services': None, 'loaded': 0.0}
+
+RDAP_BOOTSTRAP = get_rdap_bootstrap_state()
+
+def rdap_bootstrap(force=False):
+    """Return {tld: [rdap base urls]} from the IANA bootstrap registry.
+
+    The registry file is kept on disk and refetched once it is older than
+    rdap_bootstrap_max_age; a stale copy is used if the refresh fails.
+    """
+    max_age = CONFIG['rdap_bootstrap_max_age']
+    path = os.path.join(CONFIG['data_dir'], 'rdap_dns.json')
+    with RDAP_BOOTSTRAP['lock']:
+        if not force and RDAP_BOOTSTRAP['services'] is not None and time.time() - RDAP_BOOTSTRAP['loaded'] < max_age:
+            return RDAP_BOOTSTRAP['services']
+
+        data = None
+        fresh = os.path.exists(path) and time.time() - os.path.getmtime(path) < max_age
+        if fresh and not force:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        else:
+            try:
+                response = HTTP_SESSION.get(CONFIG['rdap_bootstrap_url'], timeout=CONFIG['request_timeout'])
+                response.raise_for_status()
+                data = response.json()
+                os.makedirs(CONFIG['data_dir'], exist_ok=True)
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+            except (requests.exceptions.RequestException, ValueError, OSError):
+                if os.path.exists(path):
+                    with open(path, encoding='utf-8') as f:
+                        data = json.load(f)
+
+        services = {}
+        for tlds, urls in (data or {}).get('services', []):
+            for tld in tlds:
+                services[tld.lower()] = [u if u.endswith('/') else u + '/' for u in urls]
+        RDAP_BOOTSTRAP['services'] = services
+        RDAP_BOOTSTRAP['loaded'] = time.time()
+        return services
+
+def rdap_base_url(domain):
+    """RDAP base URL for the domain's public suffix (or its nearest parent), or None"""
+    services = rdap_bootstrap()
+    labels = split_public_suffix(domain)[0].split('.')
+    for i in range(len(labels)):
+        urls = services.get('.'.join(labels[i:]))
+        if urls:
+            return next((u for u in urls if u.startswith('https://')), urls[0])
+    return None
+
+def _rdap_status_code(status):
+    """Map RDAP status strings (RFC 8056) back to EPP codes, as WHOIS shows them"""
+    if status == 'active':
+        return 'ok'
+    words = status.split()
+    return words[0] + ''.join(w.capitalize() for w in words[1:]) if words else status
+
+def _vcard_value(entity, field):
+    for item in (entity.get('vcardArray') or [None, []])[1]:
+        if item[0] == field:
+            return item[3] if isinstance(item[3], str) else ' '.join(item[3])
+    return None
+
+def normalize_rdap(data):
+    """Map an RDAP domain object onto the native_whois record structure"""
+    events = {e.get('eventAction'): parse_whois_date(e.get('eventDate', '')) for e in data.get('events', [])}
+    record = {
+        'domain': (data.get('ldhName') or '').lower(),
+        'status': [_rdap_status_code(s) for s in data.get('status', [])],
+        'name_servers': [ns.get('ldhName', '').rstrip('.').lower() for ns in data.get('nameservers', []) if ns.get('ldhName')],
+        'creation_date': events.get('registration'),
+        'expiration_date': events.get('expiration'),
+        'updated_date': events.get('last changed'),
+        'registered': True
+    }
+    for entity in data.get('entities', []):
+        if 'registrar' in entity.get('roles', []):
+            record['registrar'] = _vcard_value(entity, 'fn')
+            record['registrar_url'] = next((l.get('href') for l in entity.get('links', []) if l.get('rel') == 'about'), None)
+    secure = data.get('secureDNS') or {}
+    if 'delegationSigned' in secure:
+        record['dnssec'] = 'signedDelegation' if secure['delegationSigned'] else 'unsigned'
+    return record
+
+def rdap_lookup(domain, base_url=None):
+    """Query RDAP for a domain; returns (status, record) with status OK, NOT_FOUND or UNAVAILABLE"""
+    base_url = base_url or rdap_base_url(domain)
+    if not base_url:
+        return 'UNAVAILABLE', f"No RDAP service for .{domain.rsplit('.', 1)[-1]}"
+    url = f"{base_url}domain/{domain}"
+    try:
+        response = HTTP_SESSION.get(url, headers={'Accept': 'application/rdap+json'}, timeout=CONFIG['request_timeout'])
+    except requests.exceptions.RequestException as e:
+        return 'UNAVAILABLE', f"RDAP request failed: {str(e)}"
+    if response.status_code == 404:
+        return 'NOT_FOUND', f"{domain} is not registered (per {base_url})"
+    if response.status_code != 200:
+        return 'UNAVAILABLE', f"RDAP returned HTTP {response.status_code}"
+    try:
+        data = response.json()
+    except ValueError:
+        return 'UNAVAILABLE', "RDAP returned invalid JSON"
+    record = normalize_rdap(data)
+    record['domain'] = record['domain'] or domain
+    record['servers'] = [url]
+    record['raw'] = json.dumps(data, indent=2)
+    return 'OK', record
+
+def ng_scraper_record(domain):
+    """Normalize the whois.net.ng page into the shared record structure"""
+    sections = parse_ng_whois_simplified(query_ng_whois(domain))
+    if not sections:
+        return None
+    fields = {}
+    for section in sections.values():
+        for key, value in section.items():
+            fields.setdefault(key.lower(), []).append(value)
+    record = normalize_whois(fields)
+    record['domain'] = domain
+    record['registered'] = True
+    record['servers'] = ['whois.net.ng']
+    record['raw'] = '\n'.join(f"{k}: {v}" for section in sections.values() for k, v in section.items())
+    return record
+
+# Last-resort scrapers for registries without usable RDAP or port-43 service, keyed by TLD
+REGISTRATION_SCRAPERS = {
+    'ng': ('whois.net.ng', ng_scraper_record)
+}
+
+def fetch_registration(domain):
+    """Registration data from RDAP, falling back to WHOIS and then a registry scraper.
+
+    Hostnames are reduced to their registrable domain first. Returns
+    (success, record); record['source'] says which path answered.
+    """
+    domain = registrable_domain(domain) or domain.strip().rstrip('.').lower()
+    status, result = rdap_lookup(domain)
+    if status == 'OK':
+        result['source'] = 'RDAP'
+        return True, result
+    if status == 'NOT_FOUND':
+        return False, result
+
+    try:
+        record = native_whois(domain)
+        if record['registered']:
+            record['source'] = 'WHOIS'
+            return True, record
+        return False, f"{domain} is not registered (per {record['servers'][-1]})"
+    except Exception as e:
+        record = f"WHOIS error: {str(e)}"
+
+    scraper = REGISTRATION_SCRAPERS.get(domain.rsplit('.', 1)[-1])
+    if scraper:
+        source, scrape = scraper
+        scraped = scrape(domain)
+        if scraped:
+            scraped['source'] = source
+            return True, scraped
+    return False, record
+
+@st.cache_data(ttl=CONFIG['cache_ttl'])
+def lookup_registration(domain):
+    """Cached fetch_registration for single lookups from the UI"""
+    return fetch_registration(domain)
+
+def lookup_registrations(hostnames, max_workers=None, progress_cb=None):
+    """Bulk registration lookup: dedupe to registrable domains, then query concurrently.
+
+    Returns ({registrable: (success, record)}, groups, unmatched); per-server
+    WHOIS budgets keep the fan-out polite.
+    """
+    groups, unmatched = group_by_registrable(hostnames)
+    results = {}
+    if groups:
+        with ThreadPoolExecutor(max_workers=min(len(groups), max_workers or CONFIG['whois_bulk_workers'])) as pool:
+            futures = {pool.submit(fetch_registration, domain): domain for domain in groups}
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                if progress_cb:
+                    progress_cb(done, len(futures))
+    return results, groups, unmatched
+
+# ============================================================================
+# WATCHLIST MONITOR
+# ============================================================================
+WATCHLIST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS watchlist (
+    domain TEXT PRIMARY KEY,
+    note TEXT NOT NULL DEFAULT '',
+    added_at REAL NOT NULL,
+    next_due REAL NOT NULL,
+    last_checked REAL,
+    name_servers TEXT,
+    cert_fingerprint TEXT,
+    cert_issuer TEXT,
+    cert_expires REAL,
+    cert_problem TEXT,
+    domain_expires REAL,
+    status TEXT,
+    registrar TEXT,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS watchlist_next_due ON watchlist (next_due);
+CREATE TABLE IF NOT EXISTS watchlist_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    domain TEXT NOT NULL,
+    detected_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    old_value TEXT,
+    new_value TEXT
+);
+CREATE INDEX IF NOT EXISTS watchlist_events_detected ON watchlist_events (detected_at);
+"""
+
+# (days to the nearest expiry, seconds between checks) - the closer the expiry, the more often we look
+WATCHLIST_SPACING = [
+    (7, 6 * 3600),
+    (30, 86400),
+    (90, 3 * 86400)
+]
+
+def watchlist_db_path():
+    return os.path.join(CONFIG['data_dir'], 'watchlist.sqlite3')
+
+def watchlist_connect():
+    """Open the watchlist database, creating it on first use"""
+    os.makedirs(CONFIG['data_dir'], exist_ok=True)
+    conn = sqlite3.connect(watchlist_db_path(), timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(WATCHLIST_SCHEMA)
+    columns = {row['name'] for row in conn.execute("PRAGMA table_info(watchlist)")}
+    if 'cert_problem' not in columns:
+        conn.execute("ALTER TABLE watchlist ADD COLUMN cert_problem TEXT")
+    return conn
+
+def watchlist_add(domains, note=''):
+    """Add domains (due immediately); returns how many were new"""
+    now = time.time()
+    with closing(watchlist_connect()) as conn, conn:
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO watchlist (domain, note, added_at, next_due) VALUES (?, ?, ?, 0)",
+            [(domain, note, now) for domain in domains]
+        )
+        return conn.total_changes - before
+
+def watchlist_remove(domain):
+    """Stop watching a domain and drop its change history"""
+    with closing(watchlist_connect()) as conn, conn:
+        conn.execute("DELETE FROM watchlist WHERE domain = ?", (domain,))
+        conn.execute("DELETE FROM watchlist_events WHERE domain = ?", (domain,))
+
+def watchlist_mark_due(domains=None):
+    """Make entries (all of them by default) due on the scheduler's next pass"""
+    with closing(watchlist_connect()) as conn, conn:
+        if domains is None:
+            conn.execute("UPDATE watchlist SET next_due = 0")
+        else:
+            conn.executemany("UPDATE watchlist SET next_due = 0 WHERE domain = ?", [(d,) for d in domains])
+
+def watchlist_entries():
+    """All watched domains as dicts, soonest check first"""
+    with closing(watchlist_connect()) as conn:
+        return [dict(row) for row in conn.execute("SELECT * FROM watchlist ORDER BY next_due, domain")]
+
+def watchlist_events(limit=500):
+    """Most recent detected changes, newest first"""
+    with closing(watchlist_connect()) as conn:
+        return [dict(row) for row in conn.execute(
+            "SELECT domain, detected_at, kind, old_value, new_value FROM watchlist_events ORDER BY detected_at DESC, id DESC LIMIT ?",
+            (limit,)
+        )]
+
+def watchlist_interval(days_left):
+    """Seconds until the next check for an entry whose nearest expiry is days_left away"""
+    if days_left is not None:
+        for days, interval in WATCHLIST_SPACING:
+            if days_left <= days:
+                return interval
+    return CONFIG['watchlist_max_interval']
+
+def check_watch_entry(domain):
+    """Observe NS, certificate and registration for one domain; None marks a failed check"""
+    observed = {'name_servers': None, 'cert': None, 'registration': None, 'errors': []}
+
+    name_servers = get_live_ns(domain) or get_live_ns(registrable_domain(domain) or domain)
+    if name_servers:
+        observed['name_servers'] = sorted(set(name_servers))
+    else:
+        observed['errors'].append("NS: no answer")
+
+    success, cert = fetch_ssl_certificate(domain)
+    if success:
+        observed['cert'] = cert
+    else:
+        # A certificate that fails verification is still worth tracking - read it unverified and flag it
+        fallback_ok, fallback = fetch_unverified_certificate(domain)
+        if fallback_ok:
+            expired = fallback['days_left'] is not None and fallback['days_left'] < 0
+            fallback['problem'] = 'Expired' if expired else f"Invalid ({cert})"
+            observed['cert'] = fallback
+        observed['errors'].append(f"SSL: {cert}")
+
+    try:
+        success, record = fetch_registration(domain)
+    except Exception as e:
+        success, record = False, str(e)
+    if success:
+        observed['registration'] = record
+    else:
+        observed['errors'].append(f"Registration: {record}")
+    return observed
+
+def _format_timestamp(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d') if ts else 'unknown'
+
+def record_watch_check(conn, row, observed, now=None):
+    """Store an observation, log what changed since the last check and schedule the next one.
+
+    Failed checks keep the previous values so a timeout is never reported as a
+    change. Returns the (kind, old, new) events written.
+    """
+    now = now or time.time()
+    updates = {'last_checked': now, 'last_error': '; '.join(observed['errors']) or None}
+    events = []
+
+    if observed['name_servers'] is not None:
+        updates['name_servers'] = json.dumps(observed['name_servers'])
+        if row['name_servers'] and row['name_servers'] != updates['name_servers']:
+            events.append(('Nameservers', ', '.join(json.loads(row['name_servers'])), ', '.join(observed['name_servers'])))
+
+    cert = observed['cert']
+    if cert:
+        updates.update(cert_fingerprint=cert['fingerprint'], cert_problem=cert.get('problem'))
+        if cert['issuer']:
+            updates['cert_issuer'] = cert['issuer']
+        if cert['expires']:
+            updates['cert_expires'] = cert['expires'].timestamp()
+        if row['cert_fingerprint'] and row['cert_fingerprint'] != cert['fingerprint']:
+            events.append((
+                'Certificate',
+                f"{row['cert_issuer']}, expires {_format_timestamp(row['cert_expires'])}",
+                f"{updates.get('cert_issuer', row['cert_issuer'])}, expires {_format_timestamp(updates.get('cert_expires'))}"
+            ))
+        if row['cert_fingerprint'] and row['cert_problem'] != updates['cert_problem']:
+            events.append(('Certificate Validity', row['cert_problem'] or 'Valid', updates['cert_problem'] or 'Valid'))
+
+    record = observed['registration']
+    if record:
+        updates['status'] = json.dumps(sorted(record.get('status') or []))
+        if row['status'] is not None and row['status'] != updates['status']:
+            events.append(('Status', ', '.join(json.loads(row['status'])) or 'none', ', '.join(json.loads(updates['status'])) or 'none'))
+        if record.get('registrar'):
+            updates['registrar'] = record['registrar']
+            if row['registrar'] and row['registrar'] != record['registrar']:
+                events.append(('Registrar', row['registrar'], record['registrar']))
+        expires = record.get('expiration_date')
+        if isinstance(expires, datetime):
+            updates['domain_expires'] = expires.timestamp()
+            if row['domain_expires'] and abs(row['domain_expires'] - updates['domain_expires']) >= 86400:
+                events.append(('Domain Expiry', _format_timestamp(row['domain_expires']), _format_timestamp(updates['domain_expires'])))
+
+    expiries = [ts for ts in (updates.get('cert_expires', row['cert_expires']), updates.get('domain_expires', row['domain_expires'])) if ts]
+    days_left = (min(expiries) - now) / 86400 if expiries else None
+    if observed['name_servers'] is None and not cert and not record:
+        updates['next_due'] = now + CONFIG['watchlist_retry_interval']
+    else:
+        updates['next_due'] = now + watchlist_interval(days_left)
+
+    conn.execute(
+        f"UPDATE watchlist SET {', '.join(f'{column} = ?' for column in updates)} WHERE domain = ?",
+        [*updates.values(), row['domain']]
+    )
+    conn.executemany(
+        "INSERT INTO watchlist_events (domain, detected_at, kind, old_value, new_value) VALUES (?, ?, ?, ?, ?)",
+        [(row['domain'], now, kind, old, new) for kind, old, new in events]
+    )
+    return events
+
+def run_due_checks(max_workers=None, now=None):
+    """Re-check every entry whose next-due time has passed; returns how many were checked"""
+    if not os.path.exists(watchlist_db_path()):
+        return 0
+    with closing(watchlist_connect()) as conn:
+        due = [dict(row) for row in conn.execute(
+            "SELECT * FROM watchlist WHERE next_due <= ? ORDER BY next_due", (now or time.time(),)
+        )]
+        if not due:
+            return 0
+        with ThreadPoolExecutor(max_workers=min(len(due), max_workers or CONFIG['watchlist_workers'])) as pool:
+            futures = {pool.submit(check_watch_entry, row['domain']): row for row in due}
+            for future in as_completed(futures):
+                with conn:
+                    record_watch_check(conn, futures[future], future.result())
+    return len(due)
+
+@st.cache_resource
+def get_watchlist_scheduler():
+    """Start the background thread that re-checks due watchlist entries (once per process)"""
+    state = {'wake': threading.Event(), 'started': 0.0, 'finished': 0.0, 'checked': 0, 'error': None}
+
+    def loop():
+        while True:
+            state['started'] = time.time()
+            try:
+                state['checked'] = run_due_checks()
+                state['error'] = None
+            except Exception as e:
+                state['error'] = str(e)
+            state['finished'] = time.time()
+            state['wake'].wait(CONFIG['watchlist_poll_interval'])
+            state['wake'].clear()
+
+    threading.Thread(target=loop, name='watchlist-scheduler', daemon=True).start()
+    return state
+
+def wake_watchlist_scheduler():
+    """Ask the scheduler for a pass now - returns immediately, results land in the database"""
+    get_watchlist_scheduler()['wake'].set()
+
+def watchlist_scheduler_busy():
+    scheduler = get_watchlist_scheduler()
+    return scheduler['started'] > scheduler['finished'] or scheduler['wake'].is_set()
+
+# ============================================================================
+# GEMINI CLIENT
+# ============================================================================
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token) - good enough for budgeting without an API call"""
+    return len(text) // 4 + 1
+
+def estimate_request_tokens(parts):
+    """Budgeted cost of one call: prompt text, a flat rate per image and the expected answer"""
+    parts = parts if isinstance(parts, list) else [parts]
+    prompt = sum(CONFIG['gemini_image_tokens'] if isinstance(p, (Image.Image, dict)) else estimate_tokens(str(p)) for p in parts)
+    return prompt + CONFIG['gemini_output_tokens_estimate']
+
+def is_rate_limited(error):
+    """True for quota/429 errors from the SDK (google.api_core ResourceExhausted) or its transport"""
+    return getattr(error, 'code', None) == 429 or type(error).__name__ in ('ResourceExhausted', 'TooManyRequests') \
+        or '429' in str(error)[:20]
+
+class GeminiAdmission:
+    """Process-wide FIFO admission control for Gemini calls.
+
+    A call is admitted when it is first in line, fewer than `max_inflight`
+    calls are running, and admitting it keeps the last minute under both the
+    request and token budgets. Waiters are told their queue position.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute, max_inflight):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self._queue = deque()
+        self._window = deque()  # (admitted_at, tokens) for the last 60 seconds
+        self._window_tokens = 0
+        self._cond = threading.Condition()
+
+    def _prune(self, now):
+        while self._window and self._window[0][0] <= now - 60:
+            self._window_tokens -= self._window.popleft()[1]
+
+    def _retry_after(self, now, tokens):
+        if self.inflight >= self.max_inflight or not self._window:
+            return 1.0
+        if len(self._window) >= self.requests_per_minute:
+            return self._window[0][0] + 60 - now
+        freed = 0
+        for admitted_at, cost in self._window:
+            freed += cost
+            if self._window_tokens - freed + tokens <= self.tokens_per_minute:
+                return admitted_at + 60 - now
+        return 1.0
+
+    def acquire(self, tokens, on_wait=None):
+        """Block until admitted; on_wait(message) is called whenever the queue position changes"""
+        ticket = object()
+        last_position = None
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._prune(now)
+                    position = self._queue.index(ticket) + 1
+                    within_budget = not self._window or (
+                        len(self._window) < self.requests_per_minute
+                        and self._window_tokens + tokens <= self.tokens_per_minute
+                    )
+                    if position == 1 and self.inflight < self.max_inflight and within_budget:
+                        self._queue.popleft()
+                        self._window.append((now, tokens))
+                        self._window_tokens += tokens
+                        self.inflight += 1
+                        self._cond.notify_all()
+                        return
+                    if on_wait and position != last_position:
+                        on_wait(f"⏳ The AI service is busy - you are #{position} in the queue")
+                        last_position = position
+                    self._cond.wait(timeout=max(0.05, min(self._retry_after(now, tokens), 1.0)))
+            except BaseException:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+                raise
+
+    def release(self):
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify_all()
+
+    def queue_length(self):
+        with self._cond:
+            return len(self._queue)
+
+class GeminiClient:
+    """Thin wrapper over the Gemini SDK so tools can stream without knowing about it.
+
+    Calls pass through `admission` when one is given and 429s are retried with
+    jittered exponential backoff. Pass `model` to swap in anything with a
+    generate_content(parts, stream=...) method - e.g. a local fake model when
+    testing streaming.
+    """
+
+    def __init__(self, model_name=None, model=None, admission=None):
+        self.model_name = model_name or CONFIG['gemini_model']
+        self.admission = admission
+        self._model = model
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    @staticmethod
+    def _contents(parts):
+        return parts[0] if isinstance(parts, list) and len(parts) == 1 else parts
+
+    def _admit(self, parts, on_wait):
+        if self.admission:
+            self.admission.acquire(estimate_request_tokens(parts), on_wait)
+
+    def _release(self):
+        if self.admission:
+            self.admission.release()
+
+    @staticmethod
+    def _backoff(attempt, on_wait):
+        delay = random.uniform(0, min(CONFIG['gemini_backoff_cap'], CONFIG['gemini_backoff_base'] * 2 ** attempt))
+        if on_wait:
+            on_wait(f"⏳ The AI service is rate limiting us - retrying in {delay:.0f}s (attempt {attempt + 2})")
+        time.sleep(delay)
+
+    def generate(self, parts, on_wait=None):
+        for attempt in range(CONFIG['gemini_max_retries'] + 1):
+            self._admit(parts, on_wait)
+            try:
+                return self.model.generate_content(self._contents(parts)).text
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == CONFIG['gemini_max_retries']:
+                    raise
+            finally:
+                self._release()
+            self._backoff(attempt, on_wait)
+
+    def stream(self, parts, on_wait=None):
+        """Yield text chunks as the model produces them; a 429 before the first chunk is retried.
+
+        on_wait(message) reports queueing and backoff; on_wait(None) marks the first chunk.
+        """
+        for attempt in range(CONFIG['gemini_max_retries'] + 1):
+            self._admit(parts, on_wait)
+            started = False
+            try:
+                for chunk in self.model.generate_content(self._contents(parts), stream=True):
+                    try:
+                        text = chunk.text
+                    except ValueError:  # chunks carrying only safety/finish metadata have no text
+                        continue
+                    if text:
+                        if not started and on_wait:
+                            on_wait(None)
+                        started = True
+                        yield text
+                return
+            except Exception as e:
+                if started or not is_rate_limited(e) or attempt == CONFIG['gemini_max_retries']:
+                    raise
+            finally:
+                self._release()
+            self._backoff(attempt, on_wait)
+
+@st.cache_resource
+def get_gemini_client():
+    """One client (and one admission queue) shared by every session in the process"""
+    admission = GeminiAdmission(
+        CONFIG['gemini_requests_per_minute'], CONFIG['gemini_tokens_per_minute'], CONFIG['gemini_max_concurrent']
+    )
+    return GeminiClient(admission=admission)
+
+def ai_wait_notice():
+    """on_wait callback showing queue/retry status in a placeholder; on_wait(None) clears it"""
+    placeholder = st.empty()
+    return lambda message: placeholder.info(message) if message else placeholder.empty()
+
+# ============================================================================
+# AI RESPONSE CACHE
+# ============================================================================
+AI_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    created REAL NOT NULL,
+    latency REAL NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS screenshots (
+    key TEXT PRIMARY KEY,
+    text_key TEXT NOT NULL,
+    height INTEGER NOT NULL,
+    signature BLOB NOT NULL,
+    thumbnail BLOB NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS screenshots_text_key ON screenshots (text_key, height);
+"""
+
+def ai_cache_key(parts, model_name):
+    """Content hash of a request: model name, whitespace-normalized text and raw image pixels/bytes"""
+    digest = hashlib.sha256(model_name.encode())
+    for part in parts:
+        if isinstance(part, Image.Image):
+            digest.update(f"\0image:{part.mode}:{part.size}\0".encode())
+            digest.update(part.tobytes())
+        elif isinstance(part, dict):
+            digest.update(f"\0blob:{part['mime_type']}\0".encode())
+            digest.update(part['data'])
+        else:
+            digest.update(b"\0text\0" + ' '.join(str(part).split()).encode())
+    return digest.hexdigest()
+
+class AIResponseCache:
+    """Two-tier response cache: an in-memory LRU in front of a SQLite file with a TTL"""
+
+    def __init__(self, path, ttl, max_entries=256):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'saved_seconds': 0.0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - ttl,))
+                conn.execute("DELETE FROM screenshots WHERE created < ?", (time.time() - ttl,))
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.executescript(AI_CACHE_SCHEMA)
+        return conn
+
+    def get(self, key):
+        """Return (text, tier, original latency) or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now - self.ttl:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                self.stats['saved_seconds'] += entry[1]
+                return entry[2], 'memory', entry[1]
+        row = None
+        if os.path.exists(self.path):
+            with closing(self._connect()) as conn:
+                row = conn.execute("SELECT created, latency, text FROM responses WHERE key = ? AND created >= ?", (key, now - self.ttl)).fetchone()
+        with self._lock:
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            self._remember(key, row)
+            self.stats['disk_hits'] += 1
+            self.stats['saved_seconds'] += row[1]
+        return row[2], 'disk', row[1]
+
+    def set(self, key, model_name, text, latency):
+        entry = (time.time(), latency, text)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, model_name, *entry))
+        with self._lock:
+            self._remember(key, entry)
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def remember_screenshot(self, key, text_key, signature, thumbnail):
+        """Index a stored answer by its screenshot's signature so near-identical uploads can be offered it"""
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO screenshots VALUES (?, ?, ?, ?, ?, ?)",
+                (key, text_key, signature.shape[0], signature.tobytes(), thumbnail, time.time())
+            )
+
+    def similar_screenshot(self, key, text_key, signature, max_cells):
+        """Nearest other stored screenshot under the same prompt, within max_cells.
+
+        Returns {'key', 'cells', 'thumbnail', 'text'} or None - also None when
+        `key` itself has an answer, since that exact hit is served anyway. The
+        caller decides whether to use it.
+        """
+        if not os.path.exists(self.path):
+            return None
+        rows = signature.shape[0]
+        with closing(self._connect()) as conn:
+            candidates = conn.execute(
+                "SELECT s.key, s.height, s.signature, s.thumbnail, r.text FROM screenshots s JOIN responses r ON r.key = s.key "
+                "WHERE s.text_key = ? AND s.height BETWEEN ? AND ? AND s.key != ? AND r.created >= ? "
+                "AND NOT EXISTS (SELECT 1 FROM responses WHERE key = ? AND created >= ?)",
+                (text_key, rows - 1, rows + 1, key, time.time() - self.ttl, key, time.time() - self.ttl)
+            ).fetchall()
+        best = None
+        for other_key, height, blob, thumbnail, text in candidates:
+            other = np.frombuffer(blob, dtype=np.uint8).reshape(height, -1)
+            cells = signature_distance(signature, other)
+            if cells is not None and cells <= max_cells and (best is None or cells < best['cells']):
+                best = {'key': other_key, 'cells': cells, 'thumbnail': thumbnail, 'text': text}
+        return best
+
+    def clear(self):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM responses")
+            conn.execute("DELETE FROM screenshots")
+        with self._lock:
+            self._memory.clear()
+            self.stats.update(memory_hits=0, disk_hits=0, misses=0, saved_seconds=0.0)
+
+    def hit_rate(self):
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        total = hits + self.stats['misses']
+        return hits / total if total else 0.0
+
+@st.cache_resource
+def get_ai_cache():
+    return AIResponseCache(os.path.join(CONFIG['data_dir'], 'ai_cache.sqlite3'), CONFIG['ai_cache_ttl'], CONFIG['ai_cache_memory_entries'])
+
+AI_CACHE = get_ai_cache()
+
+def _cache_lookup(parts, client, regenerate):
+    key = ai_cache_key(parts, client.model_name)
+    return key, (None if regenerate else AI_CACHE.get(key))
+
+def screenshot_text_key(parts, client=None):
+    """Cache key of a request's text parts alone - screenshots are only compared under the same prompt"""
+    client = client or get_gemini_client()
+    return ai_cache_key([part for part in parts if isinstance(part, str)], client.model_name)
+
+def _cache_store(key, parts, client, text, latency, screenshot=None):
+    AI_CACHE.set(key, client.model_name, text, latency)
+    if screenshot is not None:
+        AI_CACHE.remember_screenshot(key, screenshot_text_key(parts, client), screenshot['signature'], screenshot['thumbnail'])
+
+def generate_cached(parts, regenerate=False, client=None, on_wait=None, screenshot=None):
+    """Blocking generate through AI_CACHE; returns (text, meta) where meta has source and latency.
+
+    regenerate=True skips the lookup and overwrites the stored answer;
+    screenshot (the info from prepare_screenshot) indexes a fresh answer for near-duplicate offers.
+    """
+    client = client or get_gemini_client()
+    parts = parts if isinstance(parts, list) else [parts]
+    key, hit = _cache_lookup(parts, client, regenerate)
+    if hit:
+        text, tier, latency = hit
+        return text, {'source': tier, 'latency': latency, 'first_token': 0.0}
+
+    start = time.perf_counter()
+    text = client.generate(parts, on_wait)
+    latency = time.perf_counter() - start
+    if text:
+        _cache_store(key, parts, client, text, latency, screenshot)
+    return text, {'source': None, 'latency': latency, 'first_token': latency}
+
+def stream_cached(parts, meta, regenerate=False, client=None, on_wait=None, screenshot=None):
+    """Streaming counterpart of generate_cached for st.write_stream; fills `meta` as it goes.
+
+    A cache hit is yielded in one piece; a miss is streamed from the model and
+    stored once complete.
+    """
+    client = client or get_gemini_client()
+    parts = parts if isinstance(parts, list) else [parts]
+    key, hit = _cache_lookup(parts, client, regenerate)
+    if hit:
+        text, tier, latency = hit
+        meta.update(source=tier, latency=latency, first_token=0.0)
+        yield text
+        return
+
+    start = time.perf_counter()
+    meta.update(source=None, first_token=None)
+    chunks = []
+    for chunk in client.stream(parts, on_wait):
+        if meta['first_token'] is None:
+            meta['first_token'] = time.perf_counter() - start
+        chunks.append(chunk)
+        yield chunk
+    meta['latency'] = time.perf_counter() - start
+    if chunks:
+        _cache_store(key, parts, client, ''.join(chunks), meta['latency'], screenshot)
+
+def show_ai_response_meta(meta):
+    """Caption under an AI answer: where it came from and the cache's running totals"""
+    if meta['source']:
+        note = f"⚡ Served from the {meta['source']} cache - saved ~{meta['latency']:.1f}s"
+    else:
+        note = f"⏱️ First token in {meta['first_token'] or 0:.1f}s, complete in {meta['latency']:.1f}s"
+    st.caption(f"{note} · cache hit rate {AI_CACHE.hit_rate():.0%} · ~{AI_CACHE.stats['saved_seconds']:.0f}s saved since startup")
+
+# ============================================================================
+# SCREENSHOT PREPARATION
+# ============================================================================
+def screenshot_signature(image, width=None):
+    """Grayscale thumbnail at a fixed width (aspect kept), compared cell by cell.
+
+    At 256 cells across a cell is a few characters of a 1080p screenshot, so a
+    different error line changes a dozen or more cells, while re-encoding and
+    rescaling move cells by only a few grey levels. 64-bit hashes (dHash/pHash)
+    only see the page layout.
+    """
+    width = width or CONFIG['screenshot_signature_width']
+    gray = image.convert('L')
+    rows = max(1, round(width * gray.height / gray.width))
+    return np.asarray(gray.resize((width, rows), Image.Resampling.BOX), dtype=np.uint8)
+
+def signature_distance(a, b, tolerance=None):
+    """Number of cells differing by more than `tolerance` grey levels; None when the aspect ratios differ"""
+    tolerance = CONFIG['screenshot_match_tolerance'] if tolerance is None else tolerance
+    if a.shape[1] != b.shape[1] or abs(a.shape[0] - b.shape[0]) > 1:
+        return None
+    rows = min(a.shape[0], b.shape[0])
+    return int((np.abs(a[:rows].astype(np.int16) - b[:rows]) > tolerance).sum())
+
+def crop_borders(image, threshold=None):
+    """Trim uniform margins (letterboxing, empty page background) matching the top-left pixel"""
+    threshold = CONFIG['screenshot_border_threshold'] if threshold is None else threshold
+    factor = max(1, max(image.size) // 1024)  # find the box on a reduced copy, then widen it by one step
+    small = image.reduce(factor)
+    background = Image.new(small.mode, small.size, image.getpixel((0, 0)))
+    mask = ImageChops.difference(small, background).convert('L').point(lambda v: 255 if v > threshold else 0)
+    bbox = mask.getbbox()
+    if not bbox:
+        return image
+    left, top, right, bottom = bbox
+    return image.crop((
+        max(0, (left - 1) * factor), max(0, (top - 1) * factor),
+        min(image.width, (right + 1) * factor), min(image.height, (bottom + 1) * factor)
+    ))
+
+@st.cache_data(ttl=CONFIG['cache_ttl'], max_entries=16, show_spinner=False)
+def prepare_screenshot(data):
+    """Shrink an uploaded screenshot for the model: rotate, flatten, crop borders, downsize, re-encode.
+
+    Returns (part, info): part is an inline blob for generate_content and info
+    carries byte counts, dimensions, the chosen format, the near-duplicate
+    signature and a small JPEG thumbnail.
+    """
+    source = Image.open(io.BytesIO(data))
+    image = ImageOps.exif_transpose(source)
+    original_size = image.size
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        flat = Image.new('RGB', image.size, 'white')
+        flat.paste(image, mask=image.getchannel('A'))
+        image = flat
+    else:
+        image = image.convert('RGB')
+
+    # Taken before cropping: the crop box shifts by a few pixels with compression noise
+    signature = screenshot_signature(image)
+    image = crop_borders(image)
+    cropped_size = image.size
+    image.thumbnail((CONFIG['screenshot_max_side'], CONFIG['screenshot_max_side']), Image.Resampling.LANCZOS)
+
+    fmt = 'WEBP' if features.check('webp') else 'JPEG'
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, quality=CONFIG['screenshot_quality'])
+    part = {'mime_type': f"image/{fmt.lower()}", 'data': buffer.getvalue()}
+    if len(part['data']) >= len(data) and source.format in ('JPEG', 'PNG', 'WEBP') and image.size == original_size:
+        part = {'mime_type': Image.MIME[source.format], 'data': data}  # already compact and nothing was trimmed
+
+    thumbnail = image.copy()
+    thumbnail.thumbnail((CONFIG['screenshot_thumbnail_side'], CONFIG['screenshot_thumbnail_side']), Image.Resampling.LANCZOS)
+    thumbnail_buffer = io.BytesIO()
+    thumbnail.save(thumbnail_buffer, 'JPEG', quality=70)
+
+    return part, {
+        'original_bytes': len(data),
+        'prepared_bytes': len(part['data']),
+        'original_size': original_size,
+        'cropped': cropped_size != original_size,
+        'prepared_size': image.size,
+        'format': part['mime_type'].split('/')[1].upper(),
+        'signature': signature,
+        'thumbnail': thumbnail_buffer.getvalue()
+    }
+
+def format_bytes(size):
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 ** 2:
+        return f"{size / 1024:.1f} KB"
+    return f"{size / 1024 ** 2:.1f} MB"
+
+# ============================================================================
+# CHAT MEMORY
+# ============================================================================
+CHAT_SUMMARY_PROMPT = """You maintain the running summary of a support chat between a hosting support agent and an AI assistant.
+Update the summary with the new messages below. Keep customer details, domains, error messages, what was tried and
+what was concluded; drop pleasantries. Reply with the updated summary only, at most {limit} words.
+
+Current summary:
+{summary}
+
+New messages:
+{turns}"""
+
+def clip_to_tokens(text, max_tokens):
+    """Keep the head and tail of an over-long message (pasted logs) within max_tokens"""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    keep = max_chars // 2
+    return f"{text[:keep]}\n[... {len(text) - 2 * keep} characters omitted ...]\n{text[-keep:]}"
+
+def new_chat_memory():
+    """Fresh conversation state for st.session_state; archives older than a week are pruned"""
+    archive_dir = os.path.join(CONFIG['data_dir'], 'chats')
+    if os.path.isdir(archive_dir):
+        cutoff = time.time() - CONFIG['chat_archive_ttl']
+        for name in os.listdir(archive_dir):
+            path = os.path.join(archive_dir, name)
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+    return {
+        'archive': os.path.join(archive_dir, f"{os.urandom(8).hex()}.jsonl"),
+        'turns': [],  # newest turns kept in the session
+        'summarized': 0,  # turns[:summarized] are already folded into summary
+        'summary': '',
+        'archived': 0  # turns moved out of the session into the archive file
+    }
+
+def chat_add_turn(memory, role, content):
+    memory['turns'].append({'role': role, 'content': content, 'tokens': estimate_tokens(content)})
+
+def chat_window_start(memory, budget=None):
+    """Index of the oldest turn that still fits the prompt token budget (the newest turn always does)"""
+    budget = budget or CONFIG['chat_context_tokens']
+    start = len(memory['turns'])
+    for i in range(len(memory['turns']) - 1, memory['summarized'] - 1, -1):
+        cost = min(memory['turns'][i]['tokens'], CONFIG['chat_turn_max_tokens'])
+        if cost > budget and start < len(memory['turns']):
+            break
+        budget -= cost
+        start = i
+    return start
+
+def _format_turns(turns):
+    return "\n".join(
+        f"{'User' if t['role'] == 'user' else 'Assistant'}: {clip_to_tokens(t['content'], CONFIG['chat_turn_max_tokens'])}"
+        for t in turns
+    )
+
+def build_chat_prompt(memory, system):
+    """System context + running summary + the newest turns that fit the budget"""
+    sections = [system]
+    if memory['summary']:
+        sections.append(f"Summary of the earlier conversation:\n{memory['summary']}")
+    sections.append(_format_turns(memory['turns'][chat_window_start(memory):]))
+    return "\n\n".join(sections)
+
+def compact_chat_memory(memory, client=None):
+    """Fold turns that fell out of the window into the summary, then spill the oldest to disk.
+
+    Once the window overflows it is folded down to half the budget, so a summary
+    call happens every few turns rather than every turn and each one covers a
+    bounded amount of text. Summaries go through generate_cached.
+    """
+    if chat_window_start(memory) > memory['summarized']:
+        start = chat_window_start(memory, CONFIG['chat_context_tokens'] // 2)
+        prompt = CHAT_SUMMARY_PROMPT.format(
+            limit=CONFIG['chat_summary_words'],
+            summary=memory['summary'] or '(none yet)',
+            turns=_format_turns(memory['turns'][memory['summarized']:start])
+        )
+        memory['summary'], _ = generate_cached(prompt, client=client)
+        memory['summarized'] = start
+
+    excess = min(len(memory['turns']) - CONFIG['chat_max_session_turns'], memory['summarized'])
+    if excess > 0:
+        os.makedirs(os.path.dirname(memory['archive']), exist_ok=True)
+        with open(memory['archive'], 'a', encoding='utf-8') as f:
+            for turn in memory['turns'][:excess]:
+                f.write(json.dumps({'role': turn['role'], 'content': turn['content']}) + "\n")
+        del memory['turns'][:excess]
+        memory['summarized'] -= excess
+        memory['archived'] += excess
+
+def chat_transcript(memory):
+    """Full conversation (archived and in-session turns) as plain text"""
+    turns = []
+    if memory['archived'] and os.path.exists(memory['archive']):
+        with open(memory['archive'], encoding='utf-8') as f:
+            turns = [json.loads(line) for line in f]
+    turns += memory['turns']
+    return "\n\n".join(f"{'User' if t['role'] == 'user' else 'Assistant'}: {t['content']}" for t in turns)
+
+def clear_chat_memory(memory):
+    if os.path.exists(memory['archive']):
+        os.remove(memory['archive'])
+    return new_chat_memory()
+
+# ============================================================================
+# TICKET ANALYSIS
+# ============================================================================
+TICKET_ANALYSIS_PROMPT = """Analyze this support ticket and provide:
+
+1. **Issue Summary**: Brief description of the problem
+2. **Category**: Type of issue (Email, Domain, Website, etc.)
+3. **Severity**: Low/Medium/High/Critical
+4. **Key Information**: Important details found
+5. **Missing Information**: What else do we need?
+6. **Troubleshooting Steps**: Specific steps to diagnose
+7. **Recommended Tools**: Which Support Buddy tools to use
+8. **Estimated Time**: How long this might take to resolve
+9. **Potential Solutions**: Likely fixes
+
+Be specific and actionable."""
+
+TICKET_BATCH_SUFFIX = """
+
+Finish with one final line containing only this JSON object (no code fence):
+{"category": "...", "severity": "Low|Medium|High|Critical", "recommended_tool": "..."}"""
+
+TICKET_SUMMARY_PATTERN = re.compile(r'\{[^{}]*"category"[^{}]*\}', re.DOTALL)
+
+def load_ticket_export(uploaded_file):
+    """Read a ticket export (CSV, JSONL or a JSON array) into a DataFrame"""
+    name = uploaded_file.name.lower()
+    if name.endswith('.jsonl'):
+        return pd.read_json(uploaded_file, lines=True, dtype=False)
+    if name.endswith('.json'):
+        return pd.read_json(uploaded_file, dtype=False)
+    return pd.read_csv(uploaded_file, dtype=str, keep_default_na=False)
+
+def parse_ticket_summary(text):
+    """Pull category/severity/recommended_tool out of the JSON line a batch analysis ends with"""
+    for match in reversed(TICKET_SUMMARY_PATTERN.findall(text or '')):
+        try:
+            data = json.loads(match)
+        except ValueError:
+            continue
+        return {key: str(data.get(key) or '').strip() or None for key in ('category', 'severity', 'recommended_tool')}
+    return {'category': None, 'severity': None, 'recommended_tool': None}
+
+def analyze_ticket_text(ticket_id, ticket_text, client):
+    """One batch analysis with retries for transient errors (429s are already retried by the client)"""
+    prompt = f"{TICKET_ANALYSIS_PROMPT}{TICKET_BATCH_SUFFIX}\n\nTicket Content:\n{clip_to_tokens(ticket_text, CONFIG['ticket_batch_max_tokens'])}"
+    for attempt in range(CONFIG['ticket_batch_retries'] + 1):
+        try:
+            text, meta = generate_cached(prompt, client=client)
+            break
+        except Exception as e:
+            if attempt == CONFIG['ticket_batch_retries']:
+                return {'ticket': ticket_id, 'category': None, 'severity': None, 'recommended_tool': None,
+                        'analysis': None, 'error': str(e), 'cached': False}
+            time.sleep(random.uniform(0, CONFIG['gemini_backoff_base'] * 2 ** attempt))
+    return {'ticket': ticket_id, **parse_ticket_summary(text), 'analysis': text, 'error': None,
+            'cached': bool(meta['source'])}
+
+def ticket_batch_checkpoint(tickets):
+    """Checkpoint file for a batch - keyed by its content, so re-running the same export resumes it"""
+    digest = hashlib.sha256(json.dumps(tickets, ensure_ascii=False).encode()).hexdigest()[:16]
+    return os.path.join(CONFIG['data_dir'], 'ticket_batches', f"{digest}.jsonl")
+
+def load_ticket_checkpoint(path):
+    """Finished (error-free) results from an earlier run, keyed by ticket ID"""
+    done = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:  # a line cut short by a crash
+                    continue
+                if not row.get('error'):
+                    done[row['ticket']] = row
+    return done
+
+def run_ticket_batch(tickets, checkpoint, client=None, max_workers=None, progress_cb=None):
+    """Analyze [(ticket_id, text)] on a bounded pool, appending each result to the checkpoint as it lands.
+
+    Tickets already in the checkpoint are skipped; progress_cb(rows, done, total)
+    sees the cumulative rows after every completion.
+    """
+    client = client or get_gemini_client()
+    done = load_ticket_checkpoint(checkpoint)
+    rows = [done[ticket_id] for ticket_id, _ in tickets if ticket_id in done]
+    pending = [(ticket_id, text) for ticket_id, text in tickets if ticket_id not in done]
+    if progress_cb:
+        progress_cb(rows, len(rows), len(tickets))
+    if not pending:
+        return rows
+
+    os.makedirs(os.path.dirname(checkpoint), exist_ok=True)
+    with open(checkpoint, 'a', encoding='utf-8') as f, \
+            ThreadPoolExecutor(max_workers=min(len(pending), max_workers or CONFIG['ticket_batch_workers'])) as pool:
+        futures = [pool.submit(analyze_ticket_text, ticket_id, text, client) for ticket_id, text in pending]
+        for future in as_completed(futures):
+            row = future.result()
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            f.flush()
+            rows.append(row)
+            if progress_cb:
+                progress_cb(rows, len(rows), len(tickets))
+    order = {ticket_id: i for i, (ticket_id, _) in enumerate(tickets)}
+    return sorted(rows, key=lambda row: order[row['ticket']])
+
+# ============================================================================
+# SIMILAR TICKET INDEX
+# ============================================================================
+MINHASH_PRIME = 4294967311  # smallest prime above 2**32; crc32 shingle hashes stay below it
+
+# Fixed seed so signatures stored on disk stay comparable across restarts
+_minhash_rng = np.random.RandomState(20240611)
+MINHASH_A = _minhash_rng.randint(1, 2 ** 31, size=CONFIG['ticket_minhash_perms']).astype(np.uint64)
+MINHASH_B = _minhash_rng.randint(0, 2 ** 31, size=CONFIG['ticket_minhash_perms']).astype(np.uint64)
+
+TICKET_INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    text_hash TEXT UNIQUE NOT NULL,
+    text TEXT NOT NULL,
+    analysis TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lsh_buckets (
+    band INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    ticket_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lsh_buckets_lookup ON lsh_buckets (band, bucket);
+"""
+
+def ticket_shingles(text, k=5):
+    """Character k-gram hashes of the lower-cased, punctuation-free ticket text"""
+    normalized = ' '.join(re.sub(r'[^a-z0-9]+', ' ', text.lower()).split())
+    if len(normalized) <= k:
+        return {zlib.crc32(normalized.encode())}
+    return {zlib.crc32(normalized[i:i + k].encode()) for i in range(len(normalized) - k + 1)}
+
+def minhash_signature(text):
+    """MinHash signature: per permutation, the minimum of (a*x + b) mod p over all shingles"""
+    shingles = np.fromiter(ticket_shingles(text), dtype=np.uint64)
+    return ((np.outer(MINHASH_A, shingles) + MINHASH_B[:, None]) % MINHASH_PRIME).min(axis=1)
+
+def lsh_buckets(signature):
+    """One bucket ID per band of rows - similar signatures collide in at least one band"""
+    rows = CONFIG['ticket_minhash_perms'] // CONFIG['ticket_lsh_bands']
+    return [
+        (band, int.from_bytes(hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest(), 'big', signed=True))
+        for band in range(CONFIG['ticket_lsh_bands'])
+    ]
+
+class TicketIndex:
+    """On-disk MinHash LSH index of analyzed tickets for near-duplicate lookup"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.executescript(TICKET_INDEX_SCHEMA)
+        return conn
+
+    def add(self, text, analysis):
+        """Index a ticket and its analysis; re-adding the same text refreshes the analysis"""
+        self.add_many([(text, analysis)])
+
+    def add_many(self, pairs):
+        """Index (text, analysis) pairs in one transaction"""
+        with closing(self._connect()) as conn, conn:
+            for text, analysis in pairs:
+                text_hash = hashlib.sha256(' '.join(text.split()).encode()).hexdigest()
+                row = conn.execute("SELECT id FROM tickets WHERE text_hash = ?", (text_hash,)).fetchone()
+                if row:
+                    conn.execute("UPDATE tickets SET analysis = ?, created = ? WHERE id = ?", (analysis, time.time(), row[0]))
+                    continue
+                signature = minhash_signature(text)
+                ticket_id = conn.execute(
+                    "INSERT INTO tickets (text_hash, text, analysis, signature, created) VALUES (?, ?, ?, ?, ?)",
+                    (text_hash, text, analysis, signature.tobytes(), time.time())
+                ).lastrowid
+                conn.executemany("INSERT INTO lsh_buckets VALUES (?, ?, ?)", [(band, bucket, ticket_id) for band, bucket in lsh_buckets(signature)])
+
+    def query(self, text, limit=3, threshold=None):
+        """Closest indexed tickets as dicts with text, analysis and estimated Jaccard similarity"""
+        if not os.path.exists(self.path):
+            return []
+        threshold = CONFIG['ticket_similarity_threshold'] if threshold is None else threshold
+        signature = minhash_signature(text)
+        buckets = lsh_buckets(signature)
+        with closing(self._connect()) as conn:
+            candidates = conn.execute(
+                f"SELECT id, signature FROM tickets WHERE id IN ("
+                f"SELECT ticket_id FROM lsh_buckets WHERE (band, bucket) IN (VALUES {', '.join(['(?, ?)'] * len(buckets))}))",
+                [value for pair in buckets for value in pair]
+            ).fetchall()
+            scored = sorted(
+                ((float(np.mean(np.frombuffer(blob, dtype=np.uint64) == signature)), ticket_id) for ticket_id, blob in candidates),
+                reverse=True
+            )
+            matches = []
+            for similarity, ticket_id in scored[:limit]:
+                if similarity < threshold:
+                    break
+                ticket_text, analysis, created = conn.execute(
+                    "SELECT text, analysis, created FROM tickets WHERE id = ?", (ticket_id,)
+                ).fetchone()
+                matches.append({'id': ticket_id, 'text': ticket_text, 'analysis': analysis, 'similarity': similarity, 'created': created})
+        return matches
+
+    def __len__(self):
+        if not os.path.exists(self.path):
+            return 0
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM tickets").fetchone()[0]
+
+@st.cache_resource
+def get_ticket_index():
+    return TicketIndex(os.path.join(CONFIG['data_dir'], 'ticket_index.sqlite3'))
+
+TICKET_INDEX = get_ticket_index()
+
+def few_shot_ticket_prompt(ticket_text, example):
+    """Analysis prompt with a similar past ticket and its analysis as a worked example"""
+    return (
+        f"{TICKET_ANALYSIS_PROMPT}\n\nFor reference, here is a similar ticket we analyzed before and its analysis. "
+        f"Reuse what applies, but analyze the new ticket on its own merits.\n\n"
+        f"Past Ticket:\n{clip_to_tokens(example['text'], 1000)}\n\nPast Analysis:\n{example['analysis']}\n\n"
+        f"Ticket Content:\n{ticket_text}"
+    )
+
+# ============================================================================
+# BOUNCE CLASSIFIER
+# ============================================================================
+BOUNCE_CATEGORIES = {
+    'Invalid recipient': {
+        'fix': "Check the recipient address for typos and confirm with the recipient that the mailbox exists. Remove it from lists if it keeps bouncing.",
+        'tools': ["📮 MX Record Checker"]
+    },
+    'Mailbox disabled': {
+        'fix': "The recipient's account exists but is disabled or suspended. Contact the recipient by another channel - only their provider can re-enable it.",
+        'tools': []
+    },
+    'Mailbox full': {
+        'fix': "The recipient must free up space or raise their quota. For our own mailboxes, raise the quota in cPanel > Email Accounts or clear old mail.",
+        'tools': []
+    },
+    'Message too large': {
+        'fix': "Send the attachment as a download link or compress it. Most providers cap messages at 20-35 MB after encoding (about a third larger than the files).",
+        'tools': []
+    },
+    'Rate limited': {
+        'fix': "The receiving server is throttling us. The message will be retried automatically - reduce sending volume or spread it out, and check for a compromised account if the volume is unexpected.",
+        'tools': ["🚫 DNSBL Blacklist Check"]
+    },
+    'Sending limit reached': {
+        'fix': "The account hit our outgoing limit (WHM > Tweak Settings > Max hourly emails / Max defers and failures). Look for a compromised account or spamming script before raising the limit.",
+        'tools': ["📄 Email Header Analyzer"]
+    },
+    'Blocked (reputation)': {
+        'fix': "The sending IP or domain is on a blocklist or has poor reputation. Find the listing, fix the cause (compromised account, open form, spam), then request delisting.",
+        'tools': ["🚫 DNSBL Blacklist Check", "🔁 Bulk Reverse DNS (PTR)"]
+    },
+    'Authentication failed (SPF/DKIM/DMARC)': {
+        'fix': "Make sure the sending server is in the SPF record, DKIM signing is enabled in cPanel > Email Deliverability, and the From domain aligns with the DMARC policy.",
+        'tools': ["🔒 SPF/DKIM Check", "📊 DMARC Report Analyzer", "📄 Email Header Analyzer"]
+    },
+    'Reverse DNS': {
+        'fix': "The sending IP needs a PTR record whose hostname resolves back to the same IP. Request the PTR from the IP owner (datacenter or ISP).",
+        'tools': ["🔁 Bulk Reverse DNS (PTR)"]
+    },
+    'Relay denied': {
+        'fix': "The client is sending through a server that does not know them. Enable SMTP authentication in the mail client with the full email address as username.",
+        'tools': ["✉️ Email Account Tester"]
+    },
+    'SMTP auth failed': {
+        'fix': "Check the username (full email address), password, port (465 SSL or 587 STARTTLS) and that SMTP authentication is turned on in the mail client.",
+        'tools': ["✉️ Email Account Tester"]
+    },
+    'Sender rejected': {
+        'fix': "The envelope sender was refused. Make sure the sender domain exists, has MX/A records and that the From address is a real mailbox.",
+        'tools': ["📮 MX Record Checker", "🔎 DNS Analyzer"]
+    },
+    'Domain / routing': {
+        'fix': "The recipient domain has no usable mail servers. Check the domain for typos, then check its MX records and that they resolve.",
+        'tools': ["📮 MX Record Checker", "🔎 DNS Analyzer"]
+    },
+    'Connection / TLS': {
+        'fix': "The servers could not talk to each other. Check that the remote MX is reachable on port 25, that our outbound port 25 is open, and that both sides support TLS with a valid certificate.",
+        'tools': ["📮 MX Record Checker", "🔒 SSL Certificate Checker"]
+    },
+    'Delivery timed out': {
+        'fix': "The message sat in the queue until it expired. Look at the earlier deferral reason in the mail log - it is the real cause.",
+        'tools': ["📮 MX Record Checker"]
+    },
+    'Temporary / greylisting': {
+        'fix': "A temporary rejection - the server will retry on its own. If it persists for hours, check the deferral reason and the recipient's MX.",
+        'tools': []
+    },
+    'Content rejected': {
+        'fix': "The recipient's filter rejected the content. Remove suspicious links, URL shorteners, executable attachments and spammy wording, then resend.",
+        'tools': ["📄 Email Header Analyzer"]
+    },
+    'Message format': {
+        'fix': "The message uses a format or encoding the recipient cannot accept. Resend as plain text or standard MIME, and avoid non-ASCII addresses.",
+        'tools': []
+    },
+    'Mail loop': {
+        'fix': "The message is bouncing between servers. Look for forwarders that point back at each other, or MX records that point at the wrong server.",
+        'tools': ["📮 MX Record Checker"]
+    },
+    'Policy': {
+        'fix': "The recipient's server refused the message by local policy. Check the bounce text for the specific rule, or ask the recipient to whitelist the sender.",
+        'tools': []
+    },
+    'Protocol error': {
+        'fix': "The sending software broke the SMTP conversation. Update the mail client or script, and check for too many recipients per message.",
+        'tools': []
+    }
+}
+
+# Curated bounce texts, most specific first - the first rule to match wins when they disagree.
+# Patterns are matched against lower-cased text, must start at a word boundary and may only use
+# non-capturing groups. 'weak' rules describe a symptom rather than a cause and only decide
+# when nothing more specific matched.
+BOUNCE_RULES = [
+    # Gmail
+    {'id': 'gmail-no-such-user', 'category': 'Invalid recipient', 'cause': "Gmail: the recipient address does not exist",
+     'pattern': r"the email account that you tried to reach does not exist"},
+    {'id': 'gmail-disabled', 'category': 'Mailbox disabled', 'cause': "Gmail: the recipient account is disabled",
+     'pattern': r"the email account that you tried to reach is (?:disabled|inactive)"},
+    {'id': 'gmail-over-quota', 'category': 'Mailbox full', 'cause': "Gmail: the recipient is over their storage quota",
+     'pattern': r"(?:email account|user) that you tried to reach is over quota|out of storage space"},
+    {'id': 'gmail-rate', 'category': 'Rate limited', 'cause': "Gmail: receiving too much mail from this sender too quickly",
+     'pattern': r"receiving mail (?:at a rate|too quickly)|unusual rate of unsolicited mail"},
+    {'id': 'gmail-unauthenticated', 'category': 'Authentication failed (SPF/DKIM/DMARC)', 'cause': "Gmail: the message failed SPF/DKIM/DMARC checks",
+     'pattern': r"does not have authentication information|fails? to pass authentication checks|sender is unauthenticated|this mail is unauthenticated|not accepted due to domain's dmarc policy"},
+    {'id': 'gmail-ptr', 'category': 'Reverse DNS', 'cause': "Gmail: the sending IP has no matching PTR record",
+     'pattern': r"does not have a ptr record|ptr record setup"},
+    {'id': 'gmail-reputation', 'category': 'Blocked (reputation)', 'cause': "Gmail: the sending domain or IP has very low reputation",
+     'pattern': r"very low reputation of the sending (?:domain|ip)|likely unsolicited mail"},
+    {'id': 'gmail-security', 'category': 'Content rejected', 'cause': "Gmail: the message was flagged as a security risk",
+     'pattern': r"poses a security risk|blocked because its content presents a potential security issue"},
+    {'id': 'gmail-size', 'category': 'Message too large', 'cause': "Gmail: the message exceeds Google's size limit",
+     'pattern': r"exceeded google's message size limits"},
+    {'id': 'gmail-send-limit', 'category': 'Sending limit reached', 'cause': "Google Workspace: the sender hit their daily sending limit",
+     'pattern': r"daily user sending (?:quota|limit) exceeded|you have reached a limit for sending mail"},
+    # Microsoft 365 / Outlook.com
+    {'id': 'microsoft-recipient-not-found', 'category': 'Invalid recipient', 'cause': "Microsoft 365: the recipient was not found in the directory",
+     'pattern': r"resolver\.adr\.(?:ex)?recip(?:ient)?notfound"},
+    {'id': 'microsoft-dbeb', 'category': 'Invalid recipient', 'cause': "Microsoft 365: the recipient is not in the tenant's directory (directory-based edge blocking)",
+     'pattern': r"recipient address rejected: access denied\. as\(\d+\)"},
+    {'id': 'microsoft-blocklist', 'category': 'Blocked (reputation)', 'cause': "Outlook.com: the sending IP is on Microsoft's block list",
+     'pattern': r"part of their network is on our block list|banned sending ip|traffic not accepted from this ip|s3(?:140|150)\b"},
+    {'id': 'microsoft-restricted', 'category': 'Policy', 'cause': "Microsoft 365: the sender is not allowed to mail this recipient or group",
+     'pattern': r"resolver\.rst\.(?:notauthorized|authrequired)|not authorized to send to this (?:recipient|group)"},
+    {'id': 'microsoft-anonymous', 'category': 'SMTP auth failed', 'cause': "Microsoft 365: the client did not authenticate before sending",
+     'pattern': r"client was not authenticated to send anonymous mail|smtp client authentication is disabled"},
+    {'id': 'microsoft-loop', 'category': 'Mail loop', 'cause': "Microsoft 365: the message exceeded the hop count",
+     'pattern': r"resolver\.ro\.(?:rfoot|maxhops)|hop count exceeded"},
+    # Yahoo / AOL
+    {'id': 'yahoo-deferred', 'category': 'Rate limited', 'cause': "Yahoo: deferred due to unexpected volume or user complaints",
+     'pattern': r"tss?0[1-4]\b|temporarily deferred due to (?:unexpected volume|user complaints)"},
+    {'id': 'yahoo-blocked', 'category': 'Blocked (reputation)', 'cause': "Yahoo: all mail from this sender is permanently deferred",
+     'pattern': r"tss09\b|will be permanently deferred"},
+    {'id': 'yahoo-no-account', 'category': 'Invalid recipient', 'cause': "Yahoo/AOL: the recipient account does not exist or was discontinued",
+     'pattern': r"user doesn'?t have a \S+ account|this account has been disabled or discontinued|ph01\b"},
+    # cPanel / Exim / Postfix
+    {'id': 'cpanel-hourly-limit', 'category': 'Sending limit reached', 'cause': "cPanel: the domain exceeded its hourly email or defer/fail limit",
+     'pattern': r"exceeded the max (?:emails|defers and failures) per hour"},
+    {'id': 'relay-denied', 'category': 'Relay denied', 'cause': "The server refused to relay for an unauthenticated client",
+     'pattern': r"relay(?:ing)? (?:access )?(?:denied|not permitted|prohibited)|(?:unable|not allowed|not permitted) to relay|we do not relay"},
+    {'id': 'smtp-auth', 'category': 'SMTP auth failed', 'cause': "SMTP login was rejected",
+     'pattern': r"authentication (?:credentials invalid|failed|unsuccessful|required)|incorrect authentication data|username and password not accepted|invalid (?:login|credentials)"},
+    {'id': 'sender-verify', 'category': 'Sender rejected', 'cause': "The recipient server could not verify the sender address",
+     'pattern': r"sender verify failed|sender address rejected|sender domain (?:must exist|not found)|unverified sender"},
+    {'id': 'spf-dkim-dmarc', 'category': 'Authentication failed (SPF/DKIM/DMARC)', 'cause': "The message failed SPF, DKIM or DMARC validation",
+     'pattern': r"spf\b[^.\n]{0,40}\b(?:fail|softfail|not (?:pass|permitted)|validation)|\bdkim\b[^.\n]{0,40}\b(?:fail|invalid|not valid|signature)|\bdmarc\b"},
+    {'id': 'no-ptr', 'category': 'Reverse DNS', 'cause': "The sending IP has no (or a mismatched) reverse DNS record",
+     'pattern': r"reverse (?:dns|lookup)|rdns\b|no ptr|ptr (?:record|lookup)|cannot find your hostname|client host rejected: cannot find"},
+    {'id': 'blocklisted', 'category': 'Blocked (reputation)', 'cause': "The sending IP or domain is on a blocklist",
+     'pattern': r"blocked using|listed (?:at|in|on|by)\b|block ?listed|black ?listed|spamhaus|barracuda|spamcop|sorbs\b|rbl\b|dnsbl|(?:poor|bad|low) reputation"},
+    {'id': 'send-rate', 'category': 'Rate limited', 'cause': "The receiving server is throttling this sender",
+     'pattern': r"too many (?:connections|messages|concurrent)|rate.?limit|throttl|mail flood|exceeded (?:the )?(?:message )?rate"},
+    {'id': 'too-many-recipients', 'category': 'Protocol error', 'cause': "The message has more recipients than the server allows",
+     'pattern': r"too many recipients"},
+    {'id': 'greylisted', 'category': 'Temporary / greylisting', 'cause': "The recipient server greylisted the message and expects a retry",
+     'pattern': r"gr[ae]ylist"},
+    {'id': 'mailbox-full', 'category': 'Mailbox full', 'cause': "The recipient mailbox is over quota",
+     'pattern': r"mailbox (?:is )?full|mailboxfull|over ?quota|quota exceeded|exceeded (?:the |their )?(?:storage|quota)|insufficient (?:system )?storage"},
+    {'id': 'mailbox-disabled', 'category': 'Mailbox disabled', 'cause': "The recipient mailbox exists but is disabled or suspended",
+     'pattern': r"(?:mailbox|account|user) (?:is |has been )?(?:disabled|inactive|suspended|deactivated)"},
+    {'id': 'user-unknown', 'category': 'Invalid recipient', 'cause': "The recipient mailbox does not exist",
+     'pattern': r"no such (?:user|mailbox|recipient)|user(?:name)? unknown|unknown (?:user|recipient)|recipient (?:unknown|not found)|(?:mailbox|user|address) (?:not found|does not exist|doesn'?t exist)|invalid (?:mailbox|recipient)|no mailbox here|not a valid mailbox"},
+    {'id': 'size-limit', 'category': 'Message too large', 'cause': "The message exceeds the recipient's size limit",
+     'pattern': r"message (?:size|length) exceeds|message (?:file )?too (?:large|big)|exceeds (?:the )?(?:maximum|max|size limit)|size limit"},
+    {'id': 'malware', 'category': 'Content rejected', 'cause': "The message or an attachment was flagged as malware",
+     'pattern': r"virus|malware|infected|(?:blocked|prohibited|banned) (?:file|attachment)|attachment type"},
+    {'id': 'spam-content', 'category': 'Content rejected', 'cause': "The recipient's spam filter rejected the content",
+     'pattern': r"(?:identified|detected|classified|rejected|blocked) as spam|spam (?:detected|content|message rejected)|looks like spam|content (?:filter|restrictions)"},
+    {'id': 'domain-not-found', 'category': 'Domain / routing', 'cause': "The recipient domain does not exist or has no mail servers",
+     'pattern': r"host or domain name not found|name service error|unroutea?ble (?:address|domain|mail domain)|domain (?:not found|does not exist|does not accept mail)|no (?:mx|mail servers?|valid mx)|null mx|nxdomain"},
+    {'id': 'expired', 'category': 'Delivery timed out', 'cause': "The message expired in the queue after repeated failures",
+     'pattern': r"retry timeout exceeded|delivery time expired|message expired|could not be delivered for \d+ (?:days|hours)"},
+    {'id': 'tls', 'category': 'Connection / TLS', 'cause': "The TLS handshake or certificate check failed",
+     'pattern': r"(?:tls|ssl)[^.\n]{0,20}(?:handshake|negotiation|required|failed|error)|must issue a starttls|certificate verif\w* failed"},
+    {'id': 'connection', 'category': 'Connection / TLS', 'cause': "The recipient's mail server could not be reached",
+     'pattern': r"connection (?:timed out|refused|reset|closed|lost)|timed out|network is unreachable|no route to host|(?:could not|unable to) connect"},
+    {'id': 'try-later', 'category': 'Temporary / greylisting', 'cause': "The recipient server asked us to retry later", 'weak': True,
+     'pattern': r"try again later|please retry|temporar(?:y|ily) (?:failure|rejected|deferred|unavailable)"}
+]
+
+# RFC 3463 enhanced status codes (subject.detail). Catch-all details such as X.7.1 map to
+# no category - they say only that the message was refused, so the bounce text decides.
+ENHANCED_STATUS_CODES = {
+    '0.0': ("Other undefined status", None),
+    '1.0': ("Other address status", None),
+    '1.1': ("Bad destination mailbox address", 'Invalid recipient'),
+    '1.2': ("Bad destination system address", 'Domain / routing'),
+    '1.3': ("Bad destination mailbox address syntax", 'Invalid recipient'),
+    '1.4': ("Destination mailbox address ambiguous", 'Invalid recipient'),
+    '1.6': ("Destination mailbox has moved", 'Invalid recipient'),
+    '1.7': ("Bad sender's mailbox address syntax", 'Sender rejected'),
+    '1.8': ("Bad sender's system address", 'Sender rejected'),
+    '1.10': ("Recipient address has null MX", 'Domain / routing'),
+    '2.0': ("Other or undefined mailbox status", None),
+    '2.1': ("Mailbox disabled, not accepting messages", 'Mailbox disabled'),
+    '2.2': ("Mailbox full", 'Mailbox full'),
+    '2.3': ("Message length exceeds administrative limit", 'Message too large'),
+    '2.4': ("Mailing list expansion problem", 'Policy'),
+    '3.0': ("Other or undefined mail system status", None),
+    '3.1': ("Mail system full", 'Mailbox full'),
+    '3.2': ("System not accepting network messages", 'Temporary / greylisting'),
+    '3.3': ("System not capable of selected features", 'Message format'),
+    '3.4': ("Message too big for system", 'Message too large'),
+    '3.5': ("System incorrectly configured", 'Domain / routing'),
+    '4.0': ("Other or undefined network or routing status", None),
+    '4.1': ("No answer from host", 'Connection / TLS'),
+    '4.2': ("Bad connection", 'Connection / TLS'),
+    '4.3': ("Directory server failure", 'Temporary / greylisting'),
+    '4.4': ("Unable to route", 'Domain / routing'),
+    '4.5': ("Mail system congestion", 'Rate limited'),
+    '4.6': ("Routing loop detected", 'Mail loop'),
+    '4.7': ("Delivery time expired", 'Delivery timed out'),
+    '5.0': ("Other or undefined protocol status", None),
+    '5.1': ("Invalid command", 'Protocol error'),
+    '5.2': ("Syntax error", 'Protocol error'),
+    '5.3': ("Too many recipients", 'Protocol error'),
+    '5.4': ("Invalid command arguments", 'Protocol error'),
+    '5.5': ("Wrong protocol version", 'Protocol error'),
+    '6.0': ("Other or undefined media error", None),
+    '6.1': ("Media not supported", 'Message format'),
+    '6.2': ("Conversion required and prohibited", 'Message format'),
+    '6.3': ("Conversion required but not supported", 'Message format'),
+    '6.5': ("Conversion failed", 'Message format'),
+    '6.7': ("Non-ASCII addresses not permitted", 'Message format'),
+    '7.0': ("Other or undefined security status", None),
+    '7.1': ("Delivery not authorized, message refused", None),
+    '7.2': ("Mailing list expansion prohibited", 'Policy'),
+    '7.4': ("Security features not supported", 'Connection / TLS'),
+    '7.7': ("Message integrity failure", 'Content rejected'),
+    '7.8': ("Authentication credentials invalid", 'SMTP auth failed'),
+    '7.9': ("Authentication mechanism is too weak", None),
+    '7.10': ("Encryption needed", 'Connection / TLS'),
+    '7.13': ("User account disabled", 'Mailbox disabled'),
+    '7.17': ("Mailbox owner has changed", 'Invalid recipient'),
+    '7.18': ("Domain owner has changed", 'Domain / routing'),
+    '7.20': ("No passing DKIM signature found", 'Authentication failed (SPF/DKIM/DMARC)'),
+    '7.21': ("No acceptable DKIM signature found", 'Authentication failed (SPF/DKIM/DMARC)'),
+    '7.22': ("No valid author-matched DKIM signature found", 'Authentication failed (SPF/DKIM/DMARC)'),
+    '7.23': ("SPF validation failed", 'Authentication failed (SPF/DKIM/DMARC)'),
+    '7.24': ("SPF validation error", 'Authentication failed (SPF/DKIM/DMARC)'),
+    '7.25': ("Reverse DNS validation failed", 'Reverse DNS'),
+    '7.26': ("Multiple authentication checks failed", 'Authentication failed (SPF/DKIM/DMARC)'),
+    '7.27': ("Sender address has null MX", 'Sender rejected'),
+    '7.28': ("Mail flood detected", 'Rate limited'),
+    '7.30': ("REQUIRETLS support required", 'Connection / TLS')
+}
+
+ENHANCED_STATUS_PATTERN = re.compile(r"(?<![\d.])([245])\.(\d{1,3}\.\d{1,3})(?!\.?\d)")
+SMTP_REPLY_PATTERN = re.compile(r"(?<![\w.:=/-])([245]\d\d)(?=[ -]|$)")
+BOUNCE_RECIPIENT_PATTERN = re.compile(r"(?:to=<|\*\* |== |RCPT TO:<|for <)([^<>\s,;:]+@[^<>\s,;:]+)", re.I)
+EMAIL_ADDRESS_PATTERN = re.compile(r"[\w.%+-]+@[\w-]+(?:\.[\w-]+)+")
+
+def compile_bounce_rules(rules):
+    """
+    One alternation over every rule, so a bounce is scanned once however long the table grows.
+    The shared word-boundary anchor lets the engine skip mid-word positions without trying each rule.
+    """
+    return re.compile(r"\b(?:" + '|'.join(f"(?P<r{i}>{rule['pattern']})" for i, rule in enumerate(rules)) + ")")
+
+BOUNCE_PATTERN = compile_bounce_rules(BOUNCE_RULES)
+
+def classify_bounce(text):
+    """
+    Classify a bounce locally from its status codes and the curated rule table.
+    Returns a dict; 'category' is None when nothing matched and 'ambiguous' is True
+    when rules disagree and the enhanced status code cannot break the tie, or when
+    a specific status code points at a different category than the matched rule.
+    """
+    result = {'smtp_code': None, 'status': None, 'permanent': None, 'code_meaning': None,
+              'category': None, 'cause': None, 'fix': None, 'tools': [], 'rule': None,
+              'ambiguous': False, 'candidates': []}
+    
+    # Postfix logs lead with a generic dsn=5.0.0 - prefer the first specific status code
+    statuses = list(ENHANCED_STATUS_PATTERN.finditer(text))
+    status = next((match for match in statuses if match.group(2) != '0.0'), statuses[0] if statuses else None)
+    reply = SMTP_REPLY_PATTERN.search(text)
+    code_category = None
+    if status:
+        result['status'] = f"{status.group(1)}.{status.group(2)}"
+        result['code_meaning'], code_category = ENHANCED_STATUS_CODES.get(status.group(2), (None, None))
+    if reply:
+        result['smtp_code'] = reply.group(1)
+    code_class = status.group(1) if status else reply.group(1)[0] if reply else None
+    if code_class in ('4', '5'):
+        result['permanent'] = code_class == '5'
+    
+    matched = []
+    for match in BOUNCE_PATTERN.finditer(text.lower()):
+        rule = BOUNCE_RULES[int(match.lastgroup[1:])]
+        if rule not in matched:
+            matched.append(rule)
+    matched.sort(key=BOUNCE_RULES.index)
+    matched = [rule for rule in matched if not rule.get('weak')] or matched
+    categories = list(dict.fromkeys(rule['category'] for rule in matched))
+    result['candidates'] = categories
+    # x.7.y codes (RFC 3463/7372) name the failed check; providers reuse the others loosely (Microsoft's 5.4.1, 5.1.10)
+    specific_code = code_category if status and status.group(2).startswith('7.') else None
+    
+    if matched:
+        rule = matched[0]
+        agreeing = [r for r in matched if r['category'] == code_category]
+        if agreeing:
+            rule = agreeing[0]
+        elif len(categories) > 1 or specific_code:
+            # Rules disagree, or a specific security status code contradicts the only rule that matched
+            result['ambiguous'] = True
+            if specific_code:
+                result['candidates'] = categories + [code_category]
+        result['rule'] = rule['id']
+        result['category'] = rule['category']
+        result['cause'] = rule['cause']
+    elif code_category:
+        result['rule'] = 'status-code'
+        result['category'] = code_category
+        result['cause'] = result['code_meaning']
+    
+    if result['category']:
+        guidance = BOUNCE_CATEGORIES[result['category']]
+        result['fix'] = guidance['fix']
+        result['tools'] = guidance['tools']
+    return result
+
+def bounce_recipient(line):
+    """Recipient of a mail log line (Exim, Postfix or pasted NDR), falling back to the first address"""
+    match = BOUNCE_RECIPIENT_PATTERN.search(line) or EMAIL_ADDRESS_PATTERN.search(line)
+    if not match:
+        return None
+    return (match.group(1) if match.re is BOUNCE_RECIPIENT_PATTERN else match.group(0)).lower()
+
+def bounce_reason(line):
+    """
+    The part of a log line that explains the failure - from the first status code on - with
+    addresses and IPs masked, so the same rejection logged for different recipients compares equal
+    """
+    code = SMTP_REPLY_PATTERN.search(line) or ENHANCED_STATUS_PATTERN.search(line)
+    reason = line[code.start():] if code else line
+    return IPV4_PATTERN.sub('<ip>', EMAIL_ADDRESS_PATTERN.sub('<address>', reason))
+
+def classify_bounce_log(text, max_lines=None):
+    """
+    Classify every failed delivery in a mail log in one pass.
+    Lines without a failure status code or a rule match are skipped, as are 2.x.x successes.
+    """
+    max_lines = max_lines or CONFIG['bounce_log_max_lines']
+    rows = []
+    classified = {}  # a log repeats a handful of rejections - classify each distinct one once
+    for number, line in enumerate(text.splitlines()[:max_lines], start=1):
+        line = line.strip()
+        if not line:
+            continue
+        reason = bounce_reason(line)
+        result = classified.get(reason)
+        if result is None:
+            result = classified[reason] = classify_bounce(reason)
+        if result['permanent'] is None and not result['category']:
+            continue
+        if (result['status'] or result['smtp_code'] or '').startswith('2'):
+            continue
+        recipient = bounce_recipient(line)
+        rows.append({
+            'line': number,
+            'recipient': recipient,
+            'domain': recipient.split('@')[-1] if recipient else None,
+            'smtp_code': result['smtp_code'],
+            'status': result['status'],
+            'type': 'Permanent' if result['permanent'] else 'Temporary' if result['permanent'] is False else None,
+            'category': result['category'] if not result['ambiguous'] else None,
+            'rule': result['rule'],
+            'text': line
+        })
+    return rows
+
+# ============================================================================
+# ERROR CODE TABLE
+# ============================================================================
+ERROR_CODE_STOPWORDS = frozenset({
+    'error', 'the', 'an', 'is', 'on', 'for', 'to', 'of', 'and', 'in', 'this', 'that', 'your', 'you', 'has',
+    'been', 'was', 'with', 'code', 'status', 'at', 'it', 'be', 'or', 'not', 'are', 'by', 'from', 'my', 'we', 'get', 'got',
+    'have', 'there', 'if', 'please', 'can', 'can\'t', 'isn\'t', 'shows', 'showing', 'when', 'our', 'their', 'contact'
+})
+ERROR_CODE_PATTERN = re.compile(r"[A-Z0-9_]+(?:::[A-Z0-9_]+)?")
+
+def error_code_tokens(text):
+    """Lower-cased words of an error message, minus stopwords and single characters"""
+    return [word for word in re.findall(r"[a-z0-9_']+", text.lower()) if len(word) > 1 and word not in ERROR_CODE_STOPWORDS]
+
+@st.cache_resource
+def get_error_code_table():
+    """
+    Load the bundled error code table and index it by code, alias and word.
+    Word weights are inverse document frequencies, so 'collation' counts for more than 'server'.
+    """
+    table = {'entries': [], 'codes': {}, 'phrases': [], 'words': {}, 'idf': {}}
+    try:
+        with open(CONFIG['error_codes_path'], encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return table
+    systems = data.get('systems', {})
+    for number, entry in enumerate(data.get('entries', [])):
+        table['entries'].append(entry)
+        for code in [entry.get('code')] + entry.get('aliases', []):
+            if not code:
+                continue
+            if ' ' in code:
+                table['phrases'].append((code.upper(), number))
+            else:
+                table['codes'].setdefault(code.upper(), []).append(number)
+        text = ' '.join([entry['system'], entry['title'], entry['meaning'], *entry['keywords'], *systems.get(entry['system'], [])])
+        for word in set(error_code_tokens(text)):
+            table['words'].setdefault(word, []).append(number)
+    count = len(table['entries'])
+    table['idf'] = {word: float(np.log(1 + count / len(numbers))) for word, numbers in table['words'].items()}
+    return table
+
+ERROR_CODE_TABLE = get_error_code_table()
+
+def lookup_error_code(query, limit=3):
+    """
+    Find table entries for an error code or message, best first, as (entry, score, match) tuples.
+    Code and alias hits score 1 plus their word overlap, which also picks between systems that
+    share a code (HTTP 500 vs SMTP 500); text-only matches score their IDF-weighted word overlap.
+    SMTP enhanced status codes (5.1.1) are answered from the bounce classifier's tables.
+    """
+    table = ERROR_CODE_TABLE
+    upper = query.upper()
+    exact = set()
+    for token in ERROR_CODE_PATTERN.findall(upper):
+        exact.update(table['codes'].get(token, ()))
+    for phrase, number in table['phrases']:
+        if phrase in upper:
+            exact.add(number)
+    
+    words = set(error_code_tokens(query))
+    rarest = max(table['idf'].values(), default=1.0)
+    weights = {}
+    for word in words:
+        if word not in table['idf'] and word.isalpha() and len(word) > 3:
+            # tolerate typos ('forbiden', 'colation') by borrowing the closest known word
+            close = difflib.get_close_matches(word, table['idf'].keys(), n=1, cutoff=0.85)
+            if close:
+                weights[close[0]] = table['idf'][close[0]]
+                continue
+        # words the table has never seen weigh as much as its rarest word
+        weights[word] = table['idf'].get(word, rarest)
+    total = sum(weights.values()) or 1.0
+    overlap = {}
+    for word, weight in weights.items():
+        for number in table['words'].get(word, ()):
+            overlap[number] = overlap.get(number, 0.0) + weight
+    
+    ranked = sorted(
+        exact | set(overlap),
+        key=lambda number: (-(number in exact) - overlap.get(number, 0.0) / total, number)
+    )
+    results = [
+        (table['entries'][number], (number in exact) + overlap.get(number, 0.0) / total, 'code' if number in exact else 'text')
+        for number in ranked[:limit]
+    ]
+    
+    status = ENHANCED_STATUS_PATTERN.search(query)
+    if status and status.group(2) in ENHANCED_STATUS_CODES:
+        meaning, category = ENHANCED_STATUS_CODES[status.group(2)]
+        guidance = BOUNCE_CATEGORIES.get(category, {})
+        entry = {
+            'system': 'SMTP', 'code': status.group(0), 'title': meaning,
+            'meaning': f"{'Success' if status.group(1) == '2' else 'Temporary failure' if status.group(1) == '4' else 'Permanent failure'}: {meaning.lower()}."
+                       + (f" Category: {category}." if category else " The bounce text explains the specific reason."),
+            'causes': [], 'fix': [guidance['fix']] if guidance else [], 'keywords': [], 'tools': guidance.get('tools', []), 'aliases': []
+        }
+        results.insert(0, (entry, 2.0, 'code'))
+    return results[:limit]
+
+def show_error_code_entry(entry):
+    """Render a table entry the way the AI explanation is laid out"""
+    st.markdown(f"### 📘 {entry['system']} {entry['code'] or ''} - {entry['title']}")
+    st.markdown(f"**What It Means:** {entry['meaning']}")
+    if entry['causes']:
+        st.markdown("**Common Causes:**\n" + "\n".join(f"- {cause}" for cause in entry['causes']))
+    if entry['fix']:
+        st.markdown("**How to Fix:**\n" + "\n".join(f"{step_number}. {step}" for step_number, step in enumerate(entry['fix'], start=1)))
+    if entry['tools']:
+        st.markdown(f"**Related Tools:** {', '.join(entry['tools'])}")
+
+# ============================================================================
+# SYMPTOM DIAGNOSTICS
+# ============================================================================
+SYMPTOM_CHECKS = {
+    'dns': "DNS records",
+    'http': "HTTP status & redirects",
+    'ssl': "SSL certificate",
+    'mx': "MX connectivity",
+    'mail_auth': "SPF & DMARC"
+}
+
+# Checks pre-selected for each Symptom Checker service type
+SYMPTOM_SERVICE_CHECKS = {
+    'Website': ['dns', 'http', 'ssl'],
+    'Email': ['dns', 'mx', 'mail_auth'],
+    'Domain': ['dns', 'http', 'mx'],
+    'Database': ['dns'],
+    'FTP': ['dns'],
+    'SSL': ['dns', 'ssl', 'http'],
+    'DNS': ['dns', 'mx'],
+    'Other': list(SYMPTOM_CHECKS)
+}
+
+def check_http_chain(domain, timeout=None):
+    """Follow redirects from http://domain; returns (success, {'chain': [(status, url)], 'seconds'}) or (False, error)"""
+    start = time.perf_counter()
+    success, response = safe_request(f"http://{domain}", timeout=timeout or CONFIG['request_timeout'])
+    if not success:
+        return False, response
+    chain = [(r.status_code, r.url) for r in response.history] + [(response.status_code, response.url)]
+    return True, {'chain': chain, 'seconds': time.perf_counter() - start}
+
+def check_mx_connectivity(domain, timeout=None, limit=2):
+    """Connect to the highest-priority MX hosts on port 25; returns (success, [{'host', 'reachable', 'detail'}]) or (False, error)"""
+    status, values = resolve_cached(domain, 'MX')
+    if status != 'OK':
+        return False, f"MX lookup returned {status}"
+    records = sorted((int(value.split()[0]), value.split()[1].rstrip('.')) for value in values if len(value.split()) == 2)
+    hosts = [host for _, host in records if host][:limit]
+    if not hosts:
+        return False, "Null MX - the domain does not accept mail"
+    results = []
+    for host in hosts:
+        try:
+            with socket.create_connection((host, 25), timeout=timeout or 5) as sock:
+                banner = sock.recv(512).decode('utf-8', errors='replace').strip()
+            results.append({'host': host, 'reachable': True, 'detail': banner.splitlines()[0][:100] if banner else "no banner"})
+        except Exception as e:
+            results.append({'host': host, 'reachable': False, 'detail': str(e) or type(e).__name__})
+    return True, results
+
+def run_symptom_checks(domain, checks, deadline=None):
+    """Run the selected live checks in parallel under one deadline.
+
+    Returns {task: result}; a task that missed the deadline maps to None.
+    """
+    deadline = deadline or CONFIG['symptom_check_deadline']
+    tasks = {}
+    if 'dns' in checks:
+        for record_type in ('A', 'AAAA', 'NS', 'MX'):
+            tasks[f"dns:{record_type}"] = (lambda rt=record_type: resolve_cached(domain, rt))
+        tasks['dns:www'] = lambda: resolve_cached(f"www.{domain}", 'A')
+    if 'http' in checks:
+        tasks['http'] = lambda: check_http_chain(domain, timeout=deadline)
+    if 'ssl' in checks:
+        tasks['ssl'] = lambda: fetch_ssl_certificate(domain, timeout=deadline)
+    if 'mx' in checks:
+        tasks['mx'] = lambda: check_mx_connectivity(domain, timeout=deadline / 2)
+    if 'mail_auth' in checks:
+        tasks['spf'] = lambda: get_spf_record(domain)
+        tasks['dmarc'] = lambda: resolve_cached(f"_dmarc.{domain}", 'TXT')
+    if not tasks:
+        return {}
+
+    pool = ThreadPoolExecutor(max_workers=len(tasks))
+    futures = {pool.submit(fn): name for name, fn in tasks.items()}
+    done, _ = wait(futures, timeout=deadline)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    results = {name: None for name in tasks}
+    for future in done:
+        try:
+            results[futures[future]] = future.result()
+        except Exception as e:
+            results[futures[future]] = e
+    return results
+
+def summarize_symptom_checks(domain, results):
+    """Turn run_symptom_checks output into (check, status icon, finding) rows for the table and the prompt"""
+    rows = []
+    for name, result in results.items():
+        label = {'dns:www': f"DNS A www.{domain}", 'http': "HTTP", 'ssl': "SSL", 'mx': "MX port 25", 'spf': "SPF", 'dmarc': "DMARC"}.get(name, f"DNS {name[4:]}")
+        if result is None:
+            rows.append((label, '⏱️', "No answer before the deadline"))
+            continue
+        if isinstance(result, Exception):
+            rows.append((label, '❌', f"Check failed: {result}"))
+            continue
+        
+        if name.startswith('dns:'):
+            status, values = result
+            if status == 'OK':
+                rows.append((label, '✅', ', '.join(values)))
+            elif status == 'NXDOMAIN':
+                rows.append((label, '⚠️' if name == 'dns:www' else '❌', "Name does not exist (NXDOMAIN)"))
+            elif status == 'NODATA':
+                icon = '✅' if name == 'dns:AAAA' else '⚠️' if name in ('dns:MX', 'dns:www') else '❌'
+                rows.append((label, icon, "No records"))
+            else:
+                rows.append((label, '❌', status))
+        
+        elif name == 'http':
+            success, data = result
+            if not success:
+                rows.append((label, '❌', data))
+                continue
+            final_status, final_url = data['chain'][-1]
+            chain = ' → '.join(f"{status} {url}" for status, url in data['chain'])
+            icon = '❌' if final_status >= 400 else '⚠️' if final_url.startswith('http://') else '✅'
+            note = " (no redirect to HTTPS)" if final_url.startswith('http://') else ""
+            rows.append((label, icon, f"{chain} in {data['seconds']:.1f}s{note}"))
+        
+        elif name == 'ssl':
+            success, cert = result
+            if not success:
+                rows.append((label, '❌', cert))
+                continue
+            icon = '⚠️' if cert['days_left'] < 14 else '✅'
+            rows.append((label, icon, f"Valid for {domain}, issued by {cert['issuer']}, expires {cert['expires']:%Y-%m-%d} ({cert['days_left']} days left)"))
+        
+        elif name == 'mx':
+            success, hosts = result
+            if not success:
+                rows.append((label, '❌', hosts))
+                continue
+            reachable = sum(host['reachable'] for host in hosts)
+            icon = '✅' if reachable == len(hosts) else '⚠️' if reachable else '❌'
+            detail = '; '.join(f"{host['host']} {'reachable' if host['reachable'] else 'unreachable'} ({host['detail']})" for host in hosts)
+            if not reachable:
+                detail += " - outbound port 25 may also be blocked from this machine"
+            rows.append((label, icon, detail))
+        
+        elif name == 'spf':
+            status, record = result
+            icon = '✅' if status == 'OK' else '❌' if status == 'permerror' else '⚠️'
+            rows.append((label, icon, record))
+        
+        elif name == 'dmarc':
+            status, values = result
+            records = [value for value in values if value.lower().startswith('v=dmarc1')] if status == 'OK' else []
+            if records:
+                rows.append((label, '✅', records[0]))
+            elif status.startswith('ERROR'):
+                rows.append((label, '❌', status))
+            else:
+                rows.append((label, '⚠️', f"No DMARC record at _dmarc.{domain}"))
+    return rows
+
+def search_kb(query):
+    """Search knowledge base for relevant articles"""
+    query = query.lower()
+    results = []
+   
+    for category, articles in HOSTAFRICA_KB.items():
+        for article in articles:
+            # Check if query matches title or keywords
+            if query in article['title'].lower():
+                results.append({**article, 'category': category, 'relevance': 2})
+            elif any(query in keyword for keyword in article['keywords']):
+                results.append({**article, 'category': category, 'relevance': 1})
+   
+    # Sort by relevance
+    results.sort(key=lambda x: x['relevance'], reverse=True)
+    return results[:10]
+    
+# Knowledge Base Articles Database
+HOSTAFRICA_KB = {
+    'email': [
+        {
+            'title': 'DirectAdmin and cPanel Email',
+            'url': 'https://help.hostafrica.com/category/control-panel-and-emails',
+            'keywords': ['email', 'setup', 'imap', 'smtp', 'outlook', 'thunderbird', 'mail', 'configure', 'client']
+        },
+        {
+            'title': 'HMail and Workspace',
+            'url': 'https://help.hostafrica.com/category/professional-email-and-workspace',
+            'keywords': ['Hmail', 'Professional Mail', 'email', 'setup', 'imap', 'smtp', 'outlook', 'thunderbird', 'mail', 'configure', 'client']
+        }
+    ],
+    'domain': [
+        {
+            'title': 'How to Point Your Domain to HostAfrica',
+            'url': 'https://help.hostafrica.com/category/domains',
+            'keywords': ['domain', 'nameservers', 'dns', 'pointing', 'ns1', 'ns2', 'setup']
+        },
+        {
+            'title': 'Understanding DNS Records (A, CNAME, MX, TXT)',
+            'url': 'https://help.hostafrica.com/category/dns-and-nameservers',
+            'keywords': ['dns', 'records', 'a record', 'cname', 'mx', 'txt', 'zone', 'propagation']
+        },
+        {
+            'title': 'Domain Transfer Guide',
+            'url': 'https://help.hostafrica.com/category/domains',
+            'keywords': ['domain', 'transfer', 'epp', 'auth code', 'registrar', 'migrate']
+        }
+    ],
+    'cpanel': [
+        {
+            'title': 'cPanel Getting Started Guide',
+            'url': 'https://help.hostafrica.com/category/control-panel-and-emails/cpanel',
+            'keywords': ['cpanel', 'getting started', 'basics', 'login', 'dashboard', 'control panel']
+        },
+        {
+            'title': 'DirectAdmin Getting Started Guide',
+            'url': 'https://help.hostafrica.com/category/control-panel-and-emails/directadmin',
+            'keywords': ['DirectAdmin', 'getting started', 'basics', 'login', 'dashboard']
+        }
+    ],
+    'ssl': [
+        {
+            'title': 'SSL Certificate',
+            'url': 'https://help.hostafrica.com/category/ssl-certificates',
+            'keywords': ['ssl', 'https', 'certificate', 'secure']
+        }
+    ],
+    'wordpress': [
+        {
+            'title': 'WordPress',
+            'url': 'https://help.hostafrica.com/category/wordpress',
+            'keywords': ['wordpress', 'install', 'softaculous', 'one click', 'wp', 'setup']
+        },
+        {
+            'title': 'Softaculous',
+            'url': 'https://help.hostafrica.com/category/softaculous',
+            'keywords': ['softaculous', 'one click']
+        }
+    ]
+} 
+
+# ============================================================================
+# SINGLE-PAGE NAVIGATION RENDERER
+# ============================================================================
+def _sanitize_key(s: str) -> str:
+    """Return a safe key fragment for Streamlit widget keys"""
+    return re.sub(r'\W+', '_', s).strip('_')
+
+def render_all_categories_and_tools():
+    """Render a single page with all categories and their tools (grid of buttons)"""
+    
+    # HEADER
+    # ---------------------------------------------------
+    st.markdown("""
+        <style>
+        .centered-header {
+            text-align: center;
+            margin: 1rem 0 2rem 0;
+            padding: 0 1rem;
+        }
+        
+        .centered-header h1 {
+            font-size: 2rem;
+            font-weight: 700;
+            color: #0F1724;
+            margin-bottom: 0.5rem;
+            letter-spacing: -0.02em;
+        }
+        
+        .centered-header h3 {
+            font-size: 1.1rem;
+            font-weight: 400;
+            color: #586069;
+            margin-bottom: 1rem;
+            margin-top: 0;
+        }
+        
+        .centered-header .tools-badge {
+            display: inline-block;
+            background: linear-gradient(90deg, #0078D4 0%, #2B88D8 100%);
+            color: white;
+            padding: 0.6rem 1.5rem;
+            border-radius: 8px;
+            font-size: 0.95rem;
+            font-weight: 700;
+            box-shadow: 0 4px 12px rgba(0, 120, 212, 0.2);
+            margin-bottom: 1.5rem;
+            transition: transform 180ms ease, box-shadow 180ms ease;
+        }
+        
+        .centered-header .tools-badge:hover {
+            transform: translateY(-2px);
+            box-shadow: 0 6px 16px rgba(0, 120, 212, 0.25);
+        }
+        
+        .centered-header hr {
+            margin: 1.5rem auto;
+            max-width: 80%;
+            border: none;
+            border-top: 1px solid rgba(0, 0, 0, 0.08);
+        }
+        </style>
+        
+        <div class="centered-header">
+            <h1>🏠 Welcome to Support Buddy</h1>
+            <h3>Your Complete Technical Support Toolkit.</h3>
+            <div class="tools-badge">📊 44 tools available</div>
+            <hr>
+        </div>
+    """, unsafe_allow_html=True)
+
+    for category_name, category_info in TOOL_CATEGORIES.items():
+        icon = category_info.get('icon', '')
+        description = category_info.get('description', '')
+        color = category_info.get('color', None)
+
+        # Category header
+        st.markdown(f"## {icon} {category_name}")
+        if description:
+            st.caption(description)
+
+        tools = category_info.get('tools', [])
+        num_cols = 4
+
+        # Render tools in rows of num_cols
+        for row_start in range(0, len(tools), num_cols):
+            cols = st.columns(num_cols)
+            for i in range(num_cols):
+                tool_idx = row_start + i
+                if tool_idx < len(tools):
+                    tool = tools[tool_idx]
+                    safe_cat = _sanitize_key(category_name)
+                    # Unique key per category + index
+                    btn_key = f"btn_{safe_cat}_{tool_idx}"
+                    with cols[i]:
+                        if st.button(tool, key=btn_key, use_container_width=True):
+                            st.session_state.selected_tool = tool
+                            st.rerun()
+
+        st.markdown("---")
+
+# Background watchlist checks start with the first page render once there is a watchlist, not at import
+if os.path.exists(watchlist_db_path()):
+    get_watchlist_scheduler()
+
+# ============================================================================
+# MAIN APP ROUTING (SINGLE-STATE: selected_tool only)
+# ============================================================================
+if st.session_state.selected_tool is None:
+    # Show all categories with their tools on a single page
+    render_all_categories_and_tools()
+
+else:
+    # Show the selected tool (existing implementations reused)
+    tool = st.session_state.selected_tool
+
+    # Back button
+    if st.button("← Back to All Tools", key="back_to_all_tools"):
+        st.session_state.selected_tool = None
+        st.rerun()
+
+# ============================================================================
+# MAIN CONTENT - TOOL IMPLEMENTATIONS (unchanged, uses 'tool' variable)
+# ============================================================================
+
+    if tool == "🔐 PIN Checker":
+        st.title("🔐 PIN Checker")
+        st.markdown("Verify customer PINs for secure account access and verification.")
+        
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            st.info("Check the provided customer PIN against the WHMCS records.")
+        with col2:
+            st.link_button("Open Tool", "https://my.hostafrica.com/admin/admin_tool/client-pin", use_container_width=True)
+
+    elif tool == "🔓 IP Unban":
         st.title("🔓 IP Unban")
         st.markdown("Search for and remove IP addresses from server firewalls.")
         
@@ -1071,63 +5192,260 @@ else:
             st.error("⚠️ AI features require Gemini API key configuration")
             st.info("Contact your administrator to enable AI features")
         else:
-            uploaded_file = st.file_uploader("Upload Screenshot:", type=['png', 'jpg', 'jpeg'])
-            ticket_text = st.text_area("Or paste ticket text:", height=200, placeholder="Customer is experiencing...")
+            mode = st.radio("Mode:", ["🎫 Single Ticket", "📦 Batch (CSV/JSONL Export)"], horizontal=True)
             
-            if st.button("🔍 Analyze Ticket", type="primary"):
-                if uploaded_file or ticket_text:
-                    with st.spinner("🤖 Analyzing ticket..."):
-                        try:
-                            model = genai.GenerativeModel('gemini-2.5-flash-lite')
-                            prompt = """Analyze this support ticket and provide:
+            if mode == "📦 Batch (CSV/JSONL Export)":
+                st.info("💡 Upload a ticket export (e.g. from WHMCS). Progress is checkpointed - re-running the same export resumes where it stopped")
+                export = st.file_uploader("Ticket Export:", type=['csv', 'jsonl', 'json'])
+                
+                tickets_df = None
+                if export:
+                    try:
+                        tickets_df = load_ticket_export(export)
+                    except Exception as e:
+                        st.error(f"❌ Could not read the export: {str(e)}")
+                
+                if tickets_df is not None:
+                    columns = [str(c) for c in tickets_df.columns]
+                    tickets_df.columns = columns
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        id_column = st.selectbox("Ticket ID column:", columns, index=next(
+                            (i for i, c in enumerate(columns) if c.lower() in ('tid', 'ticket_id', 'ticketid', 'id')), 0
+                        ))
+                    with col2:
+                        text_columns = st.multiselect("Text column(s):", columns, default=[
+                            c for c in columns if c.lower() in ('subject', 'title', 'message', 'body', 'description')
+                        ])
+                    workers = st.slider("Parallel analyses:", 1, 16, CONFIG['ticket_batch_workers'])
+                    st.caption(f"📄 {len(tickets_df)} ticket(s) in the export" + (
+                        f" - the first {CONFIG['ticket_batch_max_rows']} will be analyzed" if len(tickets_df) > CONFIG['ticket_batch_max_rows'] else ""
+                    ))
+                    
+                    if st.button("📦 Run Batch Analysis", type="primary"):
+                        if not text_columns:
+                            st.warning("⚠️ Please select at least one text column")
+                        else:
+                            frame = tickets_df.head(CONFIG['ticket_batch_max_rows'])
+                            tickets = {}
+                            for ticket_id, *values in frame[[id_column] + text_columns].itertuples(index=False):
+                                text = "\n\n".join(str(v) for v in values if str(v).strip() and str(v) != 'nan')
+                                if text and str(ticket_id) not in tickets:
+                                    tickets[str(ticket_id)] = text
+                            tickets = list(tickets.items())
+                            checkpoint = ticket_batch_checkpoint(tickets)
+                            resumed = len(load_ticket_checkpoint(checkpoint))
                             
-1. **Issue Summary**: Brief description of the problem
-2. **Category**: Type of issue (Email, Domain, Website, etc.)
-3. **Severity**: Low/Medium/High/Critical
-4. **Key Information**: Important details found
-5. **Missing Information**: What else do we need?
-6. **Troubleshooting Steps**: Specific steps to diagnose
-7. **Recommended Tools**: Which Support Buddy tools to use
-8. **Estimated Time**: How long this might take to resolve
-9. **Potential Solutions**: Likely fixes
-
-Be specific and actionable."""
+                            progress = st.progress(0.0)
+                            status = st.empty()
+                            live_table = st.empty()
+                            last_render = [0.0]
+                            
+                            def update_progress(rows, done, total):
+                                progress.progress(done / total if total else 1.0)
+                                status.text(f"Analyzed {done}/{total} tickets...")
+                                if rows and (done == total or time.monotonic() - last_render[0] > 0.5):
+                                    last_render[0] = time.monotonic()
+                                    live_table.dataframe(
+                                        pd.DataFrame(rows)[['ticket', 'category', 'severity', 'recommended_tool', 'error']],
+                                        use_container_width=True, hide_index=True
+                                    )
+                            
+                            start = time.perf_counter()
+                            rows = run_ticket_batch(tickets, checkpoint, get_gemini_client(), workers, update_progress)
+                            elapsed = time.perf_counter() - start
+                            progress.empty()
+                            status.empty()
+                            live_table.empty()
                             
+                            texts = dict(tickets)
+                            TICKET_INDEX.add_many([(texts[row['ticket']], row['analysis']) for row in rows if row['analysis']])
+                            
+                            if not rows:
+                                st.warning("⚠️ No tickets with text found in the selected columns")
+                            else:
+                                df = pd.DataFrame(rows)
+                                df['severity'] = df['severity'].str.title()
+                                errors = df['error'].notna()
+                                
+                                c1, c2, c3, c4 = st.columns(4)
+                                with c1:
+                                    st.metric("Tickets", len(tickets))
+                                with c2:
+                                    st.metric("Analyzed", int((~errors).sum()))
+                                with c3:
+                                    st.metric("From Checkpoint", resumed)
+                                with c4:
+                                    st.metric("Failed", int(errors.sum()))
+                                
+                                if errors.any():
+                                    st.warning(f"⚠️ {int(errors.sum())} ticket(s) failed after retries - run the batch again to retry only those")
+                                
+                                tab1, tab2 = st.tabs(["📊 Aggregates", "📋 Results"])
+                                with tab1:
+                                    ok = df[~errors]
+                                    col1, col2 = st.columns(2)
+                                    with col1:
+                                        st.markdown("**Tickets by Category**")
+                                        st.bar_chart(ok['category'].fillna('Unknown').value_counts())
+                                    with col2:
+                                        st.markdown("**Recommended Tools**")
+                                        st.dataframe(
+                                            ok['recommended_tool'].fillna('Unknown').value_counts().rename_axis('Tool').reset_index(name='Tickets'),
+                                            use_container_width=True, hide_index=True
+                                        )
+                                    st.markdown("**Category × Severity**")
+                                    st.dataframe(
+                                        pd.crosstab(ok['category'].fillna('Unknown'), ok['severity'].fillna('Unknown'), margins=True, margins_name='Total'),
+                                        use_container_width=True
+                                    )
+                                with tab2:
+                                    st.dataframe(df[['ticket', 'category', 'severity', 'recommended_tool', 'error']], use_container_width=True, hide_index=True)
+                                
+                                st.caption(f"⏱️ {len(tickets) - resumed} ticket(s) analyzed in {elapsed:.1f}s ({int(df['cached'].sum())} answered from cache)")
+                                st.download_button("📥 Download Results (CSV)", df.drop(columns=['cached']).to_csv(index=False), "ticket_analysis.csv", "text/csv")
+            
+            else:
+                uploaded_file = st.file_uploader("Upload Screenshot:", type=['png', 'jpg', 'jpeg', 'webp'])
+                ticket_text = st.text_area("Or paste ticket text:", height=200, placeholder="Customer is experiencing...")
+                
+                similar = []
+                near = None
+                prep = None
+                answer_with = "🆕 Fresh analysis"
+                if uploaded_file:
+                    try:
+                        image_part, prep = prepare_screenshot(uploaded_file.getvalue())
+                        near = AI_CACHE.similar_screenshot(
+                            ai_cache_key([TICKET_ANALYSIS_PROMPT, image_part], get_gemini_client().model_name),
+                            screenshot_text_key([TICKET_ANALYSIS_PROMPT]), prep['signature'], CONFIG['screenshot_match_cells']
+                        )
+                    except Exception as e:
+                        st.error(f"❌ Could not read the screenshot: {str(e)}")
+                    if near:
+                        st.markdown("### 🖼️ Near-Identical Past Screenshot")
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.image(prep['thumbnail'], caption="This upload")
+                        with col2:
+                            st.image(near['thumbnail'], caption=f"Analyzed before - {near['cells']} of {prep['signature'].size} cells differ")
+                        with st.expander("Stored analysis"):
+                            st.markdown(near['text'])
+                        answer_with = st.radio("Answer with:", [
+                            "♻️ Reuse the analysis of the similar screenshot (no AI call)",
+                            "🆕 Fresh analysis"
+                        ])
+                elif ticket_text.strip():
+                    lookup_start = time.perf_counter()
+                    similar = TICKET_INDEX.query(ticket_text)
+                    lookup_ms = (time.perf_counter() - lookup_start) * 1000
+                    if similar:
+                        st.markdown(f"### 🔁 Similar Past Tickets ({len(similar)})")
+                        for match in similar:
+                            with st.expander(f"{match['similarity']:.0%} similar - {' '.join(match['text'].split())[:90]}"):
+                                st.markdown("**Ticket:**")
+                                st.text(match['text'][:2000])
+                                st.markdown("**Analysis:**")
+                                st.markdown(match['analysis'])
+                        answer_with = st.radio("Answer with:", [
+                            "♻️ Reuse the closest analysis (no AI call)",
+                            "🧠 Fresh analysis with the closest ticket as an example",
+                            "🆕 Fresh analysis"
+                        ])
+                    st.caption(f"🔎 Similar-ticket search over {len(TICKET_INDEX)} past ticket(s) in {lookup_ms:.0f} ms")
+                regenerate = st.checkbox("♻️ Regenerate (skip cached answer)")
+                
+                if st.button("🔍 Analyze Ticket", type="primary"):
+                    if uploaded_file and prep is None:
+                        st.warning("⚠️ Please upload a readable screenshot")
+                    elif uploaded_file or ticket_text:
+                        started = time.perf_counter()
+                        try:
                             if uploaded_file:
-                                image = Image.open(uploaded_file)
-                                response = model.generate_content([prompt, image])
+                                parts = [TICKET_ANALYSIS_PROMPT, image_part]
+                                saved = prep['original_bytes'] - prep['prepared_bytes']
+                                st.caption(
+                                    f"🗜️ Screenshot {format_bytes(prep['original_bytes'])} → {format_bytes(prep['prepared_bytes'])} {prep['format']}"
+                                    f" ({max(saved, 0) / prep['original_bytes']:.0%} smaller), "
+                                    f"{prep['original_size'][0]}×{prep['original_size'][1]} → {prep['prepared_size'][0]}×{prep['prepared_size'][1]}"
+                                    f"{', empty borders cropped' if prep['cropped'] else ''}"
+                                )
+                                if near and answer_with.startswith("♻️"):
+                                    parts = None
+                            elif similar and answer_with.startswith("♻️"):
+                                parts = None
+                            elif similar and answer_with.startswith("🧠"):
+                                parts = few_shot_ticket_prompt(ticket_text, similar[0])
                             else:
-                                response = model.generate_content(f"{prompt}\n\nTicket Content:\n{ticket_text}")
+                                parts = f"{TICKET_ANALYSIS_PROMPT}\n\nTicket Content:\n{ticket_text}"
                             
                             st.markdown("### 🤖 AI Analysis:")
-                            st.markdown(response.text)
+                            if parts is None and near:
+                                st.markdown(near['text'])
+                                st.caption(f"♻️ Reused the analysis of a near-identical screenshot ({near['cells']} cells differ) - no AI call")
+                            elif parts is None:
+                                st.markdown(similar[0]['analysis'])
+                                st.caption(f"♻️ Reused the analysis of a {similar[0]['similarity']:.0%} similar past ticket - no AI call")
+                            else:
+                                meta = {}
+                                analysis = st.write_stream(stream_cached(
+                                    parts, meta, regenerate=regenerate, on_wait=ai_wait_notice(), screenshot=prep if uploaded_file else None
+                                ))
+                                show_ai_response_meta(meta)
+                                if not uploaded_file and analysis:
+                                    TICKET_INDEX.add(ticket_text, analysis)
+                            st.caption(f"⏱️ End-to-end {time.perf_counter() - started:.2f}s")
                             
                         except Exception as e:
                             st.error(f"❌ Analysis failed: {str(e)}")
-                else:
-                    st.warning("⚠️ Please provide either a screenshot or ticket text")
+                    else:
+                        st.warning("⚠️ Please provide either a screenshot or ticket text")
  
     elif tool == "🩺 Smart Symptom Checker":
         st.title("🩺 Smart Symptom Checker")
         st.markdown("Diagnose issues based on symptoms")
         
+        symptom = st.text_area("Describe the issue:", height=150, placeholder="Website showing 500 error...")
+        domain_input = st.text_input("Customer Domain (optional):", placeholder="example.com - runs live checks before diagnosing")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            service = st.selectbox("Service Type:", ["Website", "Email", "Domain", "Database", "FTP", "SSL", "DNS", "Other"])
+        with col2:
+            when = st.selectbox("When started:", ["Just now", "Today", "Yesterday", "This week", "Over a week ago", "Unknown"])
+        checks = []
+        if domain_input.strip():
+            checks = st.multiselect(
+                "Live Checks:", list(SYMPTOM_CHECKS), default=SYMPTOM_SERVICE_CHECKS[service], format_func=SYMPTOM_CHECKS.get
+            )
+        regenerate = st.checkbox("♻️ Regenerate (skip cached answer)", disabled=not GEMINI_AVAILABLE)
         if not GEMINI_AVAILABLE:
-            st.error("⚠️ AI features require Gemini API key configuration")
-            st.info("Contact your administrator to enable AI features")
-        else:
-            symptom = st.text_area("Describe the issue:", height=150, placeholder="Website showing 500 error...")
-            
-            col1, col2 = st.columns(2)
-            with col1:
-                service = st.selectbox("Service Type:", ["Website", "Email", "Domain", "Database", "FTP", "SSL", "DNS", "Other"])
-            with col2:
-                when = st.selectbox("When started:", ["Just now", "Today", "Yesterday", "This week", "Over a week ago", "Unknown"])
-            
-            if st.button("🩺 Diagnose Issue", type="primary"):
-                if symptom:
-                    with st.spinner("🤖 Diagnosing..."):
+            st.caption("ℹ️ AI is not configured - only the live checks will run")
+        
+        if st.button("🩺 Diagnose Issue", type="primary"):
+            if symptom or domain_input.strip():
+                findings = []
+                valid, domain = validate_domain(domain_input) if domain_input.strip() else (True, None)
+                if not valid:
+                    st.error(f"❌ {domain}")
+                else:
+                    if domain and checks:
+                        start = time.perf_counter()
+                        with st.spinner(f"Running live checks on {domain}..."):
+                            results = run_symptom_checks(domain, checks)
+                        elapsed = time.perf_counter() - start
+                        findings = summarize_symptom_checks(domain, results)
+                        
+                        st.markdown(f"### 🔬 Live Diagnostics for {domain}")
+                        st.dataframe(pd.DataFrame(findings, columns=['Check', 'Status', 'Finding']), use_container_width=True, hide_index=True)
+                        st.caption(f"⏱️ {len(results)} checks in {elapsed:.1f}s (deadline {CONFIG['symptom_check_deadline']}s)")
+                    
+                    if not symptom:
+                        st.info("💡 Describe the issue to get a diagnosis based on these results")
+                    elif not GEMINI_AVAILABLE:
+                        st.warning("⚠️ AI diagnosis requires Gemini API key configuration")
+                    else:
                         try:
-                            model = genai.GenerativeModel('gemini-2.5-flash-lite')
                             prompt = f"""Diagnose this technical support issue:
 
 **Symptoms**: {symptom}
@@ -1145,16 +5463,21 @@ Provide a comprehensive diagnosis with:
 7. **Expected Resolution Time**
 
 Be specific, technical, and actionable."""
-                            
-                            response = model.generate_content(prompt)
-                            
+                            if findings:
+                                prompt += f"\n\n**Live Diagnostics for {domain}** (just run against the real domain):\n" + "\n".join(
+                                    f"- {check} [{'OK' if icon == '✅' else 'WARNING' if icon == '⚠️' else 'TIMED OUT' if icon == '⏱️' else 'FAILED'}]: {finding}"
+                                    for check, icon, finding in findings
+                                ) + "\n\nGround the diagnosis in these results: say which findings explain the symptoms, rank causes they rule out lower, and do not ask for checks that already ran."
+                        
                             st.markdown("### 🩺 Diagnosis Results:")
-                            st.markdown(response.text)
-                            
+                            meta = {}
+                            st.write_stream(stream_cached(prompt, meta, regenerate=regenerate, on_wait=ai_wait_notice()))
+                            show_ai_response_meta(meta)
+                        
                         except Exception as e:
                             st.error(f"❌ Diagnosis failed: {str(e)}")
-                else:
-                    st.warning("⚠️ Please describe the symptoms")
+            else:
+                st.warning("⚠️ Please describe the symptoms")
 
     # AI TOOLS
     elif tool == "💬 AI Support Chat":
@@ -1165,8 +5488,18 @@ Be specific, technical, and actionable."""
             st.error("⚠️ AI features require Gemini API key configuration")
             st.info("Contact your administrator to enable AI features")
         else:
+            if 'chat_memory' not in st.session_state:
+                st.session_state.chat_memory = new_chat_memory()
+            memory = st.session_state.chat_memory
+            
+            if memory['archived']:
+                st.caption(f"🗄️ {memory['archived']} earlier message(s) archived to disk - still covered by the conversation summary")
+            if memory['summary']:
+                with st.expander("🧠 Conversation Summary"):
+                    st.markdown(memory['summary'])
+            
             # Display chat history
-            for msg in st.session_state.chat_history:
+            for msg in memory['turns']:
                 if msg['role'] == 'user':
                     st.markdown(f'<div class="info-box">👤 **You:** {msg["content"]}</div>', unsafe_allow_html=True)
                 else:
@@ -1177,15 +5510,21 @@ Be specific, technical, and actionable."""
             
             col1, col2 = st.columns([1, 4])
             with col1:
-                if st.button("💬 Send", type="primary"):
-                    if user_input:
-                        st.session_state.chat_history.append({'role': 'user', 'content': user_input})
-                        
-                        with st.spinner("🤖 Thinking..."):
-                            try:
-                                model = genai.GenerativeModel('gemini-2.5-flash-lite')
-                                
-                                context = """You are a technical support assistant for a web hosting company. 
+                send = st.button("💬 Send", type="primary")
+            with col2:
+                if st.button("🗑️ Clear Chat"):
+                    st.session_state.chat_memory = clear_chat_memory(memory)
+                    st.rerun()
+            
+            if memory['turns']:
+                st.download_button("📥 Download Transcript", chat_transcript(memory), "chat_transcript.txt", "text/plain")
+            
+            if send and user_input:
+                chat_add_turn(memory, 'user', user_input)
+                st.markdown(f'<div class="info-box">👤 **You:** {user_input}</div>', unsafe_allow_html=True)
+                
+                try:
+                    context = """You are a technical support assistant for a web hosting company. 
                                 Provide clear, helpful, step-by-step answers about:
                                 - cPanel and web hosting
                                 - DNS configuration and troubleshooting
@@ -1197,39 +5536,71 @@ Be specific, technical, and actionable."""
                                 - FTP access
                                 
                                 Always be specific, provide commands when relevant, and explain technical terms."""
-                                
-                                conversation = context + "\n\n" + "\n".join([
-                                    f"{'User' if m['role'] == 'user' else 'Assistant'}: {m['content']}" 
-                                    for m in st.session_state.chat_history[-10:]
-                                ])
-                                
-                                response = model.generate_content(conversation)
-                                st.session_state.chat_history.append({'role': 'assistant', 'content': response.text})
-                                st.rerun()
-                                
-                            except Exception as e:
-                                st.error(f"❌ Error: {str(e)}")
-            
-            with col2:
-                if st.button("🗑️ Clear Chat"):
-                    st.session_state.chat_history = []
-                    st.rerun()
+                    
+                    conversation = build_chat_prompt(memory, context)
+                    
+                    st.markdown("🤖 **Assistant:**")
+                    on_wait = ai_wait_notice()
+                    reply = st.write_stream(get_gemini_client().stream(conversation, on_wait))
+                    chat_add_turn(memory, 'assistant', reply)
+                except Exception as e:
+                    # Drop the unanswered question so the next prompt doesn't carry two user turns in a row
+                    if memory['turns'] and memory['turns'][-1]['role'] == 'user':
+                        memory['turns'].pop()
+                    st.error(f"❌ Error: {str(e)}")
+                else:
+                    try:
+                        compact_chat_memory(memory)
+                    except Exception as e:
+                        st.warning(f"⚠️ Could not update the conversation summary: {str(e)}")
+                    else:
+                        st.rerun()
 
     elif tool == "📧 AI Mail Error Assistant":
         st.title("📧 AI Mail Error Assistant")
         st.markdown("Analyze email error messages and get solutions")
         
-        if not GEMINI_AVAILABLE:
-            st.error("⚠️ AI features require Gemini API key configuration")
-            st.info("Contact your administrator to enable AI features")
-        else:
+        mode = st.radio("Mode:", ["✉️ Single Error", "📜 Mail Log (many bounces)"], horizontal=True)
+        
+        if mode == "✉️ Single Error":
             error_msg = st.text_area("Email Error Message:", height=200, placeholder="550 5.1.1 User unknown...")
+            ask_ai = st.checkbox("🤖 Always ask AI (skip the local classifier)", disabled=not GEMINI_AVAILABLE)
+            regenerate = st.checkbox("♻️ Regenerate (skip cached answer)", disabled=not GEMINI_AVAILABLE)
             
             if st.button("🔍 Analyze Error", type="primary"):
                 if error_msg:
-                    with st.spinner("🤖 Analyzing error..."):
+                    start = time.perf_counter()
+                    bounce = classify_bounce(error_msg)
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    
+                    if bounce['category'] and not bounce['ambiguous'] and not ask_ai:
+                        st.success(f"⚡ Recognized locally in {elapsed_ms:.1f} ms - no AI call needed")
+                        
+                        c1, c2, c3, c4 = st.columns(4)
+                        c1.metric("SMTP Code", bounce['smtp_code'] or "-")
+                        c2.metric("Status Code", bounce['status'] or "-")
+                        c3.metric("Type", "Permanent" if bounce['permanent'] else "Temporary" if bounce['permanent'] is False else "-")
+                        c4.metric("Matched", bounce['rule'])
+                        
+                        st.markdown(f"### 📌 {bounce['category']}")
+                        st.markdown(f"**Cause:** {bounce['cause']}")
+                        if bounce['code_meaning']:
+                            st.caption(f"ℹ️ {bounce['status']}: {bounce['code_meaning']}")
+                        if bounce['permanent'] is False:
+                            st.info("⏳ Temporary failure - the sending server keeps retrying on its own until the message expires")
+                        st.markdown(f"**Fix:** {bounce['fix']}")
+                        if bounce['tools']:
+                            st.markdown(f"**Related Tools:** {', '.join(bounce['tools'])}")
+                    elif not GEMINI_AVAILABLE:
+                        if bounce['status']:
+                            st.info(f"ℹ️ {bounce['status']}: {bounce['code_meaning'] or 'Unknown status code'}")
+                        st.warning("⚠️ No local rule recognized this error, and AI analysis requires Gemini API key configuration")
+                    else:
+                        if bounce['ambiguous']:
+                            st.info(f"🤔 This error matches several causes ({', '.join(bounce['candidates'])}) - asking AI to decide")
+                        elif not ask_ai:
+                            st.info("🤖 No local rule recognized this error - asking AI")
                         try:
-                            model = genai.GenerativeModel('gemini-2.5-flash-lite')
                             prompt = f"""Analyze this email error message:
 
 {error_msg}
@@ -1244,33 +5615,126 @@ Provide:
 6. **Related Tools**: Which Support Buddy tools can help diagnose/fix this
 
 Be specific about server settings, DNS records, and authentication methods."""
-                            
-                            response = model.generate_content(prompt)
+                            notes = []
+                            if bounce['status']:
+                                notes.append(f"Enhanced status code {bounce['status']}: {bounce['code_meaning'] or 'not a standard code'}")
+                            if bounce['candidates']:
+                                notes.append(f"Possible causes from our bounce rules: {', '.join(bounce['candidates'])}")
+                            if notes:
+                                prompt += "\n\nNotes from our local bounce classifier:\n" + "\n".join(f"- {note}" for note in notes)
                             
                             st.markdown("### 🤖 Error Analysis:")
-                            st.markdown(response.text)
+                            meta = {}
+                            st.write_stream(stream_cached(prompt, meta, regenerate=regenerate, on_wait=ai_wait_notice()))
+                            show_ai_response_meta(meta)
                             
                         except Exception as e:
                             st.error(f"❌ Analysis failed: {str(e)}")
                 else:
                     st.warning("⚠️ Please paste an error message")
+        
+        else:
+            st.info("Paste or upload an Exim/Postfix mail log or a list of bounce messages - every failed delivery is classified locally in one pass")
+            log_file = st.file_uploader("Mail Log:", type=['log', 'txt'])
+            log_text = st.text_area("Or paste log lines:", height=200, placeholder="... ** user@example.com R=dnslookup T=remote_smtp: SMTP error from remote mail server after RCPT TO:<user@example.com>: 550 5.1.1 User unknown")
+            ask_ai = st.checkbox(
+                f"🤖 Ask AI about unclassified bounces (up to {CONFIG['bounce_ai_samples']} distinct errors in one request)",
+                disabled=not GEMINI_AVAILABLE
+            )
+            
+            if st.button("🔍 Classify Log", type="primary"):
+                text = log_file.getvalue().decode('utf-8', errors='replace') if log_file else log_text
+                if text.strip():
+                    start = time.perf_counter()
+                    rows = classify_bounce_log(text)
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                    
+                    if not rows:
+                        st.warning("⚠️ No failed deliveries found in the log")
+                    else:
+                        df = pd.DataFrame(rows)
+                        df['category'] = df['category'].fillna('Unclassified')
+                        unclassified = df[df['category'] == 'Unclassified']
+                        
+                        c1, c2, c3, c4 = st.columns(4)
+                        c1.metric("Bounces", len(df))
+                        c2.metric("Permanent", int((df['type'] == 'Permanent').sum()))
+                        c3.metric("Temporary", int((df['type'] == 'Temporary').sum()))
+                        c4.metric("Unclassified", len(unclassified))
+                        st.caption(f"⏱️ Classified {text.count(chr(10)) + 1} log lines in {elapsed_ms:.0f} ms - no AI calls")
+                        
+                        tab1, tab2 = st.tabs(["📊 Summary", "📋 Bounces"])
+                        with tab1:
+                            summary = df.groupby('category').agg(
+                                bounces=('line', 'size'), recipients=('recipient', 'nunique'), example=('text', 'first')
+                            ).sort_values('bounces', ascending=False).reset_index()
+                            summary['fix'] = summary['category'].map(lambda category: BOUNCE_CATEGORIES.get(category, {}).get('fix', ''))
+                            st.dataframe(summary, use_container_width=True, hide_index=True)
+                            st.markdown("**Top Recipient Domains:**")
+                            st.bar_chart(df['domain'].fillna('unknown').value_counts().head(15))
+                        with tab2:
+                            st.dataframe(
+                                df[['line', 'recipient', 'smtp_code', 'status', 'type', 'category', 'rule']],
+                                use_container_width=True, hide_index=True
+                            )
+                        st.download_button("📥 Download Bounces (CSV)", df.to_csv(index=False), "bounces.csv", "text/csv")
+                        
+                        if ask_ai and len(unclassified):
+                            samples = list(dict.fromkeys(bounce_reason(line) for line in unclassified['text']))[:CONFIG['bounce_ai_samples']]
+                            prompt = (
+                                "These mail log lines are bounces our rule table could not classify. "
+                                "For each distinct error, give the likely cause and the fix in one or two lines, "
+                                "and say which Support Buddy tool helps diagnose it.\n\n" + "\n".join(samples)
+                            )
+                            try:
+                                st.markdown("### 🤖 AI Analysis of Unclassified Bounces:")
+                                meta = {}
+                                st.write_stream(stream_cached(prompt, meta, on_wait=ai_wait_notice()))
+                                show_ai_response_meta(meta)
+                            except Exception as e:
+                                st.error(f"❌ Analysis failed: {str(e)}")
+                else:
+                    st.warning("⚠️ Please paste or upload a mail log")
 
     elif tool == "❓ Error Code Explainer":
         st.title("❓ Error Code Explainer")
         st.markdown("Get detailed explanations for error codes")
         
+        error_code = st.text_input("Error Code:", placeholder="500 Internal Server Error")
+        context = st.text_area("Context (optional):", height=100, placeholder="User was uploading a file...")
+        ask_ai = st.checkbox("🤖 Always ask AI (skip the offline error table)", disabled=not GEMINI_AVAILABLE)
+        regenerate = st.checkbox("♻️ Regenerate (skip cached answer)", disabled=not GEMINI_AVAILABLE)
         if not GEMINI_AVAILABLE:
-            st.error("⚠️ AI features require Gemini API key configuration")
-            st.info("Contact your administrator to enable AI features")
-        else:
-            error_code = st.text_input("Error Code:", placeholder="500 Internal Server Error")
-            context = st.text_area("Context (optional):", height=100, placeholder="User was uploading a file...")
-            
-            if st.button("🔍 Explain Error", type="primary"):
-                if error_code:
-                    with st.spinner("🤖 Looking up error..."):
+            st.caption("ℹ️ AI is not configured - explanations come from the offline table of HTTP, SMTP, FTP, MySQL, cPanel and LiteSpeed errors")
+        
+        if st.button("🔍 Explain Error", type="primary"):
+            if error_code:
+                start = time.perf_counter()
+                matches = lookup_error_code(error_code)
+                elapsed_us = (time.perf_counter() - start) * 1e6
+                known = [match for match in matches if match[1] >= CONFIG['error_code_match_threshold']]
+                
+                if known and not ask_ai:
+                    entry, score, how = known[0]
+                    st.success(
+                        f"⚡ Found in the offline error table in {elapsed_us:.0f} µs"
+                        + (" (closest text match)" if how == 'text' else "") + " - no AI call needed"
+                    )
+                    show_error_code_entry(entry)
+                    for other, score, how in known[1:]:
+                        with st.expander(f"Also matches: {other['system']} {other['code'] or ''} - {other['title']}"):
+                            show_error_code_entry(other)
+                
+                if ask_ai or context.strip() or not known:
+                    if not GEMINI_AVAILABLE:
+                        if not known:
+                            st.warning("⚠️ This error is not in the offline table, and AI explanations require Gemini API key configuration")
+                            if matches:
+                                st.markdown("**Closest entries:** " + ", ".join(f"{entry['system']} {entry['code'] or ''} - {entry['title']}" for entry, score, how in matches))
+                        else:
+                            st.info("💡 The context was not used - tailoring the explanation to it requires Gemini API key configuration")
+                    else:
                         try:
-                            model = genai.GenerativeModel('gemini-2.5-flash-lite')
                             prompt = f"""Explain this error code: {error_code}
 {f"Context: {context}" if context else ""}
 
@@ -1284,16 +5748,23 @@ Provide:
 6. **Related Errors**: Similar issues that might be confused with this
 
 Be specific about web hosting environments, cPanel, and common server configurations."""
+                            if known:
+                                entry = known[0][0]
+                                prompt += (
+                                    f"\n\nOur error table says ({entry['system']} {entry['code'] or ''} - {entry['title']}): {entry['meaning']}"
+                                    f" Causes: {'; '.join(entry['causes']) or 'n/a'}. Fixes: {'; '.join(entry['fix']) or 'n/a'}."
+                                    " Focus on what the context changes."
+                                )
                             
-                            response = model.generate_content(prompt)
-                            
-                            st.markdown("### 🤖 Error Explanation:")
-                            st.markdown(response.text)
+                            st.markdown("### 🤖 Explanation for Your Context:" if known and context.strip() else "### 🤖 Error Explanation:")
+                            meta = {}
+                            st.write_stream(stream_cached(prompt, meta, regenerate=regenerate, on_wait=ai_wait_notice()))
+                            show_ai_response_meta(meta)
                             
                         except Exception as e:
                             st.error(f"❌ Lookup failed: {str(e)}")
-                else:
-                    st.warning("⚠️ Please enter an error code")
+            else:
+                st.warning("⚠️ Please enter an error code")
 
     # DOMAIN & DNS TOOLS
     elif tool == "🔍 Domain Status Check":
@@ -1344,106 +5815,136 @@ Be specific about web hosting environments, cPanel, and common server configurat
                             else:
                                 st.warning(f"⚠️ {mx_records}")
                             
-                            # WHOIS Information - handles both .ng and other TLDs
+                            # Registration data - RDAP first, then WHOIS, then the .ng scraper
                             st.markdown("### 📋 WHOIS Information")
-                            
-                            # Check if it's a .ng domain
-                            if domain.endswith('.ng'):
-                                # Use the .ng specific WHOIS
-                                html = query_ng_whois(domain)
-                                sections = parse_ng_whois_simplified(html)
-                                
-                                if sections:
-                                    info_col1, info_col2 = st.columns(2)
-                                    
-                                    with info_col1:
-                                        # Get registrar from Registrar Information
-                                        if 'Registrar Information' in sections:
-                                            reg_info = sections['Registrar Information']
-                                            if 'Registrar' in reg_info:
-                                                st.info(f"**Registrar:** {reg_info['Registrar']}")
-                                        
-                                        # Get created date from Domain Information
-                                        if 'Domain Information' in sections:
-                                            dom_info = sections['Domain Information']
-                                            if 'Registered On' in dom_info:
-                                                st.info(f"**Created:** {dom_info['Registered On']}")
-                                    
-                                    with info_col2:
-                                        # Get expiration from Domain Information
-                                        if 'Domain Information' in sections:
-                                            dom_info = sections['Domain Information']
-                                            if 'Expires On' in dom_info:
-                                                st.info(f"**Expires:** {dom_info['Expires On']}")
-                                            if 'Status' in dom_info:
-                                                st.info(f"**Status:** {dom_info['Status']}")
-                                else:
-                                    st.warning("⚠️ Could not retrieve .ng WHOIS data")
-                            
+                            success, whois_data = lookup_registration(domain)
+                            if success:
+                                info_col1, info_col2 = st.columns(2)
+                                with info_col1:
+                                    if whois_data.get('registrar'):
+                                        st.info(f"**Registrar:** {whois_data['registrar']}")
+                                    if whois_data.get('creation_date'):
+                                        st.info(f"**Created:** {whois_data['creation_date']:%Y-%m-%d}")
+                                with info_col2:
+                                    if whois_data.get('expiration_date'):
+                                        st.info(f"**Expires:** {whois_data['expiration_date']:%Y-%m-%d}")
+                                    if whois_data['status']:
+                                        st.info(f"**Status:** {', '.join(whois_data['status'])}")
+                                st.caption(f"Source: {whois_data['source']}")
                             else:
-                                # Use standard WHOIS for other TLDs
-                                if WHOIS_AVAILABLE:
-                                    success, whois_data = lookup_whois(domain)
-                                    if success:
-                                        try:
-                                            info_col1, info_col2 = st.columns(2)
-                                            with info_col1:
-                                                if hasattr(whois_data, 'registrar'):
-                                                    st.info(f"**Registrar:** {whois_data.registrar}")
-                                                if hasattr(whois_data, 'creation_date'):
-                                                    st.info(f"**Created:** {whois_data.creation_date}")
-                                            with info_col2:
-                                                if hasattr(whois_data, 'expiration_date'):
-                                                    st.info(f"**Expires:** {whois_data.expiration_date}")
-                                                if hasattr(whois_data, 'status'):
-                                                    st.info(f"**Status:** {whois_data.status}")
-                                        except Exception as e:
-                                            st.warning(f"Could not parse all WHOIS data")
-                                    else:
-                                        st.warning(f"⚠️ {whois_data}")
-                                else:
-                                    st.warning("⚠️ WHOIS library not available")
+                                st.warning(f"⚠️ {whois_data}")
 
     elif tool == "🔎 DNS Analyzer":
         st.title("🔎 DNS Analyzer")
         st.markdown("Comprehensive DNS record analysis")
         
-        domain = st.text_input("Domain:", placeholder="example.com")
+        mode = st.radio("Mode:", ["📊 Record Lookup", "🔭 Subdomain Discovery"], horizontal=True)
         
-        record_types = st.multiselect(
-            "Record Types:",
-            ['A', 'AAAA', 'MX', 'NS', 'TXT', 'CNAME', 'SOA'],
-            default=['A', 'MX', 'NS']
-        )
+        if mode == "📊 Record Lookup":
+            domain = st.text_input("Domain:", placeholder="example.com")
         
-        if st.button("🔍 Analyze DNS", type="primary"):
-            if not domain:
-                st.warning("⚠️ Please enter a domain name")
-            else:
-                valid, result = validate_domain(domain)
-                if not valid:
-                    st.error(f"❌ {result}")
+            record_types = st.multiselect(
+                "Record Types:",
+                ['A', 'AAAA', 'MX', 'NS', 'TXT', 'CNAME', 'SOA'],
+                default=['A', 'MX', 'NS']
+            )
+        
+            if st.button("🔍 Analyze DNS", type="primary"):
+                if not domain:
+                    st.warning("⚠️ Please enter a domain name")
                 else:
-                    domain = result
+                    valid, result = validate_domain(domain)
+                    if not valid:
+                        st.error(f"❌ {result}")
+                    else:
+                        domain = result
                     
-                    if not DNS_AVAILABLE:
-                        show_missing_dependency("DNS Analysis", "dnspython")
+                        if not DNS_AVAILABLE:
+                            show_missing_dependency("DNS Analysis", "dnspython")
+                        else:
+                            with st.spinner(f"Analyzing DNS for {domain}..."):
+                                results = {}
+                            
+                                for record_type in record_types:
+                                    success, records = lookup_dns_record(domain, record_type)
+                                    results[record_type] = {'success': success, 'data': records}
+                            
+                                for record_type, result in results.items():
+                                    st.markdown(f"### 📊 {record_type} Records")
+                                    if result['success']:
+                                        for record in result['data']:
+                                            st.success(f"✅ {record}")
+                                    else:
+                                        st.error(f"❌ {result['data']}")
+                                    st.markdown("---")
+
+        else:
+            st.info("💡 Finds the customer's other hostnames before a nameserver switch")
+            domain = st.text_input("Domain:", placeholder="example.com", key="discovery_domain")
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                use_builtin = st.checkbox(f"Use built-in wordlist ({len(SUBDOMAIN_WORDLIST)} labels)", value=True)
+                wordlist_file = st.file_uploader("Or upload a wordlist (one label per line):", type=['txt', 'lst', 'csv'])
+            with col2:
+                workers = st.slider("Concurrent lookups:", 1, 200, CONFIG['discovery_workers'])
+                rate = st.slider("Rate cap (queries/second):", 10, 1000, CONFIG['discovery_rate_limit'])
+            
+            if st.button("🔭 Discover Subdomains", type="primary"):
+                if not domain:
+                    st.warning("⚠️ Please enter a domain name")
+                else:
+                    valid, result = validate_domain(domain)
+                    labels = list(SUBDOMAIN_WORDLIST) if use_builtin else []
+                    if wordlist_file:
+                        text = wordlist_file.getvalue().decode('utf-8', errors='ignore')
+                        labels += [l.split(',')[0].strip() for l in text.splitlines() if l.strip() and not l.startswith('#')]
+                    
+                    if not valid:
+                        st.error(f"❌ {result}")
+                    elif not labels:
+                        st.warning("⚠️ Please use the built-in wordlist or upload one")
+                    elif not DNS_AVAILABLE:
+                        show_missing_dependency("Subdomain Discovery", "dnspython")
                     else:
-                        with st.spinner(f"Analyzing DNS for {domain}..."):
-                            results = {}
+                        domain = result.lower()
+                        progress = st.progress(0.0, text=f"Resolving {len(labels)} labels...")
+                        start = time.perf_counter()
+                        
+                        def update_progress(done, total):
+                            if done % 25 == 0 or done == total:
+                                progress.progress(done / total, text=f"Resolved {done}/{total}")
+                        
+                        hosts, wildcard, skipped = discover_subdomains(
+                            domain, labels, max_workers=workers, rate=rate, progress_cb=update_progress
+                        )
+                        elapsed = time.perf_counter() - start
+                        
+                        if skipped:
+                            st.warning(f"⚠️ Skipped {len(skipped)} invalid label(s): {', '.join(skipped[:10])}{' ...' if len(skipped) > 10 else ''}")
+                        
+                        if wildcard:
+                            st.warning(f"⚠️ Wildcard DNS detected (*.{domain} → {', '.join(sorted(wildcard))}) - matching results were filtered out")
+                        
+                        if not hosts:
+                            st.info(f"ℹ️ No subdomains found in {elapsed:.1f}s")
+                        else:
+                            st.success(f"✅ Found {len(hosts)} hostname(s) from {len(labels)} labels in {elapsed:.1f}s")
+                            rows = hosts_to_zone_records(hosts, domain)
+                            df = pd.DataFrame(rows)
+                            st.dataframe(df, use_container_width=True, hide_index=True)
                             
-                            for record_type in record_types:
-                                success, records = lookup_dns_record(domain, record_type)
-                                results[record_type] = {'success': success, 'data': records}
+                            zone_text = f"$ORIGIN {domain}.\n" + '\n'.join(
+                                f"{r['Name']}\t{r['TTL']}\tIN\t{r['Type']}\t{r['Value']}" for r in rows
+                            )
+                            with st.expander("📄 Zone File Snippet"):
+                                st.code(zone_text, language=None)
                             
-                            for record_type, result in results.items():
-                                st.markdown(f"### 📊 {record_type} Records")
-                                if result['success']:
-                                    for record in result['data']:
-                                        st.success(f"✅ {record}")
-                                else:
-                                    st.error(f"❌ {result['data']}")
-                                st.markdown("---")
+                            col_a, col_b = st.columns(2)
+                            with col_a:
+                                st.download_button("📥 Download CSV", df.to_csv(index=False), f"{domain}_subdomains.csv", "text/csv", use_container_width=True)
+                            with col_b:
+                                st.download_button("📥 Download Zone Snippet", zone_text, f"{domain}_subdomains.zone", "text/plain", use_container_width=True)
 
     elif tool == "📋 NS Authority Checker":
         st.title("📋 NS Authority Checker")
@@ -1511,100 +6012,421 @@ Be specific about web hosting environments, cPanel, and common server configurat
         st.title("🌍 WHOIS & Health Check")
         st.markdown("Detailed registration analysis with status-aware reporting.")
         
-        domain_input = st.text_input("Enter domain name:", placeholder="hostafrica.co.za or .ng", key="whois_main_input")
+        mode = st.radio("Mode:", ["🔍 Single Domain", "📋 Bulk Lookup"], horizontal=True)
+        
+        if mode == "📋 Bulk Lookup":
+            st.info("💡 Paste hostnames, URLs or emails - they are collapsed to registrable domains before any WHOIS/RDAP query")
+            bulk_input = st.text_area("Hostnames (one per line):", height=200, placeholder="mail.shop.example.co.za\nwww.example.com\nhttps://blog.example.com.ng/post")
+            
+            if st.button("📋 Run Bulk Lookup", type="primary"):
+                entries, rejected, _ = normalize_entries(re.split(r'[\s,;]+', bulk_input))
+                hostnames = entries['host'].dropna().tolist()
+                if not rejected.empty:
+                    st.warning(f"⚠️ Ignored {len(rejected)} invalid entr{'y' if len(rejected) == 1 else 'ies'}: {', '.join(rejected['input'].head(10))}")
+                if not hostnames:
+                    st.warning("⚠️ Please enter at least one hostname")
+                else:
+                    progress = st.progress(0.0)
+                    status = st.empty()
+                    
+                    def update_progress(done, total):
+                        progress.progress(done / total)
+                        status.text(f"Looked up {done}/{total} registrable domains...")
+                    
+                    start = time.perf_counter()
+                    results, groups, unmatched = lookup_registrations(hostnames, progress_cb=update_progress)
+                    elapsed = time.perf_counter() - start
+                    progress.empty()
+                    status.empty()
+                    
+                    c1, c2, c3 = st.columns(3)
+                    with c1:
+                        st.metric("Hostnames", len(set(hostnames)))
+                    with c2:
+                        st.metric("Registrable Domains", len(groups))
+                    with c3:
+                        st.metric("Lookups Saved", max(len(set(hostnames)) - len(groups) - len(unmatched), 0))
+                    
+                    if unmatched:
+                        st.warning(f"⚠️ Skipped {len(unmatched)} public suffix or IP entries: {', '.join(unmatched[:10])}")
+                    
+                    now = datetime.now(timezone.utc)
+                    rows = []
+                    for domain, hosts in groups.items():
+                        success, record = results[domain]
+                        exp = record.get('expiration_date') if success else None
+                        rows.append({
+                            'Domain': domain,
+                            'Hostnames': len(hosts),
+                            'Registrar': record.get('registrar') if success else None,
+                            'Expires': f"{exp:%Y-%m-%d}" if exp else None,
+                            'Days Left': (exp - now).days if exp else None,
+                            'Status': ', '.join(record['status']) if success else None,
+                            'Source': record['source'] if success else f"❌ {record}"
+                        })
+                    if rows:
+                        df = pd.DataFrame(rows).sort_values('Days Left', na_position='last')
+                        st.dataframe(df, use_container_width=True, hide_index=True)
+                        expiring = df[df['Days Left'] < 30]
+                        if not expiring.empty:
+                            st.warning(f"⚠️ {len(expiring)} domain(s) expire within 30 days")
+                        st.download_button("📥 Download Results (CSV)", df.to_csv(index=False), "registration_lookup.csv", "text/csv")
+                    st.caption(f"⏱️ {len(groups)} lookup(s) in {elapsed:.2f}s")
+        
+        else:
+            domain_input = st.text_input("Enter domain name:", placeholder="hostafrica.co.za or .ng", key="whois_main_input")
+        
+            if st.button("🔍 Run Analysis", type="primary"):
+                if domain_input:
+                    domain = domain_input.strip().lower().replace('https://', '').replace('http://', '').split('/')[0]
+                    registrable = registrable_domain(domain)
+                    if registrable and registrable != domain:
+                        st.info(f"ℹ️ {domain} is a hostname - showing registration data for {registrable}")
+                        domain = registrable
+                
+                    with st.spinner(f"Analyzing {domain}..."):
+                        dnssec_status = get_dnssec_info(domain)
+                        ns_list = get_live_ns(domain)
+                    
+                        try:
+                            success, w = lookup_registration(domain)
+                            if not success:
+                                raise ValueError(w)
+                        
+                            # Consolidate status to string for logic check
+                            status_joined = " ".join(w['status']).lower()
+                        
+                            # Registry dates are timezone-aware, so compare against aware now
+                            now = datetime.now(timezone.utc)
+                            exp = w.get('expiration_date')
+                            is_expired = bool(exp and exp < now)
+                        
+                            # Status-Aware Alerting Logic
+                            error_keywords = ["hold", "suspended", "expired", "redemption", "pendingdelete", "raa"]
+                            if any(x in status_joined for x in error_keywords) or is_expired:
+                                st.error(f"❌ Domain Alert: {status_joined.upper() if status_joined else 'EXPIRED'}")
+                            elif "ok" in status_joined or "active" in status_joined:
+                                st.success("✅ Domain Status: OK / ACTIVE")
+                            else:
+                                st.info(f"ℹ️ Current Status: {status_joined.upper() or 'UNKNOWN'}")
+                        
+                            # Display registration details
+                            st.markdown("### 📋 WHOIS Information")
+                            col1, col2 = st.columns(2)
+                            with col1:
+                                st.markdown("**Registration Details:**")
+                                st.write(f"**Domain:** {w['domain']}")
+                                st.write(f"**Registrar:** {w.get('registrar') or 'N/A'}")
+                                if w.get('creation_date'):
+                                    st.write(f"**Created:** {w['creation_date']:%Y-%m-%d}")
+                                if w['status']:
+                                    st.write(f"**Status:** {', '.join(w['status'])}")
+                        
+                            with col2:
+                                st.markdown("**Important Dates:**")
+                                if exp:
+                                    st.write(f"**Expires:** {exp:%Y-%m-%d}")
+                                
+                                    # Quick Health Check
+                                    days_left = (exp - now).days
+                                    if days_left < 30:
+                                        st.warning(f"⚠️ Expires in {days_left} days!")
+                                    else:
+                                        st.success(f"✅ {days_left} days remaining")
+                                if w.get('updated_date'):
+                                    st.write(f"**Updated:** {w['updated_date']:%Y-%m-%d}")
+                                if w['name_servers']:
+                                    st.write(f"**Registry Nameservers:** {', '.join(w['name_servers'])}")
+                        
+                            st.caption(f"Source: {w['source']} ({' → '.join(w['servers'])})")
+                            with st.expander("📄 View Full Registration Output", expanded=False):
+                                st.code(w['raw'], language='json' if w['source'] == 'RDAP' else None)
+                        
+                            st.markdown("---")
+                            c1, c2 = st.columns(2)
+                            with c1:
+                                st.info(f"🛡️ {dnssec_status}")
+                            with c2:
+                                st.write("**Live Nameservers:**")
+                                if ns_list:
+                                    for ns in ns_list:
+                                        st.write(f"- `{ns}`")
+                                else:
+                                    st.warning("No nameservers found.")
+                        
+                        except Exception as e:
+                            st.error(f"❌ Analysis failed: {str(e)}")
+                            st.info(f"**Try manual lookup:**\n- https://who.is/whois/{domain}\n- https://lookup.icann.org/en/lookup?name={domain}")
+                else:
+                    st.warning("⚠️ Please enter a domain name.")
+
+    elif tool == "🧭 DNS Trace":
+        st.title("🧭 DNS Trace")
+        st.markdown("Follow resolution from the root servers down to the answer (like `dig +trace`)")
+        st.info("💡 One domain per line - bulk traces reuse cached root and TLD referrals")
+        
+        trace_input = st.text_area("Domains:", placeholder="example.com\nwww.example.co.za", height=120)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            trace_type = st.selectbox("Record Type:", ['A', 'AAAA', 'MX', 'NS', 'TXT', 'CNAME', 'SOA'])
+        with col2:
+            use_cache = st.checkbox("Use cached root/TLD referrals", value=True)
         
-        if st.button("🔍 Run Analysis", type="primary"):
-            if domain_input:
-                domain = domain_input.strip().lower().replace('https://', '').replace('http://', '').split('/')[0]
+        if st.button("🧭 Run Trace", type="primary"):
+            if not trace_input:
+                st.warning("⚠️ Please enter a domain name")
+            elif not DNS_AVAILABLE:
+                show_missing_dependency("DNS Trace", "dnspython")
+            else:
+                domains = list(dict.fromkeys(d.strip().lower() for d in trace_input.split('\n') if d.strip()))
                 
-                with st.spinner(f"Analyzing {domain}..."):
-                    dnssec_status = get_dnssec_info(domain)
-                    ns_list = get_live_ns(domain)
-                    now = datetime.now().replace(tzinfo=None)  # Timezone-neutral for comparison
+                for raw in domains:
+                    valid, domain = validate_domain(raw)
+                    st.markdown(f"### {raw}")
+                    if not valid:
+                        st.error(f"❌ {domain}")
+                        continue
+                    
+                    with st.spinner(f"Tracing {domain}..."):
+                        start = time.perf_counter()
+                        try:
+                            hops = trace_dns(domain, trace_type, use_cache=use_cache)
+                        except Exception as e:
+                            st.error(f"❌ Trace failed: {str(e)}")
+                            continue
+                        elapsed = (time.perf_counter() - start) * 1000
+                    
+                    final = hops[-1]
+                    if final['result'] == 'answer':
+                        st.success(f"✅ {final['qname']} {trace_type} → {final['details']}")
+                    elif final['result'] in ('NXDOMAIN', 'NODATA'):
+                        st.warning(f"⚠️ {final['result']} from {final['server']} ({final['zone']}): {final['details']}")
+                    else:
+                        st.error(f"❌ Resolution failed at zone `{final['zone']}` on {final['server']}: {final['details']}")
+                    
+                    df = pd.DataFrame([{
+                        'Step': i,
+                        'Query': h['qname'],
+                        'Zone': h['zone'],
+                        'Server': h['server'],
+                        'IP': h['server_ip'],
+                        'Latency (ms)': h['latency_ms'],
+                        'Result': h['result'],
+                        'Details': h['details']
+                    } for i, h in enumerate(hops, 1)])
+                    st.dataframe(df, use_container_width=True, hide_index=True)
+                    st.caption(f"⏱️ {len(hops)} hop(s) in {elapsed:.0f} ms")
                     
+                    glue_hops = [h for h in hops if h['glue']]
+                    if glue_hops:
+                        with st.expander("🧩 Glue Records"):
+                            for h in glue_hops:
+                                st.markdown(f"**{h['zone']}** via {h['server']}")
+                                for ns, addrs in h['glue'].items():
+                                    st.code(f"{ns}: {', '.join(addrs)}")
+                
+                cache = get_delegation_cache()
+                st.caption(f"🗄️ Delegation cache: {len(cache)} referral(s), {cache.hits} hit(s), {cache.misses} miss(es)")
+                
+    elif tool == "📑 Zone File Diff":
+        st.title("📑 Zone File Diff")
+        st.markdown("Compare an exported zone file against what the live nameservers serve")
+        st.info("💡 Upload a BIND or cPanel zone export - every record is checked directly against the authoritative servers")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            domain = st.text_input("Domain (zone origin):", placeholder="example.com")
+            zone_file = st.file_uploader("Zone File:", type=['db', 'zone', 'txt', 'hosts'])
+        with col2:
+            server_override = st.text_input("Nameserver IPs (optional, comma separated):", placeholder="Leave empty to use the delegated NS")
+            workers = st.slider("Parallel queries:", 1, 128, CONFIG['zone_diff_workers'])
+            show_all = st.checkbox("Show matching records", value=False)
+        
+        if st.button("📑 Compare Zone", type="primary"):
+            if not domain or not zone_file:
+                st.warning("⚠️ Please enter the domain and upload a zone file")
+            elif not DNS_AVAILABLE:
+                show_missing_dependency("Zone File Diff", "dnspython")
+            else:
+                valid, result = validate_domain(domain)
+                if not valid:
+                    st.error(f"❌ {result}")
+                else:
+                    domain = result.lower()
                     try:
-                        # ==========================================
-                        # UNIQUE .ng TREATMENT
-                        # ==========================================
-                        if domain.endswith('.ng'):
-                            display_ng_whois_simplified(domain)
-                        
-                        # ==========================================
-                        # STANDARD TLD TREATMENT (.com, .net, .org, etc)
-                        # ==========================================
+                        records = parse_zone_file(zone_file.getvalue().decode('utf-8', errors='ignore'), domain)
+                    except Exception as e:
+                        records = None
+                        st.error(f"❌ Could not parse zone file: {str(e)}")
+                    
+                    if records is not None:
+                        if server_override.strip():
+                            servers = [(ip.strip(), ip.strip()) for ip in server_override.split(',') if ip.strip()]
                         else:
-                            w = whois.whois(domain)
-                            
-                            # Consolidate status to string for logic check
-                            status_list = w.status if isinstance(w.status, list) else [w.status]
-                            status_joined = " ".join([str(s) for s in status_list]).lower()
-                            
-                            # Fix: Handle naive/aware datetime comparison
-                            is_expired = False
-                            if w.expiration_date:
-                                exp = w.expiration_date[0] if isinstance(w.expiration_date, list) else w.expiration_date
-                                # Remove timezone info from registry date to match local now()
-                                if exp.replace(tzinfo=None) < now:
-                                    is_expired = True
-                            
-                            # Status-Aware Alerting Logic
-                            error_keywords = ["hold", "suspended", "expired", "redemption", "pendingdelete", "raa"]
-                            if any(x in status_joined for x in error_keywords) or is_expired:
-                                st.error(f"❌ Domain Alert: {status_joined.upper() if status_joined else 'EXPIRED'}")
-                            elif "ok" in status_joined or "active" in status_joined:
-                                st.success("✅ Domain Status: OK / ACTIVE")
-                            else:
-                                st.info(f"ℹ️ Current Status: {status_joined.upper()}")
-                            
-                            # Display registration details
-                            st.markdown("### 📋 WHOIS Information")
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                st.markdown("**Registration Details:**")
-                                st.write(f"**Domain:** {w.domain_name if hasattr(w, 'domain_name') else 'N/A'}")
-                                st.write(f"**Registrar:** {w.registrar if hasattr(w, 'registrar') else 'N/A'}")
+                            with st.spinner("Finding authoritative nameservers..."):
+                                servers = get_authoritative_servers(domain)
+                        
+                        if not records:
+                            st.warning("⚠️ No comparable records found in the zone file")
+                        elif not servers:
+                            st.error("❌ Could not resolve the domain's nameservers - enter them manually")
+                        else:
+                            st.caption(f"🖥️ Querying {', '.join(ns for ns, _ in servers)}")
+                            progress = st.progress(0.0)
+                            start = time.perf_counter()
+                            rows = diff_zone(
+                                records, servers, max_workers=workers,
+                                progress_cb=lambda done, total: progress.progress(done / total)
+                            )
+                            elapsed = time.perf_counter() - start
                             
-                            with col2:
-                                st.markdown("**Important Dates:**")
-                                if w.expiration_date:
-                                    exp = w.expiration_date[0] if isinstance(w.expiration_date, list) else w.expiration_date
-                                    st.write(f"**Expires:** {str(exp).split()[0]}")
-                                    
-                                    # Quick Health Check
-                                    try:
-                                        days_left = (exp.replace(tzinfo=None) - datetime.now()).days
-                                        if days_left < 30:
-                                            st.warning(f"⚠️ Expires in {days_left} days!")
-                                        else:
-                                            st.success(f"✅ {days_left} days remaining")
-                                    except:
-                                        pass
+                            df = pd.DataFrame(rows)
+                            counts = df['Status'].value_counts()
                             
-                            with st.expander("📄 View Full WHOIS Output", expanded=False):
-                                st.code(str(w), language=None)
-                        
-                        # ==========================================
-                        # COMMON FOOTER (Only for non-.ng domains)
-                        # ==========================================
-                        if not domain.endswith('.ng'):
-                            st.markdown("---")
-                            c1, c2 = st.columns(2)
+                            c1, c2, c3, c4 = st.columns(4)
                             with c1:
-                                st.info(f"🛡️ {dnssec_status}")
+                                st.metric("✅ Match", int(counts.get('✅ Match', 0)))
                             with c2:
-                                st.write("**Live Nameservers:**")
-                                if ns_list:
-                                    for ns in ns_list:
-                                        st.write(f"- `{ns}`")
-                                else:
-                                    st.warning("No nameservers found.")
+                                st.metric("❌ Missing", int(counts.get('❌ Missing', 0)))
+                            with c3:
+                                st.metric("🔄 Changed", int(counts.get('🔄 Changed', 0)))
+                            with c4:
+                                st.metric("➕ Extra", int(counts.get('➕ Extra', 0)))
                             
-                    except Exception as e:
-                        st.error(f"❌ Analysis failed: {str(e)}")
-                        st.info(f"**Try manual lookup:**\n- https://who.is/whois/{domain}\n- https://lookup.icann.org/en/lookup?name={domain}")
-            else:
-                st.warning("⚠️ Please enter a domain name.")
+                            st.caption(f"⏱️ {len(rows)} unique name/type pairs checked in {elapsed:.2f}s")
+                            
+                            view = df if show_all else df[df['Status'] != '✅ Match']
+                            if view.empty:
+                                st.success("🎉 Live DNS matches the zone file")
+                            else:
+                                st.dataframe(view, use_container_width=True, hide_index=True)
+                            
+                            st.download_button("📥 Download Diff (CSV)", df.to_csv(index=False), f"{domain}_zone_diff.csv", "text/csv")
                 
+    elif tool == "👁️ Watchlist Monitor":
+        st.title("👁️ Watchlist Monitor")
+        st.markdown("Track SSL expiry, domain expiry, nameserver and status changes for VIP customer domains")
+        st.info("💡 Entries are re-checked in the background when due - every few hours close to an expiry, weekly when it is far off")
+
+        with st.expander("➕ Add Domains", expanded=not os.path.exists(watchlist_db_path())):
+            new_domains = st.text_area("Domains or hostnames (one per line):", height=120, placeholder="example.com\nshop.customer.co.za")
+            note = st.text_input("Note (optional):", placeholder="VIP - Acme Ltd")
+
+            if st.button("➕ Add to Watchlist", type="primary"):
+                entries, rejected, _ = normalize_entries(re.split(r'[\s,;]+', new_domains))
+                hosts = entries.loc[entries['type'].isin(['domain', 'url']), 'host'].dropna().unique().tolist()
+                if not rejected.empty:
+                    st.warning(f"⚠️ Ignored {len(rejected)} invalid entr{'y' if len(rejected) == 1 else 'ies'}: {', '.join(rejected['input'].head(10))}")
+                if not hosts:
+                    st.warning("⚠️ Please enter at least one domain")
+                else:
+                    added = watchlist_add(hosts, note.strip())
+                    st.toast(f"✅ Added {added} domain(s)" + (f" - {len(hosts) - added} already watched" if added < len(hosts) else ""))
+                    wake_watchlist_scheduler()
+
+        watched = watchlist_entries() if os.path.exists(watchlist_db_path()) else []
+
+        if not watched:
+            st.info("ℹ️ No domains on the watchlist yet")
+        else:
+            now = time.time()
+            events = watchlist_events()
+
+            def days_until(ts):
+                return int((ts - now) // 86400) if ts else None
+
+            df = pd.DataFrame([{
+                'Domain': row['domain'],
+                'Note': row['note'],
+                'SSL Issuer': row['cert_issuer'],
+                'SSL Expires': _format_timestamp(row['cert_expires']) if row['cert_expires'] else None,
+                'SSL Days Left': days_until(row['cert_expires']),
+                'SSL Problem': row['cert_problem'],
+                'Domain Expires': _format_timestamp(row['domain_expires']) if row['domain_expires'] else None,
+                'Domain Days Left': days_until(row['domain_expires']),
+                'Nameservers': ', '.join(json.loads(row['name_servers'])) if row['name_servers'] else None,
+                'Status': ', '.join(json.loads(row['status'])) if row['status'] else None,
+                'Registrar': row['registrar'],
+                'Last Checked': f"{datetime.fromtimestamp(row['last_checked'], timezone.utc):%Y-%m-%d %H:%M} UTC" if row['last_checked'] else '⏳ Pending',
+                'Next Check': f"{datetime.fromtimestamp(row['next_due'], timezone.utc):%Y-%m-%d %H:%M} UTC" if row['next_due'] > now else 'Due now',
+                'Error': row['last_error']
+            } for row in watched])
+            for col in ['SSL Days Left', 'Domain Days Left']:
+                df[col] = df[col].astype('Int64')
+            df['_soonest'] = df[['SSL Days Left', 'Domain Days Left']].min(axis=1)
+            df = df.sort_values('_soonest', na_position='last', kind='stable').drop(columns=['_soonest'])
+
+            c1, c2, c3, c4 = st.columns(4)
+            with c1:
+                st.metric("Watched Domains", len(df))
+            with c2:
+                st.metric("SSL ≤ 30 Days", int((df['SSL Days Left'] <= 30).sum()))
+            with c3:
+                st.metric("Domain ≤ 30 Days", int((df['Domain Days Left'] <= 30).sum()))
+            with c4:
+                st.metric("Changes (7 Days)", sum(1 for e in events if e['detected_at'] >= now - 7 * 86400))
+
+            scheduler = get_watchlist_scheduler()
+            if scheduler['error']:
+                st.error(f"❌ Scheduler error: {scheduler['error']}")
+            elif scheduler['finished']:
+                st.caption(f"⏱️ Last scheduler pass {datetime.fromtimestamp(scheduler['finished'], timezone.utc):%H:%M:%S} UTC re-checked {scheduler['checked']} due entr{'y' if scheduler['checked'] == 1 else 'ies'}")
+
+            pending = sum(1 for row in watched if row['next_due'] <= now)
+            if pending and not watchlist_scheduler_busy():
+                wake_watchlist_scheduler()
+            checks_running = (pending > 0 and not scheduler['error']) or watchlist_scheduler_busy()
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                if checks_running:
+                    st.info(f"⏳ {pending} entr{'y' if pending == 1 else 'ies'} waiting for the background checker - results appear as they finish")
+                auto_refresh = st.checkbox("Auto-refresh while checks are running", value=True, key='watchlist_auto_refresh')
+            with col2:
+                if st.button("🔄 Refresh", use_container_width=True):
+                    st.rerun()
+
+            tab1, tab2, tab3 = st.tabs(["📋 Watchlist", "🔔 Changes", "⚙️ Manage"])
+
+            with tab1:
+                st.dataframe(df, use_container_width=True, hide_index=True)
+                st.download_button("📥 Download Watchlist (CSV)", df.to_csv(index=False), "watchlist.csv", "text/csv")
+
+            with tab2:
+                if not events:
+                    st.success("✅ No changes detected yet")
+                else:
+                    st.dataframe(pd.DataFrame([{
+                        'Detected': f"{datetime.fromtimestamp(e['detected_at'], timezone.utc):%Y-%m-%d %H:%M} UTC",
+                        'Domain': e['domain'],
+                        'Change': e['kind'],
+                        'Before': e['old_value'],
+                        'After': e['new_value']
+                    } for e in events]), use_container_width=True, hide_index=True)
+
+            with tab3:
+                selected = st.multiselect("Domains:", df['Domain'].tolist())
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    recheck_all = st.button("🔄 Re-check All Now", use_container_width=True)
+                with col2:
+                    recheck_selected = st.button("🔄 Re-check Selected", use_container_width=True, disabled=not selected)
+                with col3:
+                    remove_selected = st.button("🗑️ Remove Selected", use_container_width=True, disabled=not selected)
+
+                if recheck_all or recheck_selected:
+                    watchlist_mark_due(None if recheck_all else selected)
+                    wake_watchlist_scheduler()
+                    st.rerun()
+                if remove_selected:
+                    for domain in selected:
+                        watchlist_remove(domain)
+                    st.rerun()
+
+            if checks_running and auto_refresh:
+                time.sleep(3)
+                st.rerun()
+
     # EMAIL TOOLS
     elif tool == "📮 MX Record Checker":
         st.title("📮 MX Record Checker")
@@ -1721,6 +6543,12 @@ Be specific about web hosting environments, cPanel, and common server configurat
         
         domain = st.text_input("Domain:", placeholder="example.com")
         
+        col_ip, col_sender = st.columns(2)
+        with col_ip:
+            spf_ip = st.text_input("Sending IP (optional):", placeholder="41.203.18.183", help="Evaluate SPF for this IP and show which mechanism matches")
+        with col_sender:
+            spf_sender = st.text_input("Envelope Sender (optional):", placeholder="user@example.com")
+        
         if st.button("🔍 Check Email Authentication", type="primary"):
             if not domain:
                 st.warning("⚠️ Please enter a domain name")
@@ -1734,109 +6562,263 @@ Be specific about web hosting environments, cPanel, and common server configurat
                     if not DNS_AVAILABLE:
                         show_missing_dependency("Email Auth Check", "dnspython")
                     else:
+                        ip_for_spf = None
+                        if spf_ip:
+                            valid_ip, ip_result = validate_ip(spf_ip.strip())
+                            if valid_ip:
+                                ip_for_spf = spf_ip.strip()
+                            else:
+                                st.warning(f"⚠️ Sending IP: {ip_result}")
+                        
                         with st.spinner(f"Checking email authentication for {domain}..."):
-                            st.markdown("### 🛡️ SPF (Sender Policy Framework)")
-                            success, txt_records = lookup_dns_record(domain, 'TXT')
-                            
-                            spf_found = False
-                            if success:
-                                for record in txt_records:
-                                    if 'v=spf1' in record.lower():
-                                        spf_found = True
-                                        st.success("✅ SPF record found")
-                                        st.code(record)
-                                        
-                                        if 'all' in record:
-                                            if '-all' in record:
-                                                st.success("✅ Hard fail (-all) - strict policy")
-                                            elif '~all' in record:
-                                                st.info("ℹ️ Soft fail (~all) - lenient policy")
-                                            elif '?all' in record:
-                                                st.warning("⚠️ Neutral (?all) - no policy")
-                                            elif '+all' in record:
-                                                st.error("❌ Pass all (+all) - insecure!")
-                            
-                            if not spf_found:
-                                st.error("❌ No SPF record found")
-                                st.info("💡 SPF records help prevent email spoofing")
-                            
-                            st.markdown("---")
-                            
-                            st.markdown("### 🔑 DKIM (DomainKeys Identified Mail)")
-                            common_selectors = ['default', 'google', 'k1', 'selector1', 'selector2', 'dkim', 'mail']
-                            dkim_found = False
-                            
-                            for selector in common_selectors:
-                                dkim_domain = f"{selector}._domainkey.{domain}"
-                                success, dkim_records = lookup_dns_record(dkim_domain, 'TXT')
-                                if success:
-                                    for record in dkim_records:
-                                        if 'v=DKIM1' in record or 'p=' in record:
-                                            dkim_found = True
-                                            st.success(f"✅ DKIM record found (selector: {selector})")
-                                            st.code(record[:100] + "..." if len(record) > 100 else record)
-                            
-                            if not dkim_found:
-                                st.warning("⚠️ No DKIM records found with common selectors")
-                                st.info("💡 Try checking your email provider's documentation for the correct selector")
-                            
-                            st.markdown("---")
-                            
-                            st.markdown("### 📧 DMARC (Domain-based Message Authentication)")
-                            dmarc_domain = f"_dmarc.{domain}"
-                            success, dmarc_records = lookup_dns_record(dmarc_domain, 'TXT')
-                            
-                            dmarc_found = False
-                            if success:
-                                for record in dmarc_records:
-                                    if 'v=DMARC1' in record:
-                                        dmarc_found = True
-                                        st.success("✅ DMARC record found")
-                                        st.code(record)
-                                        
-                                        if 'p=reject' in record.lower():
-                                            st.success("✅ Reject policy - maximum protection")
-                                        elif 'p=quarantine' in record.lower():
-                                            st.info("ℹ️ Quarantine policy - moderate protection")
-                                        elif 'p=none' in record.lower():
-                                            st.warning("⚠️ Monitor only policy - minimal protection")
+                            start = time.perf_counter()
+                            checks = run_email_auth_checks(domain, spf_ip=ip_for_spf, spf_sender=spf_sender.strip() or None)
+                            elapsed = time.perf_counter() - start
+                        
+                        timed_out = [name for name, value in checks.items() if value is None]
+                        st.caption(f"⏱️ {len(checks)} checks ran in parallel in {elapsed:.2f}s")
+                        failed = [name for name, value in checks.items() if isinstance(value, Exception)]
+                        if timed_out:
+                            st.warning(f"⚠️ Deadline of {CONFIG['email_auth_deadline']}s reached - no answer for: {', '.join(timed_out)}")
+                        if failed:
+                            st.warning(f"⚠️ Check(s) failed: {', '.join(f'{name} ({checks[name]})' for name in failed)}")
+                        
+                        st.markdown("### 🛡️ SPF (Sender Policy Framework)")
+                        if checks['spf'] is None:
+                            spf_tree, spf_lookups = {'status': 'temperror', 'error': 'Timed out'}, 0
+                        elif isinstance(checks['spf'], Exception):
+                            spf_tree, spf_lookups = {'status': 'temperror', 'error': str(checks['spf'])}, 0
+                        else:
+                            spf_tree, spf_lookups = checks['spf']
+                        spf_status = spf_tree['status']
+                        record = spf_tree.get('record') or spf_tree['error']
+                        
+                        spf_found = spf_status == 'OK'
+                        if spf_found:
+                            st.success("✅ SPF record found")
+                            st.code(record)
                             
-                            if not dmarc_found:
-                                st.error("❌ No DMARC record found")
-                                st.info("💡 DMARC helps protect against email spoofing and phishing")
+                            mechanisms = [t for t in spf_tree.get('terms', []) if t['type'] == 'mechanism']
+                            all_term = next((t for t in mechanisms if t['name'] == 'all'), None)
+                            if all_term:
+                                if all_term['qualifier'] == '-':
+                                    st.success("✅ Hard fail (-all) - strict policy")
+                                elif all_term['qualifier'] == '~':
+                                    st.info("ℹ️ Soft fail (~all) - lenient policy")
+                                elif all_term['qualifier'] == '?':
+                                    st.warning("⚠️ Neutral (?all) - no policy")
+                                else:
+                                    st.error("❌ Pass all (+all) - insecure!")
                             
-                            st.markdown("---")
-                            st.markdown("### 📊 Overall Assessment")
+                            limit = CONFIG['spf_lookup_limit']
+                            if spf_lookups > limit:
+                                st.error(f"❌ {spf_lookups} DNS lookups - exceeds the limit of {limit} (receivers will return permerror)")
+                            elif spf_lookups >= limit - 2:
+                                st.warning(f"⚠️ {spf_lookups}/{limit} DNS lookups - close to the limit")
+                            else:
+                                st.success(f"✅ {spf_lookups}/{limit} DNS lookups")
                             
-                            scores = {'SPF': spf_found, 'DKIM': dkim_found, 'DMARC': dmarc_found}
-                            enabled = sum(scores.values())
-                            total = len(scores)
+                            with st.expander("🌳 Include Tree", expanded=spf_lookups > limit):
+                                def render_spf_node(node, prefix=""):
+                                    lines = [f"{prefix}{node['domain']}  [{node['lookups']} lookup(s)]"]
+                                    if node['error']:
+                                        lines.append(f"{prefix}   ⚠ {node['error']}")
+                                    for term in node.get('terms', []):
+                                        if term['type'] == 'mechanism' and term['name'] not in ('include',):
+                                            lines.append(f"{prefix}   {term['text']}")
+                                    for child in node['children']:
+                                        lines += render_spf_node(child, prefix + "   ")
+                                    return lines
+                                st.code('\n'.join(render_spf_node(spf_tree)), language=None)
                             
-                            col1, col2, col3 = st.columns(3)
-                            with col1:
-                                st.metric("SPF", "✅" if scores['SPF'] else "❌")
-                            with col2:
-                                st.metric("DKIM", "✅" if scores['DKIM'] else "❌")
-                            with col3:
-                                st.metric("DMARC", "✅" if scores['DMARC'] else "❌")
+                            def spf_ptr_domains(node):
+                                found = [node['domain']] if any(t['type'] == 'mechanism' and t['name'] == 'ptr' for t in node.get('terms', [])) else []
+                                for child in node['children']:
+                                    found += spf_ptr_domains(child)
+                                return found
+                            ptr_domains = spf_ptr_domains(spf_tree)
+                            if ptr_domains:
+                                st.warning(f"⚠️ The ptr mechanism is deprecated and slow - consider replacing it (used in {', '.join(ptr_domains)})")
+                        elif spf_status == 'permerror':
+                            st.error(f"❌ {record}")
+                        elif spf_status == 'temperror':
+                            st.error(f"❌ SPF lookup failed: {record}")
+                        
+                        if ip_for_spf:
+                            evaluation = checks.get('check_host')
+                            if evaluation is None:
+                                st.warning(f"⚠️ SPF evaluation for {ip_for_spf} did not finish before the deadline")
+                            elif isinstance(evaluation, Exception):
+                                st.error(f"❌ SPF evaluation for {ip_for_spf} failed: {evaluation}")
+                            else:
+                                label = f"SPF {evaluation['result'].upper()} for {ip_for_spf}"
+                                if evaluation['mechanism']:
+                                    label += f" - matched `{evaluation['mechanism']}` in {evaluation['domain']}"
+                                elif evaluation['reason']:
+                                    label += f" - {evaluation['reason']}"
+                                if evaluation['result'] == 'pass':
+                                    st.success(f"✅ {label}")
+                                elif evaluation['result'] in ('fail', 'permerror', 'temperror'):
+                                    st.error(f"❌ {label}")
+                                else:
+                                    st.warning(f"⚠️ {label}")
+                                with st.expander("🔎 Evaluation Trace"):
+                                    st.code('\n'.join(evaluation['trace']) or "No records evaluated", language=None)
+                        
+                        if spf_status == 'none':
+                            st.error("❌ No SPF record found")
+                            st.info("💡 SPF records help prevent email spoofing")
+                        
+                        st.markdown("---")
+                        
+                        st.markdown("### 🔑 DKIM (DomainKeys Identified Mail)")
+                        dkim_found = False
+                        
+                        for selector in DKIM_COMMON_SELECTORS:
+                            status, dkim_records = email_check_records(checks[f"dkim:{selector}"])
+                            for record in dkim_records:
+                                if 'v=DKIM1' in record or 'p=' in record:
+                                    dkim_found = True
+                                    st.success(f"✅ DKIM record found (selector: {selector})")
+                                    st.code(record[:100] + "..." if len(record) > 100 else record)
+                        
+                        if not dkim_found:
+                            st.warning("⚠️ No DKIM records found with common selectors")
+                            st.info("💡 Try checking your email provider's documentation for the correct selector")
+                        
+                        st.markdown("---")
+                        
+                        st.markdown("### 📧 DMARC (Domain-based Message Authentication)")
+                        status, dmarc_records = email_check_records(checks['dmarc'])
+                        
+                        dmarc_found = False
+                        dmarc_policy = None
+                        for record in dmarc_records:
+                            if 'v=DMARC1' in record:
+                                dmarc_found = True
+                                dmarc_policy = parse_tag_record(record).get('p', '').lower()
+                                st.success("✅ DMARC record found")
+                                st.code(record)
+                                
+                                if 'p=reject' in record.lower():
+                                    st.success("✅ Reject policy - maximum protection")
+                                elif 'p=quarantine' in record.lower():
+                                    st.info("ℹ️ Quarantine policy - moderate protection")
+                                elif 'p=none' in record.lower():
+                                    st.warning("⚠️ Monitor only policy - minimal protection")
+                        
+                        if not dmarc_found:
+                            st.error("❌ No DMARC record found")
+                            st.info("💡 DMARC helps protect against email spoofing and phishing")
+                        
+                        st.markdown("---")
+                        
+                        st.markdown("### 🔐 MTA-STS (SMTP MTA Strict Transport Security)")
+                        status, sts_records = email_check_records(checks['mta_sts'])
+                        sts_txt = next((r for r in sts_records if r.startswith('v=STSv1')), None)
+                        policy_result = checks['mta_sts_policy']
+                        mta_sts_ok = False
+                        
+                        if sts_txt:
+                            st.success(f"✅ _mta-sts TXT record found (id={parse_tag_record(sts_txt).get('id', '?')})")
+                            st.code(sts_txt)
+                        else:
+                            st.info("ℹ️ No _mta-sts TXT record - MTA-STS is not enabled")
+                        
+                        if policy_result is None:
+                            if sts_txt:
+                                st.warning("⚠️ Policy fetch did not finish before the deadline")
+                        elif isinstance(policy_result, Exception):
+                            if sts_txt:
+                                st.error(f"❌ Could not fetch policy: {policy_result}")
+                        elif policy_result[0]:
+                            sts_policy = policy_result[1]
+                            if sts_policy['errors']:
+                                st.error(f"❌ Policy file is invalid: {'; '.join(sts_policy['errors'])}")
+                            else:
+                                st.success(f"✅ Policy mode: {sts_policy.get('mode')} (max_age {sts_policy.get('max_age')}s)")
+                            with st.expander("📄 Policy File"):
+                                st.code(sts_policy['raw'], language=None)
                             
-                            if enabled == total:
-                                st.success("🎉 Excellent! All email authentication methods are configured")
-                            elif enabled >= 2:
-                                st.info(f"✓ Good! {enabled}/{total} authentication methods configured")
+                            mx_status, mx_values = email_check_records(checks['mx'])
+                            mx_hosts = [v.split()[-1].rstrip('.').lower() for v in mx_values]
+                            unmatched = [h for h in mx_hosts if not any(mx_matches_sts_pattern(h, p) for p in sts_policy['mx'])]
+                            if not mx_hosts:
+                                st.warning("⚠️ Could not load MX records to verify against the policy")
+                            elif unmatched:
+                                st.error(f"❌ MX host(s) not covered by the policy: {', '.join(unmatched)} - mail to them will fail in enforce mode")
                             else:
-                                st.warning(f"⚠️ Only {enabled}/{total} authentication methods configured")
+                                st.success(f"✅ All {len(mx_hosts)} MX host(s) match the policy")
+                            mta_sts_ok = bool(sts_txt) and not sts_policy['errors'] and bool(mx_hosts) and not unmatched
+                        elif sts_txt:
+                            st.error(f"❌ Could not fetch policy: {policy_result[1]}")
+                        
+                        st.markdown("### 📨 TLS-RPT (SMTP TLS Reporting)")
+                        status, rpt_records = email_check_records(checks['tls_rpt'])
+                        tls_rpt = next((r for r in rpt_records if r.startswith('v=TLSRPTv1')), None)
+                        if tls_rpt:
+                            st.success(f"✅ TLS reports go to {parse_tag_record(tls_rpt).get('rua', '?')}")
+                            st.code(tls_rpt)
+                        else:
+                            st.info("ℹ️ No _smtp._tls record - TLS delivery failures are not reported")
+                        
+                        st.markdown("### 🏷️ BIMI (Brand Indicators)")
+                        status, bimi_records = email_check_records(checks['bimi'])
+                        bimi = next((r for r in bimi_records if r.startswith('v=BIMI1')), None)
+                        if bimi:
+                            bimi_tags = parse_tag_record(bimi)
+                            st.success(f"✅ BIMI logo: {bimi_tags.get('l') or 'not set'}")
+                            if bimi_tags.get('a'):
+                                st.info(f"ℹ️ Verified Mark Certificate: {bimi_tags['a']}")
+                            if dmarc_policy not in ('quarantine', 'reject'):
+                                st.warning("⚠️ BIMI logos are only shown when DMARC is p=quarantine or p=reject")
+                            st.code(bimi)
+                        else:
+                            st.info("ℹ️ No default._bimi record")
+                        
+                        st.markdown("---")
+                        st.markdown("### 📊 Overall Assessment")
+                        
+                        scores = {'SPF': spf_found, 'DKIM': dkim_found, 'DMARC': dmarc_found}
+                        enabled = sum(scores.values())
+                        total = len(scores)
+                        
+                        col1, col2, col3 = st.columns(3)
+                        with col1:
+                            st.metric("SPF", "✅" if scores['SPF'] else "❌")
+                        with col2:
+                            st.metric("DKIM", "✅" if scores['DKIM'] else "❌")
+                        with col3:
+                            st.metric("DMARC", "✅" if scores['DMARC'] else "❌")
+                        
+                        col4, col5, col6 = st.columns(3)
+                        with col4:
+                            st.metric("MTA-STS", "✅" if mta_sts_ok else "➖")
+                        with col5:
+                            st.metric("TLS-RPT", "✅" if tls_rpt else "➖")
+                        with col6:
+                            st.metric("BIMI", "✅" if bimi else "➖")
+                        
+                        if enabled == total:
+                            st.success("🎉 Excellent! All email authentication methods are configured")
+                        elif enabled >= 2:
+                            st.info(f"✓ Good! {enabled}/{total} authentication methods configured")
+                        else:
+                            st.warning(f"⚠️ Only {enabled}/{total} authentication methods configured")
 
     elif tool == "📄 Email Header Analyzer":
         st.title("📄 Email Header Analyzer")
         st.markdown("Analyze email headers to troubleshoot delivery issues")
         
         headers = st.text_area("Paste Email Headers:", height=300, placeholder="Received: from...\nFrom:...\nTo:...")
+        messages = st.file_uploader("Or upload raw messages (.eml) to verify DKIM/ARC signatures:", type=['eml', 'txt'], accept_multiple_files=True)
         
         if st.button("🔍 Analyze Headers", type="primary"):
-            if not headers:
-                st.warning("⚠️ Please paste email headers")
+            if not headers and not messages:
+                st.warning("⚠️ Please paste email headers or upload a message")
             else:
+                if not headers:
+                    headers = messages[0].getvalue().decode('utf-8', errors='replace').replace('\r\n', '\n').split('\n\n', 1)[0]
                 with st.spinner("Analyzing headers..."):
                     lines = headers.split('\n')
                     
@@ -1859,7 +6841,7 @@ Be specific about web hosting environments, cPanel, and common server configurat
                     
                     st.success(f"✅ Parsed {len(parsed_headers)} header fields")
                     
-                    tab1, tab2, tab3 = st.tabs(["📬 Basic Info", "🔀 Routing", "🔍 All Headers"])
+                    tab1, tab2, tab3, tab4 = st.tabs(["📬 Basic Info", "🔀 Routing", "🔍 All Headers", "🔏 DKIM/ARC"])
                     
                     with tab1:
                         st.markdown("### Basic Information")
@@ -1890,6 +6872,271 @@ Be specific about web hosting environments, cPanel, and common server configurat
                         for key, value in parsed_headers.items():
                             with st.expander(f"📋 {key}"):
                                 st.code(value)
+                    
+                    with tab4:
+                        st.markdown("### Signature Verification")
+                        if not messages:
+                            st.info("💡 Upload the raw .eml to verify signatures - body hashes need the full message")
+                        elif not DNS_AVAILABLE:
+                            st.error("❌ DNS library not available")
+                        else:
+                            status_icons = {'pass': '✅ pass', 'fail': '❌ fail', 'error': '⚠️ error'}
+                            rows, arc_results = [], []
+                            start = time.perf_counter()
+                            for upload in messages:
+                                raw = upload.getvalue()
+                                for result in verify_dkim(raw):
+                                    rows.append(('DKIM', upload.name, result))
+                                arc = verify_arc_chain(raw)
+                                arc_results.append((upload.name, arc))
+                                if arc['ams']:
+                                    rows.append((f"ARC-AMS i={arc['ams']['instance']}", upload.name, arc['ams']))
+                            total_s = time.perf_counter() - start
+                            
+                            table = [{
+                                'Message': name,
+                                'Type': kind,
+                                'Domain': r['domain'],
+                                'Selector': r['selector'],
+                                'Algorithm': r['algorithm'],
+                                'Body Hash': status_icons[r['body_hash']],
+                                'Signature': status_icons[r['signature']],
+                                'Key': 'cached' if r.get('key_cached') else 'fetched',
+                                'Key (ms)': round(r['timings'].get('key_ms', 0), 1),
+                                'Body (ms)': round(r['timings'].get('body_ms', 0), 1),
+                                'Header (ms)': round(r['timings'].get('header_ms', 0), 1),
+                                'Detail': r['detail']
+                            } for kind, name, r in rows]
+                            
+                            c1, c2, c3, c4 = st.columns(4)
+                            with c1:
+                                st.metric("Messages", len(messages))
+                            with c2:
+                                st.metric("Signatures", len(table))
+                            with c3:
+                                st.metric("Verified", sum(1 for _, _, r in rows if r['signature'] == 'pass' and r['body_hash'] == 'pass'))
+                            with c4:
+                                st.metric("Keys Fetched", sum(1 for _, _, r in rows if not r.get('key_cached') and r['signature'] != 'error'))
+                            
+                            if table:
+                                st.dataframe(pd.DataFrame(table), use_container_width=True, hide_index=True)
+                                body_failures = [row for row in table if row['Body Hash'] != '✅ pass']
+                                if body_failures:
+                                    st.warning(f"⚠️ {len(body_failures)} signature(s) have a body hash mismatch - the body was modified after signing (footers, line wrapping or content filters)")
+                            else:
+                                st.warning("⚠️ No DKIM-Signature headers found in the uploaded message(s)")
+                            
+                            st.markdown("### 🔗 ARC Chains")
+                            for name, arc in arc_results:
+                                if arc['result'] == 'none':
+                                    st.info(f"**{name}:** no ARC headers")
+                                    continue
+                                seals = ', '.join(f"i={seal['instance']} {status_icons[seal['seal']]}" for seal in arc['seals'])
+                                if arc['result'] == 'pass':
+                                    st.success(f"✅ **{name}:** ARC chain valid ({seals})")
+                                else:
+                                    st.error(f"❌ **{name}:** {arc['reason']}" + (f" ({seals})" if seals else ""))
+                            
+                            st.caption(f"⏱️ Verified {len(messages)} message(s) in {total_s * 1000:.0f} ms - keys are cached by DNS TTL, so repeated selectors are only fetched once")
+
+    elif tool == "📊 DMARC Report Analyzer":
+        st.title("📊 DMARC Report Analyzer")
+        st.markdown("See who is sending as a domain before moving it to p=reject")
+        st.info("💡 Upload aggregate (RUA) reports as .xml, .xml.gz or .zip - as many as you like")
+        
+        reports = st.file_uploader("DMARC Aggregate Reports:", type=['xml', 'gz', 'zip'], accept_multiple_files=True)
+        resolve_names = st.checkbox("Label senders with reverse DNS (PTR)", value=True)
+        
+        if st.button("📊 Analyze Reports", type="primary"):
+            if not reports:
+                st.warning("⚠️ Please upload at least one report")
+            else:
+                start = time.perf_counter()
+                with st.spinner(f"Parsing {len(reports)} file(s)..."):
+                    df, stats = aggregate_dmarc_reports((f.name, f) for f in reports)
+                parse_s = time.perf_counter() - start
+                
+                for err in stats['errors']:
+                    st.warning(f"⚠️ Skipped {err}")
+                
+                if df.empty:
+                    st.error("❌ No DMARC records found in the uploaded files")
+                else:
+                    by_source = df.groupby('source_ip').agg(
+                        messages=('messages', 'sum'),
+                        header_from=('header_from', lambda x: ', '.join(sorted(set(x))))
+                    )
+                    by_source['dmarc_pass'] = df[df['dmarc_pass']].groupby('source_ip')['messages'].sum()
+                    by_source['dkim_aligned'] = df[df['dkim_aligned']].groupby('source_ip')['messages'].sum()
+                    by_source['spf_aligned'] = df[df['spf_aligned']].groupby('source_ip')['messages'].sum()
+                    by_source = by_source.fillna(0)
+                    by_source['pass_rate'] = (by_source['dmarc_pass'] / by_source['messages'] * 100).round(1)
+                    
+                    if resolve_names and DNS_AVAILABLE:
+                        with st.spinner(f"Resolving {len(by_source)} sender PTR record(s)..."):
+                            ptrs = lookup_ptrs(by_source.index.tolist())
+                        by_source['ptr'] = [', '.join(ptrs[ip][1]) or '-' for ip in by_source.index]
+                    
+                    by_source = by_source.sort_values('messages', ascending=False)
+                    total = int(df['messages'].sum())
+                    passed = int(df.loc[df['dmarc_pass'], 'messages'].sum())
+                    
+                    c1, c2, c3, c4 = st.columns(4)
+                    with c1:
+                        st.metric("Reports", stats['reports'])
+                    with c2:
+                        st.metric("Messages", f"{total:,}")
+                    with c3:
+                        st.metric("DMARC Pass", f"{passed / total * 100:.1f}%" if total else "N/A")
+                    with c4:
+                        st.metric("Sending Sources", len(by_source))
+                    
+                    st.caption(f"⏱️ Parsed {stats['records']:,} records from {len(stats['reporters'])} reporter(s) in {parse_s:.2f}s")
+                    
+                    failing = by_source[by_source['pass_rate'] < 100]
+                    if failing.empty:
+                        st.success("🎉 All reported mail passes DMARC - safe to tighten the policy")
+                    else:
+                        failing_share = (failing['messages'] - failing['dmarc_pass']).sum() / total * 100
+                        st.warning(f"⚠️ {len(failing)} source(s) send failing mail ({failing_share:.1f}% of volume) - these would be rejected under p=reject")
+                    
+                    st.markdown("### 📮 Senders")
+                    st.dataframe(by_source.reset_index(), use_container_width=True, hide_index=True)
+                    
+                    st.markdown("### 📈 Top Senders by Volume")
+                    top = by_source.head(15)
+                    st.bar_chart(pd.DataFrame({
+                        'Passing': top['dmarc_pass'],
+                        'Failing': top['messages'] - top['dmarc_pass']
+                    }))
+                    
+                    with st.expander("📋 Alignment Detail"):
+                        st.dataframe(df.sort_values('messages', ascending=False), use_container_width=True, hide_index=True)
+                    
+                    st.download_button("📥 Download Sender Summary (CSV)", by_source.reset_index().to_csv(index=False), "dmarc_senders.csv", "text/csv")
+
+    elif tool == "🚫 DNSBL Blacklist Check":
+        st.title("🚫 DNSBL Blacklist Check")
+        st.markdown("Check mail server IPs and domains against DNS blocklists")
+        st.info(f"💡 Enter IPs, domains or a mixed list - {len(DNSBL_ZONES)} zones are queried in parallel")
+
+        entries = st.text_area("IPs or Domains (one per line or comma separated):", height=120, placeholder="192.0.2.10\nexample.com")
+        expand_domains = st.checkbox("Also check each domain's MX and SPF outbound IPs", value=True)
+
+        with st.expander("⚙️ Advanced"):
+            zone_names = st.multiselect("Zones:", [z['zone'] for z in DNSBL_ZONES], default=[z['zone'] for z in DNSBL_ZONES])
+            col1, col2 = st.columns(2)
+            with col1:
+                resolver_ip = st.text_input("Resolver IP (optional):", placeholder="Leave empty to use the system resolver")
+            with col2:
+                resolver_port = st.number_input("Resolver Port:", value=53, min_value=1, max_value=65535)
+            st.caption("Spamhaus and URIBL refuse queries from large public resolvers - use your own recursive resolver if results show refusals")
+
+        if st.button("🚫 Check Blacklists", type="primary"):
+            items = [e.strip() for e in re.split(r'[\s,;]+', entries) if e.strip()]
+            resolver_valid, resolver_result = validate_ip(resolver_ip) if resolver_ip.strip() else (True, None)
+            if not items:
+                st.warning("⚠️ Please enter at least one IP or domain")
+            elif not resolver_valid:
+                st.error(f"❌ Resolver IP: {resolver_result}")
+            elif not DNS_AVAILABLE:
+                show_missing_dependency("DNSBL Blacklist Check", "dnspython")
+            else:
+                resolver = get_dnsbl_resolver([resolver_result], int(resolver_port)) if resolver_result else get_dnsbl_resolver()
+                zones = [z for z in DNSBL_ZONES if z['zone'] in zone_names]
+
+                targets, sources = [], {}
+                for item in items:
+                    try:
+                        targets.append(str(ipaddress.ip_address(item)))
+                        sources.setdefault(targets[-1], 'Entered')
+                        continue
+                    except ValueError:
+                        pass
+                    valid, result = validate_domain(item)
+                    if not valid:
+                        st.warning(f"⚠️ Skipped {item}: {result}")
+                        continue
+                    domain = result.lower()
+                    targets.append(domain)
+                    sources.setdefault(domain, 'Entered')
+                    if expand_domains:
+                        with st.spinner(f"Finding mail servers for {domain}..."):
+                            mail_ips = get_mail_server_ips(domain, resolver)
+                        if not mail_ips:
+                            st.warning(f"⚠️ No MX or SPF host IPs found for {domain}")
+                        for ip, source in mail_ips:
+                            targets.append(ip)
+                            sources.setdefault(ip, f"{domain} {source}")
+
+                targets = list(dict.fromkeys(targets))
+                if targets and zones:
+                    progress = st.progress(0)
+                    status = st.empty()
+
+                    def update_progress(done, total):
+                        progress.progress(done / total)
+                        status.text(f"Queried {done}/{total} zone lookups...")
+
+                    start = time.perf_counter()
+                    results = check_dnsbl_many(targets, zones, resolver, progress_cb=update_progress)
+                    elapsed = time.perf_counter() - start
+                    progress.empty()
+                    status.empty()
+
+                    if not results:
+                        st.warning("⚠️ No selected zone applies to these entries - pick IP zones for IPs and domain zones for domains")
+                    else:
+                        listed = [r for r in results if r['status'] == 'listed']
+                        errors = [r for r in results if r['status'] == 'error']
+                        listed_items = {r['item'] for r in listed}
+
+                        c1, c2, c3, c4 = st.columns(4)
+                        with c1:
+                            st.metric("Checked", len(targets))
+                        with c2:
+                            st.metric("Lookups", len(results))
+                        with c3:
+                            st.metric("Listings", len(listed))
+                        with c4:
+                            st.metric("Errors / Timeouts", len(errors))
+
+                        if listed:
+                            st.error(f"❌ {len(listed_items)} of {len(targets)} checked IP(s)/domain(s) are listed on at least one blocklist")
+                        else:
+                            st.success("✅ Not listed on any of the queried blocklists")
+
+                        symbols = {'listed': '🚫', 'clean': '✅', 'error': '⚠️'}
+                        df = pd.DataFrame(results)
+                        df['cell'] = df['status'].map(symbols)
+                        matrix = df.pivot(index='item', columns='zone', values='cell').fillna('')
+                        matrix.insert(0, 'Source', [sources.get(item, '') for item in matrix.index])
+                        flagged = sorted(df.loc[df['status'] != 'clean', 'zone'].unique())
+
+                        st.markdown("### 🗺️ Listing Matrix")
+                        if flagged:
+                            st.dataframe(matrix[['Source'] + flagged], use_container_width=True)
+                            st.caption(f"Showing the {len(flagged)} zone(s) with listings or errors - all other zones are clean")
+                        with st.expander("📋 Full Matrix"):
+                            st.dataframe(matrix, use_container_width=True)
+
+                        if listed:
+                            st.markdown("### 🚫 Listings")
+                            st.dataframe(pd.DataFrame([{
+                                'IP/Domain': r['item'], 'Zone': r['zone'], 'Return Code': ', '.join(r['codes']),
+                                'Meaning': r['meaning'], 'Reason (TXT)': r['reason']
+                            } for r in listed]), use_container_width=True, hide_index=True)
+
+                        if errors:
+                            with st.expander(f"⚠️ {len(errors)} zone error(s)"):
+                                st.dataframe(pd.DataFrame([{
+                                    'IP/Domain': r['item'], 'Zone': r['zone'], 'Error': r['meaning']
+                                } for r in errors]), use_container_width=True, hide_index=True)
+
+                        st.caption(f"⏱️ {len(results)} lookups in {elapsed:.2f}s - answers are cached for their TTL")
+                        st.download_button("📥 Download Results (CSV)", df.drop(columns=['cell']).to_csv(index=False), "dnsbl_results.csv", "text/csv")
+                elif not zones:
+                    st.warning("⚠️ Please select at least one zone")
 
     # WEB & SSL TOOLS
     elif tool == "🔧 Web Error Troubleshooting":
@@ -2067,37 +7314,27 @@ Be specific about web hosting environments, cPanel, and common server configurat
                     domain = result
                     
                     with st.spinner(f"Checking SSL for {domain}..."):
-                        try:
-                            context = ssl.create_default_context()
-                            with socket.create_connection((domain, 443), timeout=10) as sock:
-                                with context.wrap_socket(sock, server_hostname=domain) as ssock:
-                                    cert = ssock.getpeercert()
-                                    
-                                    st.success("✅ SSL Certificate found and valid")
-                                    
-                                    col1, col2 = st.columns(2)
-                                    
-                                    with col1:
-                                        st.info(f"**Issuer:** {dict(x[0] for x in cert['issuer'])['organizationName']}")
-                                        st.info(f"**Subject:** {dict(x[0] for x in cert['subject'])['commonName']}")
-                                    
-                                    with col2:
-                                        st.info(f"**Valid From:** {cert['notBefore']}")
-                                        st.info(f"**Valid Until:** {cert['notAfter']}")
-                                    
-                                    if 'subjectAltName' in cert:
-                                        st.markdown("### 📜 Subject Alternative Names")
-                                        for alt_name in cert['subjectAltName']:
-                                            st.code(alt_name[1])
-                                    
-                        except ssl.SSLError as e:
-                            st.error(f"❌ SSL Error: {str(e)}")
-                        except socket.gaierror:
-                            st.error("❌ Could not resolve domain")
-                        except socket.timeout:
-                            st.error("❌ Connection timed out")
-                        except Exception as e:
-                            st.error(f"❌ Error: {str(e)}")
+                        success, cert = fetch_ssl_certificate(domain)
+
+                    if not success:
+                        st.error(f"❌ {cert}")
+                    else:
+                        st.success("✅ SSL Certificate found and valid")
+
+                        col1, col2 = st.columns(2)
+
+                        with col1:
+                            st.info(f"**Issuer:** {cert['issuer']}")
+                            st.info(f"**Subject:** {cert['subject']}")
+
+                        with col2:
+                            st.info(f"**Valid From:** {cert['not_before']}")
+                            st.info(f"**Valid Until:** {cert['not_after']} ({cert['days_left']} days left)")
+
+                        if cert['san']:
+                            st.markdown("### 📜 Subject Alternative Names")
+                            for alt_name in cert['san']:
+                                st.code(alt_name)
 
     elif tool == "🔀 HTTPS Redirect Test":
         st.title("🔀 HTTPS Redirect Test")
@@ -2500,6 +7737,167 @@ RewriteRule ^(.*)$ https://%{HTTP_HOST}%{REQUEST_URI} [L,R=301]""", language="ap
                         with col_b:
                             for s in success_checks: st.success(f"• {s}")
 
+    elif tool == "⏱️ DNS Latency Benchmark":
+        st.title("⏱️ DNS Latency Benchmark")
+        st.markdown("Measure how fast recursive resolvers and the domain's own nameservers answer")
+        
+        domain = st.text_input("Domain:", placeholder="example.com")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            resolvers = st.multiselect("Recursive Resolvers:", list(PUBLIC_RESOLVERS.keys()), default=list(PUBLIC_RESOLVERS.keys())[:2])
+            custom_resolvers = st.text_input("Custom Resolver IPs (comma separated):", placeholder="41.203.18.183")
+            include_auth = st.checkbox("Include authoritative nameservers", value=True)
+        with col2:
+            record_type = st.selectbox("Record Type:", ['A', 'AAAA', 'MX', 'NS', 'TXT'])
+            count = st.slider("Queries per target:", 5, CONFIG['benchmark_max_queries'], 50)
+            concurrency = st.slider("Concurrency:", 1, 50, 5)
+            passes = st.multiselect("Cache Passes:", ["Warm", "Cold"], default=["Warm", "Cold"])
+        
+        st.caption("Cold passes query a random label under the domain so the resolver has to go to the authoritative servers")
+        
+        if st.button("⏱️ Run Benchmark", type="primary"):
+            if not domain:
+                st.warning("⚠️ Please enter a domain name")
+            elif not passes:
+                st.warning("⚠️ Select at least one cache pass")
+            else:
+                valid, result = validate_domain(domain)
+                if not valid:
+                    st.error(f"❌ {result}")
+                elif not DNS_AVAILABLE:
+                    show_missing_dependency("DNS Benchmark", "dnspython")
+                else:
+                    domain = result
+                    targets = [(name, PUBLIC_RESOLVERS[name], True) for name in resolvers]
+                    for ip in [i.strip() for i in custom_resolvers.split(',') if i.strip()]:
+                        valid_ip, ip_result = validate_ip(ip)
+                        if valid_ip:
+                            targets.append((f"Custom ({ip})", ip, True))
+                        else:
+                            st.warning(f"⚠️ Skipping {ip}: {ip_result}")
+                    
+                    if include_auth:
+                        with st.spinner("Finding authoritative nameservers..."):
+                            auth_servers = get_authoritative_servers(domain)
+                        if not auth_servers:
+                            st.warning("⚠️ Could not resolve the domain's nameservers")
+                        targets += [(f"Auth {ns}", ip, False) for ns, ip in auth_servers]
+                    
+                    if not targets:
+                        st.warning("⚠️ Select at least one resolver or nameserver")
+                    else:
+                        rows, samples_by_target = [], {}
+                        progress = st.progress(0.0)
+                        runs = [(t, p) for t in targets for p in passes]
+                        
+                        for i, ((name, ip, recursive), cache_pass) in enumerate(runs, 1):
+                            samples = benchmark_dns_server(
+                                ip, domain, record_type, count=count, concurrency=concurrency,
+                                cold=(cache_pass == "Cold"), recursion=recursive
+                            )
+                            stats = summarize_latencies(samples)
+                            label = f"{name} [{cache_pass}]"
+                            samples_by_target[label] = samples
+                            rows.append({
+                                'Target': name,
+                                'IP': ip,
+                                'Pass': cache_pass,
+                                'Min': stats['min'],
+                                'p50': stats['p50'],
+                                'p95': stats['p95'],
+                                'p99': stats['p99'],
+                                'Max': stats['max'],
+                                'Errors': f"{stats['errors']}/{stats['queries']}"
+                            })
+                            progress.progress(i / len(runs))
+                        
+                        st.markdown("### 📊 Latency (ms)")
+                        df = pd.DataFrame(rows)
+                        st.dataframe(df.round(1), use_container_width=True, hide_index=True)
+                        
+                        fastest = df.dropna(subset=['p50']).sort_values('p50')
+                        if not fastest.empty:
+                            best = fastest.iloc[0]
+                            st.success(f"🏆 Fastest median: {best['Target']} ({best['Pass']}) at {best['p50']:.1f} ms")
+                        
+                        all_ok = np.concatenate([s[~np.isnan(s)] for s in samples_by_target.values()])
+                        if all_ok.size:
+                            st.markdown("### 📈 Distribution")
+                            bins = np.histogram_bin_edges(all_ok, bins=30)
+                            hist = pd.DataFrame(
+                                {label: np.histogram(s[~np.isnan(s)], bins=bins)[0] for label, s in samples_by_target.items()},
+                                index=np.round(bins[:-1], 1)
+                            )
+                            hist.index.name = 'Latency (ms)'
+                            st.bar_chart(hist)
+
+    elif tool == "🔁 Bulk Reverse DNS (PTR)":
+        st.title("🔁 Bulk Reverse DNS (PTR)")
+        st.markdown("Check PTR records and forward-confirmed reverse DNS (FCrDNS) for mail server IPs")
+        st.info("💡 Most receivers reject or spam-folder mail from IPs without a PTR that resolves back to the same IP")
+
+        entries = st.text_area("IPs or CIDR Ranges (one per line or comma separated):", height=120, placeholder="192.0.2.10\n198.51.100.0/24\n2001:db8::/120")
+
+        with st.expander("⚙️ Advanced"):
+            col1, col2 = st.columns(2)
+            with col1:
+                resolver_ip = st.text_input("Resolver IP (optional):", placeholder="Leave empty to use the system resolver")
+            with col2:
+                resolver_port = st.number_input("Resolver Port:", value=53, min_value=1, max_value=65535)
+            workers = st.slider("Parallel lookups:", 1, 512, CONFIG['ptr_workers'])
+
+        if st.button("🔁 Check PTR Records", type="primary"):
+            ips, errors = expand_ip_targets([e.strip() for e in re.split(r'[\s,;]+', entries) if e.strip()])
+            for error in errors:
+                st.warning(f"⚠️ {error}")
+
+            resolver_valid, resolver_result = validate_ip(resolver_ip) if resolver_ip.strip() else (True, None)
+            if not ips:
+                st.warning("⚠️ Please enter at least one IP address or CIDR range")
+            elif not resolver_valid:
+                st.error(f"❌ Resolver IP: {resolver_result}")
+            elif not DNS_AVAILABLE:
+                show_missing_dependency("Bulk Reverse DNS", "dnspython")
+            else:
+                resolver = get_resolver([resolver_result], int(resolver_port)) if resolver_result else get_resolver()
+                progress = st.progress(0.0)
+                status = st.empty()
+
+                def update_progress(done, total):
+                    progress.progress(done / total)
+                    status.text(f"Resolved {done}/{total} PTR records...")
+
+                start = time.perf_counter()
+                rows, hostnames = check_fcrdns(ips, resolver, max_workers=workers, progress_cb=update_progress)
+                elapsed = time.perf_counter() - start
+                progress.empty()
+                status.empty()
+
+                df = pd.DataFrame(rows)
+                passed = int((df['FCrDNS'] == '✅ Pass').sum())
+
+                c1, c2, c3, c4 = st.columns(4)
+                with c1:
+                    st.metric("IPs", len(ips))
+                with c2:
+                    st.metric("With PTR", int((df['FCrDNS'] != '❌ No PTR').sum()))
+                with c3:
+                    st.metric("FCrDNS Pass", f"{passed}/{len(ips)}")
+                with c4:
+                    st.metric("Unique Hostnames", len(hostnames))
+
+                if passed == len(ips):
+                    st.success("✅ Every IP has a PTR that resolves back to it")
+                else:
+                    st.warning(f"⚠️ {len(ips) - passed} IP(s) fail forward-confirmed reverse DNS - ask the IP owner (hosting provider or ISP) to set a matching PTR")
+
+                failures_first = df.assign(_ok=df['FCrDNS'] == '✅ Pass').sort_values('_ok', kind='stable').drop(columns=['_ok'])
+                st.dataframe(failures_first, use_container_width=True, hide_index=True)
+
+                st.caption(f"⏱️ {len(ips)} PTR and {len(hostnames)} forward lookup(s) in {elapsed:.2f}s")
+                st.download_button("📥 Download Results (CSV)", df.to_csv(index=False), "ptr_results.csv", "text/csv")
+
     elif tool == "🧹 Flush DNS Cache":
         st.title("🧹 Flush Google DNS Cache")
         st.markdown("Clear Google's DNS cache to force fresh lookups")
@@ -2907,6 +8305,61 @@ ORDER BY (data_length + index_length) DESC;""", language="sql")
                     st.metric("Alphanumeric", sum(c.isalnum() for c in text_tool))
                     st.metric("Special Chars", sum(not c.isalnum() and not c.isspace() for c in text_tool))
 
+    elif tool == "🧾 Bulk Input Normalizer":
+        st.title("🧾 Bulk Input Normalizer")
+        st.markdown("Clean up pasted lists of domains, IPs, CIDR ranges, emails and URLs before running bulk checks")
+        st.info("💡 Entries are classified, IDNA/punycode-normalized, lower-cased and deduplicated - invalid lines are listed with the reason")
+        
+        source = st.radio("Input:", ["📝 Paste", "📄 CSV Column"], horizontal=True)
+        values = []
+        if source == "📝 Paste":
+            pasted = st.text_area("Entries (one per line, or comma separated):", height=200, placeholder="Example.com\nhttps://www.bücher.de/shop\n2001:DB8::1\nuser@Example.COM\n10.0.0.5/24")
+            values = re.split(r'[\s,;]+', pasted) if pasted else []
+        else:
+            upload = st.file_uploader("CSV File:", type=['csv', 'txt'])
+            if upload:
+                try:
+                    table = pd.read_csv(upload, dtype=str, keep_default_na=False)
+                    column = st.selectbox("Column:", list(table.columns))
+                    values = table[column].tolist()
+                except Exception as e:
+                    st.error(f"❌ Could not read CSV: {str(e)}")
+        
+        if st.button("🧾 Normalize", type="primary"):
+            if not values:
+                st.warning("⚠️ Please paste entries or choose a CSV column")
+            else:
+                start = time.perf_counter()
+                valid_df, invalid_df, duplicates = normalize_entries(values)
+                elapsed = time.perf_counter() - start
+                counts = valid_df['type'].value_counts()
+                
+                cols = st.columns(7)
+                for col, (label, value) in zip(cols, [
+                    ("Domains", counts.get('domain', 0)), ("IPs", counts.get('ip', 0)), ("CIDRs", counts.get('cidr', 0)),
+                    ("Emails", counts.get('email', 0)), ("URLs", counts.get('url', 0)), ("Invalid", len(invalid_df)),
+                    ("Duplicates", duplicates)
+                ]):
+                    with col:
+                        st.metric(label, f"{value:,}")
+                st.caption(f"⏱️ Normalized {len(values):,} entries in {elapsed * 1000:.0f} ms")
+                
+                tab1, tab2, tab3 = st.tabs(["✅ Normalized", "❌ Invalid", "🌐 Registrable Domains"])
+                with tab1:
+                    st.dataframe(valid_df, use_container_width=True, hide_index=True)
+                    st.download_button("📥 Download Normalized (CSV)", valid_df.to_csv(index=False), "normalized.csv", "text/csv")
+                    st.text_area("Normalized values:", value='\n'.join(valid_df['normalized'].astype(str)), height=150)
+                with tab2:
+                    if invalid_df.empty:
+                        st.success("✅ No invalid entries")
+                    else:
+                        st.dataframe(invalid_df, use_container_width=True, hide_index=True)
+                        st.download_button("📥 Download Invalid (CSV)", invalid_df.to_csv(index=False), "invalid.csv", "text/csv")
+                with tab3:
+                    groups, _ = group_by_registrable(valid_df['host'].dropna())
+                    st.caption(f"{valid_df['host'].nunique():,} hostnames collapse to {len(groups):,} registrable domains")
+                    st.text_area("Registrable domains:", value='\n'.join(sorted(groups)), height=150)
+
     elif tool == "📸 Screenshot Annotator":
         st.title("📸 Screenshot Annotator")
         st.markdown("Upload screenshots and add notes")
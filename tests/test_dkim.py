@@ -0,0 +1,147 @@
+"""Known-answer checks for the hand-rolled DKIM/ARC verifier.
+
+RFC 8463 appendix A's test message carries one Ed25519 and one RSA
+signature (relaxed/relaxed). The simple/simple DKIM and ARC samples were
+signed with dkimpy, so canonicalization and RSA verification are checked
+against an independent implementation. Key lookups are served from
+the records below instead of DNS.
+
+Run with: python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+KEYS = {
+    ('brisbane', 'football.example.com'): 'v=DKIM1; k=ed25519; p=11qYAYKxCrfVS/7TyWQHOg7hcvPapiMlrwIaaPcHURo=',
+    ('test', 'football.example.com'): (
+        'v=DKIM1; k=rsa; p=MIGfMA0GCSqGSIb3DQEBAQUAA4GNADCBiQKBgQDkHlOQoBTzWRiGs5V6NpP3idY6Wk08a5qhdR6wy5bdOKb2jLQiY/'
+        'J16JYi0Qvx/byYzCNb3W91y3FutACDfzwQ/BC/e/8uBsCR+yz1Lxj+PL6lHvqMKrM3rG4hstT5QjvHO9PzoxZyVYLzBfO2EeC3Ip3G+'
+        '2kryOTIKT+l/K4w3QIDAQAB'
+    ),
+    ('simple', 'example.org'): 'v=DKIM1; k=rsa; p=MIGfMA0GCSqGSIb3DQEBAQUAA4GNADCBiQKBgQDnTMMJENe5sRqIpuo3JMc4iVaHuhVFmZmm9f71pYcOWR7CcySt7JnKGAZaGHnT6IjP97opNDl6sdOzMgG/XmivnFP2QSPmt5yyEk12sepk/MWzBfZD+dZ7RGMFA0FHxm2gAh6NWwv9LyrZMI4OJ7H01VzlHXYJ09vulzlTmk4DfwIDAQAB',
+    ('arc', 'example.org'): 'v=DKIM1; k=rsa; p=MIGfMA0GCSqGSIb3DQEBAQUAA4GNADCBiQKBgQDnTMMJENe5sRqIpuo3JMc4iVaHuhVFmZmm9f71pYcOWR7CcySt7JnKGAZaGHnT6IjP97opNDl6sdOzMgG/XmivnFP2QSPmt5yyEk12sepk/MWzBfZD+dZ7RGMFA0FHxm2gAh6NWwv9LyrZMI4OJ7H01VzlHXYJ09vulzlTmk4DfwIDAQAB'
+}
+
+RFC8463_MESSAGE = b"""DKIM-Signature: v=1; a=ed25519-sha256; c=relaxed/relaxed;
+ d=football.example.com; i=@football.example.com;
+ q=dns/txt; s=brisbane; t=1528637909; h=from : to :
+ subject : date : message-id : from : subject : date;
+ bh=2jUSOH9NhtVGCQWNr9BrIAPreKQjO6Sn7XIkfJVOzv8=;
+ b=/gCrinpcQOoIfuHNQIbq4pgh9kyIK3AQUdt9OdqQehSwhEIug4D11Bus
+ Fa3bT3FY5OsU7ZbnKELq+eXdp1Q1Dw==
+DKIM-Signature: v=1; a=rsa-sha256; c=relaxed/relaxed;
+ d=football.example.com; i=@football.example.com;
+ q=dns/txt; s=test; t=1528637909; h=from : to : subject :
+ date : message-id : from : subject : date;
+ bh=2jUSOH9NhtVGCQWNr9BrIAPreKQjO6Sn7XIkfJVOzv8=;
+ b=F45dVWDfMbQDGHJFlXUNB2HKfbCeLRyhDXgFpEL8GwpsRe0IeIixNTe3
+ DhCVlUrSjV4BwcVcOF6+FF3Zo9Rpo1tFOeS9mPYQTnGdaSGsgeefOsk2Jz
+ dA+L10TeYt9BgDfQNZtKdN1WO//KgIqXP7OdEFE4LjFYNcUxZQ4FADY+8=
+From: Joe SixPack <joe@football.example.com>
+To: Suzie Q <suzie@shopping.example.net>
+Subject: Is dinner ready?
+Date: Fri, 11 Jul 2003 21:00:37 -0700 (PDT)
+Message-ID: <20030712040037.46341.5F8J@football.example.com>
+
+Hi.
+
+We lost the game.  Are you hungry yet?
+
+Joe.
+"""
+
+# Trailing whitespace, a folded Subject and extra blank lines exercise simple canonicalization
+SIMPLE_MESSAGE = (
+    b'DKIM-Signature: v=1; a=rsa-sha256; c=simple/simple; d=example.org;\r\n'
+    b' i=@example.org; q=dns/txt; s=simple; t=1792387029; h=from : to :\r\n'
+    b' subject : date : message-id;\r\n'
+    b' bh=TY1CL5Wbesi+uqRRgmgX+p1HG/3MQ/a/qSDJ17j8rm8=;\r\n'
+    b' b=oQQxVkGixVMKK71oD6fXNLfZ2zZOu6ZA0gz8ExGWIGCuhP6tdMJsF9SHgeUy0LZtnBEoe\r\n'
+    b' 2u/EODFLbJkjTgsBbnAngu8U3VZ3EGTghEYX9vk534R8ZEZ1v0190ZylQhWXK0Wi5GZ9K0P\r\n'
+    b' 0/bnpHuFniTjs9UVKVF8/kTTYsRVcYs=\r\n'
+    b'From: Support <support@example.org>\r\n'
+    b'To: customer@example.net\r\n'
+    b'Subject: Your ticket  has\r\n'
+    b'\tbeen updated\r\n'
+    b'Date: Mon, 19 Oct 2026 09:00:00 +0000\r\n'
+    b'Message-ID: <ticket-1@example.org>\r\n'
+    b'\r\n'
+    b'Hello,  \r\n'
+    b'\r\n'
+    b'Your mailbox quota was raised.\r\n'
+    b'\r\n'
+    b'\r\n'
+)
+
+ARC_MESSAGE = (
+    b'ARC-Seal: i=1; cv=none; a=rsa-sha256; d=example.org; s=arc; t=1792387029;\r\n'
+    b' b=JWwuhbFie09MLWzUy6bVj3x82O1qBK3SlYKOROizqTVpMcr/nkW11JoW2+6iRMXqHUKOi\r\n'
+    b' rUC4XFOyu2pj4vEXFpMyOoiyGNaArBlmIeDv6u4oUQQLp+ZNHXQ4EeearVFLFmhWYBXHqxd\r\n'
+    b' foZb7Eggum/imUswuYBxeu175efL4Nk=\r\n'
+    b'ARC-Message-Signature: i=1; a=rsa-sha256; c=relaxed/relaxed;\r\n'
+    b' d=example.org; s=arc; t=1792387029; h=from : to : subject : date :\r\n'
+    b' message-id; bh=b7JgcWlBI2zsZ31wxYJSADCjP3dG7BiuJ6WPMfUw/Sw=;\r\n'
+    b' b=lr1t5Ve0VMcP3lJTTTnMMsNREpty1+16ZuY3EgDSb9+Qyw2HlzBhr2dp86tEWJEjdG36y\r\n'
+    b' GXG0+qf6//oPrKKnO1r5k22IKkuYd2TBgulsU4b1+EnGuDA0aUmi5AyhHhH3tZY0OjjKoOd\r\n'
+    b' CbxPY/yH2g+JhvMRpB+l6hLnQR3jNZY=\r\n'
+    b'ARC-Authentication-Results: i=1; relay.example.org;\r\n'
+    b' spf=pass smtp.mailfrom=example.org;\r\n'
+    b' dkim=pass header.d=example.org\r\n'
+    b'Authentication-Results: relay.example.org; spf=pass smtp.mailfrom=example.org; dkim=pass header.d=example.org\r\n'
+) + SIMPLE_MESSAGE
+
+
+@pytest.fixture(autouse=True)
+def dns_keys(monkeypatch):
+    def fetch(selector, domain, resolver=None):
+        record = KEYS.get((selector, domain))
+        if record is None:
+            return None, f"No key at {selector}._domainkey.{domain} (NXDOMAIN)"
+        return app.parse_tag_record(record), None
+    monkeypatch.setattr(app, 'fetch_dkim_key', fetch)
+
+
+def signatures(raw):
+    return {r['selector']: r for r in app.verify_dkim(raw)}
+
+
+def test_rfc8463_rsa_signature():
+    result = signatures(RFC8463_MESSAGE)['test']
+    assert (result['body_hash'], result['signature']) == ('pass', 'pass')
+
+
+@pytest.mark.skipif(not app.ED25519_AVAILABLE, reason="ed25519 needs the cryptography package")
+def test_rfc8463_ed25519_signature():
+    result = signatures(RFC8463_MESSAGE)['brisbane']
+    assert (result['body_hash'], result['signature']) == ('pass', 'pass')
+
+
+def test_rfc8463_tampering_is_detected():
+    body = signatures(RFC8463_MESSAGE.replace(b'hungry', b'HUNGRY'))['test']
+    header = signatures(RFC8463_MESSAGE.replace(b'dinner', b'lunch'))['test']
+    assert (body['body_hash'], body['signature']) == ('fail', 'pass')
+    assert (header['body_hash'], header['signature']) == ('pass', 'fail')
+
+
+def test_simple_canonicalization():
+    result = signatures(SIMPLE_MESSAGE)['simple']
+    assert (result['body_hash'], result['signature']) == ('pass', 'pass')
+    # simple/simple is whitespace-sensitive: relaxed-equivalent edits must break it
+    assert signatures(SIMPLE_MESSAGE.replace(b'Hello,  ', b'Hello,'))['simple']['body_hash'] == 'fail'
+    assert signatures(SIMPLE_MESSAGE.replace(b'ticket  has', b'ticket has'))['simple']['signature'] == 'fail'
+
+
+def test_arc_chain():
+    chain = app.verify_arc_chain(ARC_MESSAGE)
+    assert chain['result'] == 'pass', chain['reason']
+    assert [seal['seal'] for seal in chain['seals']] == ['pass']
+
+
+def test_arc_chain_tampering_is_detected():
+    assert app.verify_arc_chain(ARC_MESSAGE.replace(b'spf=pass smtp', b'spf=fail smtp', 1))['result'] == 'fail'
+    assert app.verify_arc_chain(ARC_MESSAGE.replace(b'cv=none', b'cv=pass'))['result'] == 'fail'
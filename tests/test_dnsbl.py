@@ -0,0 +1,156 @@
+"""DNSBL listing checks against a local stub nameserver.
+
+A small UDP server on 127.0.0.1 answers A and TXT queries from the table
+below and returns NXDOMAIN for everything else, so the listing matrix and
+the per-zone return-code meanings are checked without touching the real
+blocklists. Queries for psbl.surriel.com are dropped to exercise timeouts.
+
+Run with: python -m pytest tests
+"""
+import os
+import socket
+import sys
+import threading
+
+import dns.flags
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+RECORDS = {
+    ('10.2.0.192.zen.spamhaus.org', 'A'): ['127.0.0.2', '127.0.0.10'],
+    ('10.2.0.192.zen.spamhaus.org', 'TXT'): ['"https://check.spamhaus.org/sbl/query/SBL1"'],
+    ('10.2.0.192.hostkarma.junkemailfilter.com', 'A'): ['127.0.0.1'],
+    ('10.2.0.192.b.barracudacentral.org', 'A'): ['198.51.100.7'],
+    ('20.2.0.192.zen.spamhaus.org', 'A'): ['127.255.255.254'],
+    ('1.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.0.8.b.d.0.1.0.0.2.zen.spamhaus.org', 'A'): ['127.0.0.3'],
+    ('example.com.dbl.spamhaus.org', 'A'): ['127.0.1.255'],
+    ('example.net.dbl.spamhaus.org', 'A'): ['127.0.1.4'],
+    ('example.net.multi.uribl.com', 'A'): ['127.0.0.6'],
+    ('example.com.multi.uribl.com', 'A'): ['127.0.0.1'],
+}
+
+ZONES = {zone['zone']: zone for zone in app.DNSBL_ZONES}
+
+
+class StubServer:
+    """Answer DNS queries over UDP from RECORDS until closed"""
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(4096)
+            except OSError:
+                return
+            query = dns.message.from_wire(data)
+            question = query.question[0]
+            name = question.name.to_text().rstrip('.').lower()
+            if name.endswith('psbl.surriel.com'):
+                continue
+            response = dns.message.make_response(query)
+            response.flags |= dns.flags.AA
+            values = RECORDS.get((name, dns.rdatatype.to_text(question.rdtype)))
+            if values:
+                response.answer.append(dns.rrset.from_text(question.name, 300, 'IN', question.rdtype, *values))
+            elif not any(key[0] == name for key in RECORDS):
+                response.set_rcode(dns.rcode.NXDOMAIN)
+            self.sock.sendto(response.to_wire(), addr)
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture(scope='module')
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def resolver(stub, monkeypatch):
+    monkeypatch.setitem(app.CONFIG, 'dnsbl_timeout', 0.5)
+    app.DNS_CACHE.clear()
+    yield app.get_dnsbl_resolver(['127.0.0.1'], stub.port)
+    app.DNS_CACHE.clear()
+
+
+def check(item, zone, resolver):
+    return app.check_dnsbl(item, ZONES[zone], resolver)
+
+
+def test_listing_matrix(resolver):
+    zones = [ZONES[name] for name in ('zen.spamhaus.org', 'hostkarma.junkemailfilter.com',
+                                      'b.barracudacentral.org', 'bl.spamcop.net', 'psbl.surriel.com',
+                                      'dbl.spamhaus.org', 'multi.uribl.com')]
+    results = app.check_dnsbl_many(['192.0.2.10', 'example.net'], zones, resolver)
+    matrix = {(row['item'], row['zone']): row['status'] for row in results}
+    assert matrix == {
+        ('192.0.2.10', 'zen.spamhaus.org'): 'listed',
+        ('192.0.2.10', 'hostkarma.junkemailfilter.com'): 'clean',
+        ('192.0.2.10', 'b.barracudacentral.org'): 'error',
+        ('192.0.2.10', 'bl.spamcop.net'): 'clean',
+        ('192.0.2.10', 'psbl.surriel.com'): 'error',
+        ('example.net', 'dbl.spamhaus.org'): 'listed',
+        ('example.net', 'multi.uribl.com'): 'listed',
+    }
+
+
+def test_listed_codes_and_reason(resolver):
+    result = check('192.0.2.10', 'zen.spamhaus.org', resolver)
+    assert sorted(result['codes']) == ['127.0.0.10', '127.0.0.2']
+    assert 'SBL - Spamhaus Block List' in result['meaning']
+    assert 'PBL - ISP policy (dynamic range)' in result['meaning']
+    assert result['reason'] == 'https://check.spamhaus.org/sbl/query/SBL1'
+
+
+def test_ipv6_nibble_query(resolver):
+    result = check('2001:db8::1', 'zen.spamhaus.org', resolver)
+    assert result['status'] == 'listed'
+    assert result['meaning'] == 'SBL CSS - snowshoe spam'
+
+
+def test_allowlist_answer_is_clean(resolver):
+    result = check('192.0.2.10', 'hostkarma.junkemailfilter.com', resolver)
+    assert (result['status'], result['meaning']) == ('clean', 'Allowlisted (good)')
+
+
+def test_not_listed(resolver):
+    result = check('192.0.2.10', 'bl.spamcop.net', resolver)
+    assert (result['status'], result['codes'], result['reason']) == ('clean', [], '')
+
+
+def test_error_codes(resolver):
+    refused = check('192.0.2.20', 'zen.spamhaus.org', resolver)
+    assert (refused['status'], refused['meaning']) == ('error', 'Query refused - public/open resolver used')
+    hijacked = check('192.0.2.10', 'b.barracudacentral.org', resolver)
+    assert hijacked['status'] == 'error'
+    assert hijacked['meaning'].startswith('Non-127/8 answer 198.51.100.7')
+    dbl = check('example.com', 'dbl.spamhaus.org', resolver)
+    assert (dbl['status'], dbl['meaning']) == ('error', 'IP queries are not supported')
+    uribl = check('example.com', 'multi.uribl.com', resolver)
+    assert (uribl['status'], uribl['meaning']) == ('error', 'Query refused - public/open resolver or over quota')
+
+
+def test_bitmask_and_domain_codes(resolver):
+    uribl = check('example.net', 'multi.uribl.com', resolver)
+    assert (uribl['status'], uribl['meaning']) == ('listed', 'Listed (black, grey)')
+    dbl = check('example.net', 'dbl.spamhaus.org', resolver)
+    assert (dbl['status'], dbl['meaning']) == ('listed', 'Phishing domain')
+
+
+def test_timeout_is_an_error(resolver):
+    result = check('192.0.2.10', 'psbl.surriel.com', resolver)
+    assert result['status'] == 'error'
+    assert 'timed out' in result['meaning']
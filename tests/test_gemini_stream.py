@@ -0,0 +1,134 @@
+"""Streaming through GeminiClient and the AI response cache with a fake model.
+
+The fake model's generate_content(stream=True) yields chunk objects like the
+SDK's, including one that only carries metadata and raises on .text. No
+network or API key is needed.
+
+Run with: python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+CHUNKS = ['Check ', 'the ', 'SPF ', 'record.']
+
+
+class Chunk:
+    def __init__(self, text):
+        self._text = text
+
+    @property
+    def text(self):
+        if self._text is None:
+            raise ValueError('chunk has no text parts')
+        return self._text
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+class FakeModel:
+    """Yields CHUNKS; `failures` leading calls raise a 429, `break_after` chunks into a call raise an error"""
+
+    def __init__(self, failures=0, break_after=None):
+        self.failures = failures
+        self.break_after = break_after
+        self.calls = []
+
+    def generate_content(self, contents, stream=False):
+        self.calls.append((contents, stream))
+        if self.failures:
+            self.failures -= 1
+            raise RateLimited('429 Resource has been exhausted')
+        if not stream:
+            return Chunk(''.join(CHUNKS))
+        return self._chunks()
+
+    def _chunks(self):
+        yield Chunk(None)
+        for i, text in enumerate(CHUNKS):
+            if i == self.break_after:
+                raise RuntimeError('connection reset')
+            yield Chunk(text)
+
+
+@pytest.fixture
+def admission():
+    return app.GeminiAdmission(requests_per_minute=100, tokens_per_minute=10 ** 6, max_inflight=1)
+
+
+@pytest.fixture(autouse=True)
+def ai_cache(tmp_path, monkeypatch):
+    cache = app.AIResponseCache(str(tmp_path / 'ai_cache.sqlite3'), 3600)
+    monkeypatch.setattr(app, 'AI_CACHE', cache)
+    monkeypatch.setitem(app.CONFIG, 'gemini_backoff_base', 0.01)
+    return cache
+
+
+def test_stream_yields_chunks_in_order(admission):
+    model = FakeModel()
+    client = app.GeminiClient(model_name='fake', model=model, admission=admission)
+    notices = []
+    assert list(client.stream(['Why is mail bouncing?'], notices.append)) == CHUNKS
+    assert model.calls == [('Why is mail bouncing?', True)]
+    assert notices == [None]
+    assert admission.inflight == 0 and admission.queue_length() == 0
+
+
+def test_stream_retries_rate_limit_before_first_chunk(admission):
+    model = FakeModel(failures=2)
+    client = app.GeminiClient(model_name='fake', model=model, admission=admission)
+    notices = []
+    assert list(client.stream(['prompt'], notices.append)) == CHUNKS
+    assert len(model.calls) == 3
+    assert sum(1 for notice in notices if notice and 'rate limiting' in notice) == 2
+    assert admission.inflight == 0
+
+
+def test_stream_error_after_first_chunk_releases_admission(admission):
+    client = app.GeminiClient(model_name='fake', model=FakeModel(break_after=2), admission=admission)
+    received = []
+    with pytest.raises(RuntimeError):
+        for chunk in client.stream(['prompt']):
+            received.append(chunk)
+    assert received == CHUNKS[:2]
+    assert admission.inflight == 0 and admission.queue_length() == 0
+
+
+def test_stream_cached_records_first_token_and_caches(admission, ai_cache):
+    model = FakeModel()
+    client = app.GeminiClient(model_name='fake', model=model, admission=admission)
+    meta = {}
+    assert list(app.stream_cached(['prompt'], meta, client=client)) == CHUNKS
+    assert meta['source'] is None
+    assert 0 < meta['first_token'] <= meta['latency']
+    assert admission.inflight == 0
+
+    again = {}
+    assert list(app.stream_cached(['prompt'], again, client=client)) == [''.join(CHUNKS)]
+    assert again['source'] == 'memory' and again['first_token'] == 0.0
+    assert len(model.calls) == 1
+    assert ai_cache.stats['memory_hits'] == 1
+
+
+def test_stream_cached_regenerate_skips_the_cache(admission):
+    model = FakeModel()
+    client = app.GeminiClient(model_name='fake', model=model, admission=admission)
+    list(app.stream_cached(['prompt'], {}, client=client))
+    meta = {}
+    assert list(app.stream_cached(['prompt'], meta, regenerate=True, client=client)) == CHUNKS
+    assert meta['source'] is None
+    assert len(model.calls) == 2
+
+
+def test_failed_stream_is_not_cached(admission, ai_cache):
+    client = app.GeminiClient(model_name='fake', model=FakeModel(break_after=1), admission=admission)
+    with pytest.raises(RuntimeError):
+        list(app.stream_cached(['prompt'], {}, client=client))
+    assert ai_cache.get(app.ai_cache_key(['prompt'], 'fake')) is None
+    assert admission.inflight == 0
@@ -0,0 +1,124 @@
+"""Near-duplicate screenshot matching.
+
+Renders the same bounce notice with different SMTP errors and checks that
+re-encoded or rescaled copies stay within the match threshold while a
+different error line does not. Also covers the near-duplicate lookup in
+the AI response cache.
+
+Run with: python -m pytest tests
+"""
+import io
+import os
+import sys
+
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+HEADER = [
+    "This is the mail system at host mx.example.com.",
+    "",
+    "I'm sorry to have to inform you that your message could not",
+    "be delivered to one or more recipients. It's attached below.",
+    "",
+    "<john@customer.co.za>: host aspmx.l.google.com[142.250.1.27] said:",
+]
+
+ERRORS = {
+    'user_unknown': ["    550-5.1.1 The email account that you tried to reach does not exist.",
+                     "    Please try double-checking the recipient's email address (in reply to RCPT TO command)"],
+    'mailbox_full': ["    552-5.2.2 The recipient's inbox is out of storage space. Please direct",
+                     "    the recipient to https://support.google.com/mail/?p=OverQuotaTemp (in reply to RCPT TO command)"],
+    'unauthenticated': ["    550-5.7.26 This mail is unauthenticated, which poses a security risk to",
+                        "    the sender and Gmail users, and has been blocked. (in reply to end of DATA command)"],
+}
+
+
+def bounce_screenshot(lines):
+    """A 1080p webmail window showing a bounce"""
+    font = ImageFont.load_default(size=15)
+    image = Image.new('RGB', (1920, 1080), (240, 240, 240))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 1920, 60), fill=(40, 90, 160))
+    draw.text((20, 18), 'Inbox - Webmail', font=ImageFont.load_default(size=20), fill='white')
+    draw.rectangle((0, 60, 300, 1080), fill=(225, 228, 235))
+    for i, folder in enumerate(['Inbox (12)', 'Sent', 'Drafts', 'Spam', 'Trash']):
+        draw.text((20, 90 + i * 32), folder, font=font, fill='black')
+    draw.rectangle((320, 80, 1900, 1060), fill='white')
+    draw.text((340, 100), 'From: Mail Delivery System <MAILER-DAEMON@mx.example.com>', font=font, fill='black')
+    for i, line in enumerate(lines):
+        draw.text((340, 180 + i * 24), line, font=font, fill=(20, 20, 20))
+    return image
+
+
+def encode(image, fmt='PNG', **params):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope='module')
+def screenshots():
+    return {name: bounce_screenshot(HEADER + lines) for name, lines in ERRORS.items()}
+
+
+def signature(data):
+    return app.prepare_screenshot(data)[1]['signature']
+
+
+def test_reencoded_and_rescaled_copies_match(screenshots):
+    image = screenshots['user_unknown']
+    original = signature(encode(image))
+    copies = [
+        encode(image, 'JPEG', quality=70),
+        encode(image, 'JPEG', quality=40),
+        encode(image, 'WEBP', quality=80),
+        encode(image.resize((960, 540), Image.Resampling.LANCZOS)),
+    ]
+    for data in copies:
+        assert app.signature_distance(original, signature(data)) <= app.CONFIG['screenshot_match_cells']
+
+
+def test_different_errors_do_not_match(screenshots):
+    signatures = {name: signature(encode(image)) for name, image in screenshots.items()}
+    names = sorted(signatures)
+    for i, first in enumerate(names):
+        for second in names[i + 1:]:
+            assert app.signature_distance(signatures[first], signatures[second]) > 3 * app.CONFIG['screenshot_match_cells']
+
+
+def test_different_aspect_ratio_is_not_compared(screenshots):
+    image = screenshots['user_unknown']
+    cropped = image.crop((0, 0, 1920, 900))
+    assert app.signature_distance(signature(encode(image)), signature(encode(cropped))) is None
+
+
+def test_cache_offers_only_near_identical_screenshots(tmp_path, monkeypatch, screenshots):
+    cache = app.AIResponseCache(str(tmp_path / 'ai_cache.sqlite3'), 3600)
+    monkeypatch.setattr(app, 'AI_CACHE', cache)
+
+    def stored(data, text):
+        part, prep = app.prepare_screenshot(data)
+        key = app.ai_cache_key([app.TICKET_ANALYSIS_PROMPT, part], 'fake')
+        cache.set(key, 'fake', text, 1.0)
+        cache.remember_screenshot(key, 'prompt', prep['signature'], prep['thumbnail'])
+        return key
+
+    def lookup(data, text_key='prompt'):
+        part, prep = app.prepare_screenshot(data)
+        key = app.ai_cache_key([app.TICKET_ANALYSIS_PROMPT, part], 'fake')
+        return cache.similar_screenshot(key, text_key, prep['signature'], app.CONFIG['screenshot_match_cells'])
+
+    original = encode(screenshots['user_unknown'])
+    key = stored(original, 'User unknown - check the address')
+    assert lookup(original) is None  # an exact hit is served by the normal cache path
+
+    match = lookup(encode(screenshots['user_unknown'], 'JPEG', quality=70))
+    assert match['key'] == key
+    assert match['text'] == 'User unknown - check the address'
+    assert Image.open(io.BytesIO(match['thumbnail'])).format == 'JPEG'
+
+    assert lookup(encode(screenshots['mailbox_full'])) is None
+    assert lookup(encode(screenshots['user_unknown'], 'JPEG', quality=70), 'another prompt') is None
@@ -0,0 +1,147 @@
+"""Port-43 WHOIS parsing and referral checks against local servers.
+
+Two loopback addresses share one port: 127.0.0.1 plays a thin registry
+that refers to 127.0.0.2, the registrar's thick WHOIS. 127.0.0.3 answers
+like a throttled registry. Registry data must win for dates and status,
+the registrar fills in the rest, and every date comes back timezone-aware.
+
+Run with: python -m pytest tests
+"""
+import os
+import socket
+import sys
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+REGISTRY = """Domain Name: EXAMPLE.COM
+   Registry Domain ID: 2336799_DOMAIN_COM-VRSN
+   Registrar WHOIS Server: 127.0.0.2
+   Registrar URL: http://www.registrar.example
+   Updated Date: 2024-08-14T07:01:34Z
+   Creation Date: 1995-08-14T04:00:00Z
+   Registry Expiry Date: 2025-08-13T04:00:00Z
+   Registrar: Example Registrar, Inc.
+   Domain Status: clientDeleteProhibited https://icann.org/epp#clientDeleteProhibited
+   Domain Status: clientTransferProhibited https://icann.org/epp#clientTransferProhibited
+   Name Server: A.IANA-SERVERS.NET
+   Name Server: B.IANA-SERVERS.NET
+   DNSSEC: signedDelegation
+>>> Last update of whois database: 2024-09-01T00:00:00Z <<<
+"""
+
+REGISTRAR = """Domain Name: example.com
+Registrar WHOIS Server: 127.0.0.2
+Updated Date: 2024-08-14 07:01:34
+Creation Date: 1995-08-13 00:00:00
+Registrar Registration Expiration Date: 2025-08-12 20:00:00 -0800
+Registrar: Example Registrar, Inc.
+Domain Status: ok
+Name Server: ns1.registrar.example
+"""
+
+NOT_FOUND = 'No match for "NOSUCHDOMAIN.COM".\r\n>>> Last update of whois database: 2024-09-01T00:00:00Z <<<\r\n'
+THROTTLED = 'WHOIS LIMIT EXCEEDED - SEE WWW.PIR.ORG/WHOIS FOR DETAILS\r\n'
+
+ANSWERS = {
+    ('127.0.0.1', 'example.com'): REGISTRY,
+    ('127.0.0.1', 'nosuchdomain.com'): NOT_FOUND,
+    ('127.0.0.1', 'silent.com'): 'Terms of use: this service is provided for lawful purposes only.\r\n',
+    ('127.0.0.2', 'example.com'): REGISTRAR,
+    ('127.0.0.3', 'example.com'): THROTTLED,
+}
+
+
+class WhoisServer:
+    """Answer one query per connection from ANSWERS, keyed by the bound address"""
+
+    def __init__(self, host, port=0):
+        self.host = host
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(8)
+        self.port = self.sock.getsockname()[1]
+        self.queries = []
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            with conn:
+                query = conn.makefile('rb').readline().decode('ascii').strip()
+                self.queries.append(query)
+                conn.sendall(ANSWERS.get((self.host, query.lower()), '').encode('utf-8'))
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture(scope='module')
+def servers():
+    first = WhoisServer('127.0.0.1')
+    try:
+        others = [WhoisServer(host, first.port) for host in ('127.0.0.2', '127.0.0.3')]
+    except OSError:
+        first.close()
+        pytest.skip('extra loopback addresses are not available')
+    yield {server.host: server for server in [first] + others}
+    for server in [first] + others:
+        server.close()
+
+
+def test_thin_thick_referral(servers):
+    record = app.native_whois('Example.COM', server='127.0.0.1', port=servers['127.0.0.1'].port)
+    assert record['servers'] == ['127.0.0.1', '127.0.0.2']
+    assert servers['127.0.0.2'].queries[-1] == 'example.com'
+    assert record['registered'] is True
+    assert record['domain'] == 'example.com'
+    assert record['registrar'] == 'Example Registrar, Inc.'
+    assert record['registrar_url'] == 'http://www.registrar.example'
+    assert record['dnssec'] == 'signedDelegation'
+    # Registry (thin) answers win over the registrar's copy
+    assert record['status'] == ['clientDeleteProhibited', 'clientTransferProhibited']
+    assert record['name_servers'] == ['a.iana-servers.net', 'b.iana-servers.net']
+    assert record['creation_date'] == datetime(1995, 8, 14, 4, 0, tzinfo=timezone.utc)
+    assert record['expiration_date'] == datetime(2025, 8, 13, 4, 0, tzinfo=timezone.utc)
+    for field in ('creation_date', 'updated_date', 'expiration_date'):
+        assert record[field].tzinfo is not None
+    assert '# 127.0.0.1\n' in record['raw'] and '# 127.0.0.2\n' in record['raw']
+
+
+def test_registrar_dates_are_aware():
+    record = app.normalize_whois(app.parse_whois_response(REGISTRAR))
+    assert record['updated_date'] == datetime(2024, 8, 14, 7, 1, 34, tzinfo=timezone.utc)
+    assert record['expiration_date'].utcoffset().total_seconds() == -8 * 3600
+    assert record['status'] == ['ok']
+    assert record['name_servers'] == ['ns1.registrar.example']
+
+
+def test_no_referral_when_disabled(servers):
+    record = app.native_whois('example.com', server='127.0.0.1', port=servers['127.0.0.1'].port,
+                              follow_referrals=False)
+    assert record['servers'] == ['127.0.0.1']
+    assert record['name_servers'] == ['a.iana-servers.net', 'b.iana-servers.net']
+
+
+def test_not_found(servers):
+    record = app.native_whois('nosuchdomain.com', server='127.0.0.1', port=servers['127.0.0.1'].port)
+    assert record['registered'] is False
+    assert record['servers'] == ['127.0.0.1']
+
+
+def test_throttled_reply_is_an_error(servers):
+    with pytest.raises(ValueError, match='refused the query'):
+        app.native_whois('example.com', server='127.0.0.3', port=servers['127.0.0.3'].port)
+
+
+def test_reply_without_evidence_is_an_error(servers):
+    with pytest.raises(ValueError, match='no registration data'):
+        app.native_whois('silent.com', server='127.0.0.1', port=servers['127.0.0.1'].port)